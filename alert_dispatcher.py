@@ -0,0 +1,274 @@
+# alert_dispatcher.py
+# Non-blocking alert delivery.
+# Callers submit() alerts onto a queue and return immediately; a background
+# worker coalesces everything queued within a short window into one digest per
+# recipient and sends it over a pooled, already-authenticated SMTP session,
+# with retry/backoff and a send-rate limit. BufferedLogWriter backs
+# mailSending.ai_alert so the AI log is not reopened for every alert.
+
+import atexit, queue, smtplib, ssl, threading, time
+from collections import defaultdict
+from email.message import EmailMessage
+from datetime import datetime
+
+from ratelimit import TokenBucket, retry_call
+from instrumentation import count, timer
+
+_STOP = object()
+
+
+class SMTPPool:
+    """Keeps up to `size` logged-in SMTP connections and reuses them."""
+
+    def __init__(self, host, port, user=None, password=None, starttls=True, size=1, timeout=15):
+        self.host, self.port = host, port
+        self.user, self.password = user, password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls(context=ssl.create_default_context())
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        return server
+
+    def _alive(self, server):
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def send(self, msg):
+        try:
+            server = self.idle.get_nowait()
+            if not self._alive(server):
+                self._discard(server)
+                server = self._connect()
+        except queue.Empty:
+            server = self._connect()
+        try:
+            with timer("smtp_send", transport="pool"):
+                server.send_message(msg)
+        except Exception:
+            self._discard(server)
+            raise
+        count("emails_sent", transport="pool")
+        try:
+            self.idle.put_nowait(server)
+        except queue.Full:
+            self._discard(server)
+
+    def _discard(self, server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+class BufferedLogWriter:
+    """Append-only log file kept open; flushed every `flush_interval` seconds or `max_lines` lines.
+
+    A line written into an idle buffer arms a one-shot timer, so it reaches
+    the file within `flush_interval` even if nothing else is written.
+    """
+
+    def __init__(self, path, flush_interval=2.0, max_lines=256):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_lines = max_lines
+        self.lines = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.fh = None
+        self.timer = None
+
+    def write(self, line):
+        with self.lock:
+            self.lines.append(line)
+            if len(self.lines) >= self.max_lines or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush_locked()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.flush_interval, self._timed_flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _timed_flush(self):
+        with self.lock:
+            self.timer = None
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self.lines:
+            try:
+                if self.fh is None:
+                    self.fh = open(self.path, "a", encoding="utf-8")
+                self.fh.write("".join(self.lines))
+                self.fh.flush()
+            except Exception:
+                pass
+            self.lines = []
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self._flush_locked()
+            if self.fh is not None:
+                self.fh.close()
+                self.fh = None
+
+
+class AlertDispatcher:
+    """Background alert queue with per-recipient digests.
+
+    config: dict with smtp_host, smtp_port, optional smtp_user / smtp_pass /
+            alert_to / smtp_starttls (see mailSending._load_config). An empty
+            config prints the digest instead of sending it (simulation).
+    """
+
+    def __init__(self, config=None, coalesce_window=2.0, max_per_minute=30, retries=3,
+                 pool_size=1, max_queue=10000):
+        self.config = config or {}
+        self.coalesce_window = coalesce_window
+        self.retries = retries
+        self.limiter = TokenBucket(max_per_minute / 60.0, burst=max(1, max_per_minute // 6))
+        self.pool = None
+        if self.config:
+            self.pool = SMTPPool(self.config["smtp_host"], self.config["smtp_port"],
+                                 self.config.get("smtp_user"), self.config.get("smtp_pass"),
+                                 starttls=self.config.get("smtp_starttls", True), size=pool_size)
+        self.q = queue.Queue(maxsize=max_queue)
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.worker = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self.worker.start()
+
+    # ---- producer side (never blocks on I/O) ----
+    def submit(self, subject, body, to_addr=None):
+        try:
+            self.q.put_nowait((subject, body, to_addr, datetime.utcnow()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self):
+        """Wait until every alert submitted so far has been handled."""
+        self.q.join()
+
+    def close(self):
+        if self.worker.is_alive():
+            self.q.put(_STOP)
+            self.worker.join()
+        if self.pool:
+            self.pool.close()
+
+    # ---- worker ----
+    def _default_recipients(self):
+        to = self.config.get("alert_to")
+        if to:
+            return [a.strip() for a in str(to).split(",") if a.strip()]
+        return [self.config["smtp_user"]] if self.config.get("smtp_user") else []
+
+    def _run(self):
+        while True:
+            item = self.q.get()
+            if item is _STOP:
+                self.q.task_done()
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.coalesce_window
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self.q.get(timeout=max(remaining, 0)) if remaining > 0 else self.q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                # a bad batch (recipient, header...) must not take the worker down with it
+                self.failed += len(batch)
+                print(f"[alert_dispatcher] Dropped a batch of {len(batch)} alert(s): {e!r}")
+            finally:
+                for _ in batch:
+                    self.q.task_done()
+                if stop:
+                    self.q.task_done()
+            if stop:
+                return
+
+    def _deliver(self, batch):
+        per_recipient = defaultdict(list)
+        for subject, body, to_addr, ts in batch:
+            recipients = [to_addr] if to_addr else self._default_recipients()
+            for r in recipients or ["none configured"]:
+                per_recipient[r].append((subject, body, ts))
+        for recipient, alerts in per_recipient.items():
+            if len(alerts) == 1:
+                subject = alerts[0][0]
+                body = alerts[0][1] + "\n\nSent at: " + alerts[0][2].isoformat() + "Z"
+            else:
+                subject = f"Risk Alert digest: {len(alerts)} alerts"
+                body = "\n\n".join(f"[{ts.isoformat()}Z] {s}\n{b}" for s, b, ts in alerts)
+            if self.pool is None or recipient == "none configured":
+                print("--- send_alert (SIMULATION) ---")
+                print("Subject:", subject)
+                print("Body:", body)
+                print("Recipients:", recipient)
+                continue
+            msg = EmailMessage()
+            msg["Subject"] = subject
+            msg["From"] = self.config.get("smtp_user") or "alerts@localhost"
+            msg["To"] = recipient
+            msg.set_content(body)
+            self.limiter.acquire()
+            try:
+                retry_call(lambda: self.pool.send(msg), attempts=self.retries,
+                           on_retry=lambda n, e, d: print(f"[alert_dispatcher] send failed ({e}); retry {n} in {d:.1f}s"))
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                print("[alert_dispatcher] Email failed after retries:", e)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher(config=None, **kwargs):
+    """Process-wide dispatcher, created on first use and closed at exit."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            if config is None:
+                from mailSending import _load_config
+                config = _load_config()
+            _dispatcher = AlertDispatcher(config, **kwargs)
+            atexit.register(_dispatcher.close)
+        return _dispatcher
@@ -0,0 +1,210 @@
+# backtest.py
+# Walk-forward rebalancing backtester built on Portfolio.returns.
+# Weights are recomputed on a rebalance schedule from a rolling window whose
+# sums / cross-products are slid forward incrementally, and held weights drift
+# with prices between rebalances. Turnover and transaction costs are tracked.
+
+import numpy as np
+import pandas as pd
+from risk_parity import inverse_vol_weights, erc_weights, shrink_to_diagonal
+from portfolio_math import rule_based_weights
+
+
+class RollingWindowStats:
+    """Mean / variance / covariance over the last `window` rows, updated by
+    adding the rows that enter and subtracting the rows that leave."""
+
+    def __init__(self, n_assets, window, track_cov=True, refresh_every=64):
+        self.window = window
+        self.track_cov = track_cov
+        self.refresh_every = refresh_every
+        self.n = 0
+        self.s1 = np.zeros(n_assets)
+        self.s2 = np.zeros((n_assets, n_assets)) if track_cov else np.zeros(n_assets)
+        self.start = self.end = 0
+        self._updates = 0
+
+    def _accumulate(self, rows, sign):
+        if len(rows) == 0:
+            return
+        self.n += sign * len(rows)
+        self.s1 += sign * rows.sum(axis=0)
+        if self.track_cov:
+            self.s2 += sign * (rows.T @ rows)
+        else:
+            self.s2 += sign * (rows * rows).sum(axis=0)
+
+    def _reset(self, R, start, end):
+        self.n = 0
+        self.s1[:] = 0
+        self.s2[...] = 0
+        self._accumulate(R[start:end], 1)
+
+    def advance_to(self, R, end):
+        """Make the window cover rows [end - window, end) of R."""
+        start = max(0, end - self.window)
+        self._updates += 1
+        if start >= self.end or self._updates % self.refresh_every == 0:
+            # no overlap with the old window (or periodic refresh against drift)
+            self._reset(R, start, end)
+        else:
+            self._accumulate(R[self.end:end], 1)
+            self._accumulate(R[self.start:start], -1)
+        self.start, self.end = start, end
+
+    @property
+    def mean(self):
+        return self.s1 / max(self.n, 1)
+
+    @property
+    def var(self):
+        if self.n < 2:
+            return np.zeros_like(self.s1)
+        sq = np.diag(self.s2) if self.track_cov else self.s2
+        return np.clip((sq - self.n * self.mean ** 2) / (self.n - 1), 0.0, None)
+
+    @property
+    def vol(self):
+        return np.sqrt(self.var)
+
+    @property
+    def cov(self):
+        if not self.track_cov:
+            raise ValueError("covariance not tracked; create with track_cov=True")
+        if self.n < 2:
+            return np.zeros_like(self.s2)
+        m = self.mean
+        return (self.s2 - self.n * np.outer(m, m)) / (self.n - 1)
+
+
+# ---- weight functions: fn(stats, prev_weights, assets) -> weight array ----
+
+def equal_weight_fn(stats, prev, assets):
+    return np.full(len(assets), 1.0 / len(assets))
+equal_weight_fn.needs_cov = False
+
+
+def inverse_vol_fn(stats, prev, assets):
+    return inverse_vol_weights(stats.vol)
+inverse_vol_fn.needs_cov = False
+
+
+def erc_fn(stats, prev, assets):
+    # assets without variance in the window (not listed yet, pegged) get no weight
+    live = stats.var > 0
+    w = np.zeros(len(assets))
+    if not live.any():
+        return np.full(len(assets), 1.0 / len(assets))
+    cov = stats.cov[np.ix_(live, live)]
+    if stats.n <= live.sum():
+        cov = shrink_to_diagonal(cov, 0.1)
+    x0 = prev[live] if prev is not None and prev[live].sum() > 0 else None
+    w[live], _ = erc_weights(cov, x0=x0)
+    return w
+erc_fn.needs_cov = True
+
+
+def rule_based_fn(stats, prev, assets):
+    return rule_based_weights(assets).to_numpy()
+rule_based_fn.needs_cov = False
+
+
+WEIGHT_FUNCTIONS = {
+    "equal": equal_weight_fn,
+    "inverse_vol": inverse_vol_fn,
+    "risk_parity": inverse_vol_fn,
+    "erc": erc_fn,
+    "rule": rule_based_fn,
+}
+
+
+def rebalance_schedule(index, schedule):
+    """Boolean array marking rebalance days: 'daily', 'weekly', 'monthly' or 'never'."""
+    T = len(index)
+    if schedule == "daily":
+        return np.ones(T, dtype=bool)
+    if schedule in ("never", "threshold", None):
+        return np.zeros(T, dtype=bool)
+    if isinstance(index, pd.DatetimeIndex):
+        if schedule == "weekly":
+            key = index.to_period("W").asi8
+        elif schedule == "monthly":
+            key = index.to_period("M").asi8
+        else:
+            raise ValueError(f"unknown schedule: {schedule}")
+        mask = np.ones(T, dtype=bool)
+        mask[1:] = key[1:] != key[:-1]
+        return mask
+    step = {"weekly": 7, "monthly": 30}.get(schedule)
+    if step is None:
+        raise ValueError(f"unknown schedule: {schedule}")
+    return np.arange(T) % step == 0
+
+
+def walk_forward(returns, weight_fn="inverse_vol", schedule="monthly", window=90,
+                 cost_bps=10.0, drift_threshold=None, min_periods=None):
+    """Walk-forward backtest over a date x asset return frame.
+
+    Weights decided on day t only use returns up to t-1 and are applied to
+    day t's return. `schedule` is 'daily'/'weekly'/'monthly'/'threshold'; with
+    `drift_threshold` set, a rebalance also fires whenever any held weight has
+    drifted more than that from its target. Trading starts once `min_periods`
+    rows (default: `window`) of history are available.
+
+    Returns {"returns": DataFrame(gross_return, cost, net_return, turnover),
+             "weights": DataFrame of target weights per rebalance date,
+             "summary": dict}.
+    """
+    if isinstance(weight_fn, str):
+        weight_fn = WEIGHT_FUNCTIONS[weight_fn]
+    if schedule == "threshold" and drift_threshold is None:
+        raise ValueError("schedule='threshold' needs drift_threshold")
+    assets = list(returns.columns)
+    R = returns.fillna(0.0).to_numpy(dtype=float)
+    T, N = R.shape
+    planned = rebalance_schedule(returns.index, schedule)
+    stats = RollingWindowStats(N, window, track_cov=getattr(weight_fn, "needs_cov", True))
+    cost_rate = cost_bps / 1e4
+
+    gross = np.zeros(T)
+    cost = np.zeros(T)
+    turnover = np.zeros(T)
+    held = np.zeros(N)
+    target = None
+    rebal_dates, rebal_weights = [], []
+
+    min_rows = max(2, window if min_periods is None else min_periods)
+    for t in range(min_rows, T):
+        due = planned[t] or target is None
+        if not due and drift_threshold is not None:
+            due = np.max(np.abs(held - target)) > drift_threshold
+        if due:
+            stats.advance_to(R, t)
+            target = np.asarray(weight_fn(stats, target, assets), dtype=float)
+            turnover[t] = np.abs(target - held).sum()
+            cost[t] = turnover[t] * cost_rate
+            held = target.copy()
+            rebal_dates.append(returns.index[t])
+            rebal_weights.append(target)
+        r = R[t]
+        port = held @ r
+        gross[t] = port
+        # let weights drift with prices; cash (1 - sum) earns nothing
+        grown = held * (1.0 + r)
+        held = grown / (1.0 + port) if port != -1.0 else np.zeros(N)
+
+    net = gross - cost
+    out = pd.DataFrame({"gross_return": gross, "cost": cost, "net_return": net, "turnover": turnover},
+                       index=returns.index).iloc[min_rows:]
+    weights = pd.DataFrame(rebal_weights, index=pd.Index(rebal_dates, name=returns.index.name), columns=assets)
+    wealth = (1 + out["net_return"]).cumprod()
+    summary = {
+        "rebalances": len(rebal_dates),
+        "total_turnover": float(turnover.sum()),
+        "total_cost": float(cost.sum()),
+        "gross_cum_return": float((1 + out["gross_return"]).prod() - 1),
+        "net_cum_return": float(wealth.iloc[-1] - 1) if len(wealth) else 0.0,
+        "net_volatility": float(out["net_return"].std()),
+        "max_drawdown": float((wealth / wealth.cummax() - 1).min()) if len(wealth) else 0.0,
+    }
+    return {"returns": out, "weights": weights, "summary": summary}
@@ -0,0 +1,367 @@
+# benchmark.py
+# Load benchmarks for the pipeline's hot paths on synthetic N assets x T days data.
+#
+#   python benchmark.py                          # small + medium scales, compare to baseline
+#   python benchmark.py --scales large --repeat 1
+#   python benchmark.py --save-baseline          # record the current numbers as the baseline
+#
+# Each scale writes a synthetic random-walk price set as a long CSV
+# (date, asset, close - what load_combined reads) and a wide CSV (date x asset
+# - what parallel_execution reads) into a scratch directory, and every
+# benchmark runs with that directory as the working directory so the default
+# SQLite files and price store never touch the project tree.
+# For each benchmark the best of `repeat` runs is reported with its
+# throughput (items per second) and peak RSS; results are written as JSON
+# and compared against a stored baseline, flagging anything slower than
+# `threshold`. The exit status is 1 on a regression, a benchmark that raised,
+# or a baseline benchmark missing from the run.
+
+import argparse, contextlib, io, json, os, resource, shutil, statistics, sys, tempfile, time
+import numpy as np
+import pandas as pd
+
+RESULTS_DIR = os.path.join("results", "benchmarks")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+LATEST_PATH = os.path.join(RESULTS_DIR, "latest.json")
+
+# name -> (assets, days)
+SCALES = {
+    "small": (50, 365),
+    "medium": (250, 1095),
+    "large": (1000, 1825),
+}
+
+# slower than baseline by more than this fraction (and by more than NOISE_SECONDS) is a regression
+THRESHOLD = 0.2
+NOISE_SECONDS = 0.005
+
+
+# benchmarks chdir into a scratch directory; keep the project importable from there
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
+
+
+# ---- synthetic data ----
+
+def synthetic_prices(n_assets, n_days, seed=0, start="2020-01-01"):
+    """Wide date x asset close prices: correlated geometric random walks."""
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0003, 0.02, size=(n_days, 1))
+    beta = rng.uniform(0.5, 1.5, size=n_assets)
+    idio = rng.normal(0.0, 1.0, size=(n_days, n_assets)) * rng.uniform(0.01, 0.05, size=n_assets)
+    log_ret = market * beta + idio
+    start_px = np.exp(rng.uniform(0.0, 10.0, size=n_assets))
+    close = start_px * np.exp(np.cumsum(log_ret, axis=0))
+    index = pd.date_range(start, periods=n_days, freq="D", name="date")
+    return pd.DataFrame(close, index=index, columns=[f"A{i:04d}" for i in range(n_assets)])
+
+
+def to_long(wide):
+    """Wide prices -> long frame (date, asset, close), one row per asset per day."""
+    long = wide.stack().rename("close").reset_index()
+    long.columns = ["date", "asset", "close"]
+    return long
+
+
+def write_dataset(directory, n_assets, n_days, seed=0):
+    """Write long and wide CSVs for one scale. Returns (long_path, wide_path)."""
+    wide = synthetic_prices(n_assets, n_days, seed)
+    long_path = os.path.join(directory, "Crypto_metrics_daily.csv")
+    wide_path = os.path.join(directory, "prices_wide.csv")
+    to_long(wide).to_csv(long_path, index=False, date_format="%Y-%m-%d")
+    wide.to_csv(wide_path, date_format="%Y-%m-%d")
+    return long_path, wide_path
+
+
+# ---- memory ----
+
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets VmHWM to the current RSS
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # process-lifetime peak (KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+# ---- benchmarks: each takes the scale context and returns (callable, items, unit) ----
+
+def _bench_load_combined(ctx):
+    from final_main import load_combined
+    return (lambda: load_combined(ctx["long_csv"], store=ctx["store_dir"])), ctx["rows"], "rows"
+
+
+def _bench_risk_parity(ctx):
+    from rules import get_weights_risk_parity
+    from stats_cache import get_cache
+
+    def run():
+        get_cache().clear()         # time the computation, not a cache hit
+        return get_weights_risk_parity(ctx["assets"], ctx["df"])
+    return run, ctx["rows"], "rows"
+
+
+def _bench_portfolio_init(ctx):
+    from portfolio import Portfolio
+    return (lambda: Portfolio(ctx["df"])), ctx["rows"], "rows"
+
+
+def _bench_portfolio_run(ctx):
+    return (lambda: ctx["portfolio"].run(ctx["weights"])), ctx["rows"], "rows"
+
+
+def _bench_compact_book(ctx):
+    # 10k random long-only portfolios on the shared return matrix
+    n = 10_000
+    W = np.random.default_rng(0).random((n, len(ctx["assets"])))
+    W /= W.sum(axis=1, keepdims=True)
+    matrix = ctx["portfolio"].matrix
+
+    def run():
+        from compact_portfolio import PortfolioBook
+        return PortfolioBook.from_weights(matrix, W).run()
+    return run, n, "portfolios"
+
+
+def _bench_apply_shock(ctx):
+    from stress_test import apply_shock
+    shock = {a: -0.3 for a in ctx["assets"][:10]}
+    date = ctx["df"]["date"].iloc[len(ctx["df"]) // 2]
+    return (lambda: apply_shock(ctx["df"], date, shock)), ctx["rows"], "rows"
+
+
+def _bench_run_all(ctx):
+    from parallel_execution import run_all
+    from stats_cache import get_cache
+
+    def run():
+        get_cache().clear()
+        return run_all(ctx["wide_csv"])
+    return run, ctx["rows"], "rows"
+
+
+def _bench_store_portfolio(ctx, n_portfolios=100):
+    from db_portfolio import store_portfolio
+    stats = ctx["portfolio"].returns.agg(["mean", "var"]).T
+    assets = {a: {"weight": ctx["weights"][a], "mean_return": float(stats.at[a, "mean"]),
+                  "variance": float(stats.at[a, "var"])} for a in ctx["assets"]}
+    db = os.path.join(ctx["workdir"], "bench_portfolio.db")
+
+    def run():
+        for i in range(n_portfolios):
+            store_portfolio(f"bench_{i}", "2025-01-01", 0.1, 0.2, assets, db_path=db)
+    return run, n_portfolios, "portfolios"
+
+
+def _bench_store_predictions(ctx):
+    from predictor import store_predictions
+    rng = np.random.default_rng(1)
+    results = {a: {"mse": float(rng.random()), "r2": float(rng.random()),
+                   "actual_last": rng.random(10), "pred_last": rng.random(10)} for a in ctx["assets"]}
+    db = os.path.join(ctx["workdir"], "bench_predictions.db")
+    return (lambda: store_predictions(results, db_path=db)), len(results), "assets"
+
+
+def _bench_run_all_rules(ctx):
+    from Risk_checker import run_all_rules
+    port = ctx["portfolio"].run(ctx["weights"])["portfolio_return"]
+    return (lambda: run_all_rules(port, ctx["weights"])), len(port), "days"
+
+
+BENCHMARKS = {
+    "load_combined": _bench_load_combined,
+    "get_weights_risk_parity": _bench_risk_parity,
+    "Portfolio.__init__": _bench_portfolio_init,
+    "Portfolio.run": _bench_portfolio_run,
+    "PortfolioBook.run": _bench_compact_book,
+    "apply_shock": _bench_apply_shock,
+    "run_all": _bench_run_all,
+    "store_portfolio": _bench_store_portfolio,
+    "store_predictions": _bench_store_predictions,
+    "run_all_rules": _bench_run_all_rules,
+}
+
+
+def _context(workdir, n_assets, n_days, seed):
+    from final_main import load_combined
+    from portfolio import Portfolio
+    long_csv, wide_csv = write_dataset(workdir, n_assets, n_days, seed)
+    store_dir = os.path.join(workdir, "price_store")     # empty: load_combined parses the CSV
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = load_combined(long_csv, store=store_dir)
+    assets = sorted(df["asset"].unique())
+    p = Portfolio(df)
+    return {"workdir": workdir, "long_csv": long_csv, "wide_csv": wide_csv, "store_dir": store_dir,
+            "df": df, "assets": assets, "rows": len(df), "portfolio": p,
+            "weights": {a: 1.0 / len(assets) for a in assets}}
+
+
+def run_benchmarks(scales=("small", "medium"), names=None, repeat=3, seed=0, verbose=True):
+    """Run the selected benchmarks at each scale -> list of result dicts."""
+    os.environ.pop("STATS_CACHE_DIR", None)
+    names = list(names or BENCHMARKS)
+    results = []
+    cwd = os.getcwd()
+    for scale in scales:
+        n_assets, n_days = SCALES[scale] if scale in SCALES else map(int, scale.lower().split("x"))
+        workdir = tempfile.mkdtemp(prefix=f"bench_{scale}_")
+        try:
+            os.chdir(workdir)
+            ctx = _context(workdir, n_assets, n_days, seed)
+            for name in names:
+                times = []
+                try:
+                    fn, items, unit = BENCHMARKS[name](ctx)
+                    _reset_peak_rss()
+                    rss0 = _peak_rss_mb()
+                    for _ in range(repeat):
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            t0 = time.perf_counter()
+                            fn()
+                            times.append(time.perf_counter() - t0)
+                except Exception as e:
+                    print(f"[ERROR] {name} @ {scale}: {e}")
+                    results.append({"name": name, "scale": scale, "error": str(e)})
+                    continue
+                best = min(times)
+                peak = _peak_rss_mb()
+                row = {"name": name, "scale": scale, "assets": n_assets, "days": n_days,
+                       "seconds": best, "median_seconds": statistics.median(times), "repeat": repeat,
+                       "items": items, "unit": unit, "throughput": items / best if best > 0 else float("inf"),
+                       "peak_rss_mb": peak, "rss_growth_mb": peak - rss0}
+                results.append(row)
+                if verbose:
+                    print(f"[INFO] {name:<24} {scale:<8} {best:>9.4f}s  {row['throughput']:>12.0f} {unit}/s  "
+                          f"peak {peak:>7.1f} MB")
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# ---- baseline / regression ----
+
+def _key(row):
+    return f"{row['name']}@{row['scale']}"
+
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    doc = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+           "numpy": np.__version__, "pandas": pd.__version__, "cpu_count": os.cpu_count(),
+           "results": {_key(r): r for r in results}}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=1)
+    os.replace(tmp, path)
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("results", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def compare(results, baseline, threshold=THRESHOLD, names=None):
+    """Per-benchmark deltas against the baseline; `regression` marks slowdowns beyond threshold.
+
+    A benchmark that errored, or a baseline entry at a scale that was run but
+    missing from `results` (only for `names` when given), is a regression too.
+    """
+    rows = []
+    scales = {r["scale"] for r in results}
+    seen = {_key(r) for r in results}
+    for key, base in baseline.items():
+        if key not in seen and base["scale"] in scales and (names is None or base["name"] in names):
+            rows.append({"name": base["name"], "scale": base["scale"], "error": "missing from results",
+                         "regression": True})
+    for r in results:
+        base = baseline.get(_key(r))
+        if "error" in r:
+            rows.append({"name": r["name"], "scale": r["scale"], "error": r["error"], "regression": True})
+            continue
+        if base is None or "error" in base:
+            continue
+        dt = r["seconds"] - base["seconds"]
+        rel = dt / base["seconds"] if base["seconds"] > 0 else 0.0
+        rows.append({"name": r["name"], "scale": r["scale"], "seconds": r["seconds"],
+                     "baseline_seconds": base["seconds"], "delta_pct": 100.0 * rel,
+                     "rss_delta_mb": r["peak_rss_mb"] - base.get("peak_rss_mb", r["peak_rss_mb"]),
+                     "regression": rel > threshold and dt > NOISE_SECONDS})
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the portfolio pipeline on synthetic data.")
+    ap.add_argument("--scales", default="small,medium",
+                    help=f"comma-separated names ({', '.join(SCALES)}) or NxT, e.g. 500x730")
+    ap.add_argument("--only", default=None, help="comma-separated benchmark names")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--output", default=LATEST_PATH)
+    ap.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD)
+    ap.add_argument("--list", action="store_true", help="list benchmarks and exit")
+    args = ap.parse_args(argv)
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+    baseline_path, output = os.path.abspath(args.baseline), os.path.abspath(args.output)
+    names = args.only.split(",") if args.only else None
+    unknown = [n for n in names or [] if n not in BENCHMARKS]
+    if unknown:
+        ap.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    results = run_benchmarks(args.scales.split(","), names, args.repeat, args.seed)
+    save_results(results, output)
+    print(f"[INFO] Results saved to {output}")
+    errors = [r for r in results if "error" in r]
+    if errors:
+        print(f"[ERROR] {len(errors)} benchmark(s) failed: " + ", ".join(_key(r) for r in errors))
+        if args.save_baseline:
+            print("[ERROR] Baseline not saved.")
+        return 1
+    if args.save_baseline:
+        save_results(results, baseline_path)
+        print(f"[INFO] Baseline saved to {baseline_path}")
+        return 0
+    baseline = load_baseline(baseline_path)
+    if not baseline:
+        print(f"[WARN] No baseline at {baseline_path}; run with --save-baseline to record one.")
+        return 0
+    rows = compare(results, baseline, args.threshold, names)
+    regressions = [r for r in rows if r["regression"]]
+    for r in rows:
+        if "error" in r:
+            print(f"{r['name']:<24} {r['scale']:<8} ERROR: {r['error']}")
+            continue
+        flag = "  REGRESSION" if r["regression"] else ""
+        print(f"{r['name']:<24} {r['scale']:<8} {r['baseline_seconds']:>9.4f}s -> {r['seconds']:>9.4f}s "
+              f"({r['delta_pct']:+6.1f}%, rss {r['rss_delta_mb']:+7.1f} MB){flag}")
+    if regressions:
+        print(f"[WARN] {len(regressions)} benchmark(s) failed, missing or slower than baseline "
+              f"by more than {args.threshold:.0%}")
+        return 1
+    print("[INFO] No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# compact_portfolio.py
+# Lightweight portfolios over one shared, read-only return matrix.
+#
+# portfolio.Portfolio keeps its own close pivot and return frame, so every
+# instance costs O(dates x assets). Here the T x N return matrix is built once
+# (ReturnsMatrix, marked non-writeable so nothing can mutate it under the
+# portfolios sharing it) and each CompactPortfolio is a __slots__ object
+# holding only the column indices of its held assets and their weights:
+# O(assets) per portfolio, so tens of thousands fit in one process.
+#
+#   m = ReturnsMatrix.from_portfolio(Portfolio(df))     # or from_returns(returns)
+#   p = CompactPortfolio(m, {"BTC": 0.6, "ETH": 0.4}, name="60/40")
+#   p.run()                                             # same as Portfolio.run
+#   book = PortfolioBook(m); book.add(w1); book.add(w2)
+#   book.run(); book.evaluate()                         # batched, see portfolio_math
+
+import numpy as np
+import pandas as pd
+
+_EMPTY_INDEX = np.empty(0, dtype=np.int32)
+_EMPTY_WEIGHTS = np.empty(0, dtype=np.float64)
+
+
+class ReturnsMatrix:
+    """Read-only T x N float64 return matrix with its dates and asset -> column map."""
+
+    __slots__ = ("values", "dates", "assets", "column_of", "first_price_date")
+
+    def __init__(self, values, dates, assets, first_price_date=None):
+        values = np.array(values, dtype=np.float64, order="C")
+        if values.ndim != 2 or values.shape != (len(dates), len(assets)):
+            raise ValueError(f"values shape {values.shape} does not match {len(dates)} dates x {len(assets)} assets")
+        values.flags.writeable = False
+        self.values = values
+        self.dates = pd.DatetimeIndex(dates)
+        self.assets = tuple(assets)
+        self.column_of = {a: i for i, a in enumerate(self.assets)}
+        # first close before the first return (StressEngine shocks on or before it move every price)
+        self.first_price_date = first_price_date
+
+    @classmethod
+    def from_returns(cls, returns, first_price_date=None):
+        return cls(returns.to_numpy(dtype=np.float64), returns.index, list(returns.columns), first_price_date)
+
+    @classmethod
+    def from_portfolio(cls, portfolio):
+        first = portfolio.close_pivot.index[0] if len(portfolio.close_pivot) else None
+        return cls.from_returns(portfolio.returns, first)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def to_frame(self):
+        """Returns as a date x asset DataFrame (a copy; the matrix itself stays read-only)."""
+        return pd.DataFrame(self.values.copy(), index=self.dates,
+                            columns=pd.Index(self.assets, name="asset"))
+
+    def encode(self, weights):
+        """(column indices int32, weights float64) of the non-zero entries of `weights`.
+
+        Accepts a dict / Series keyed by asset, or a dense array over self.assets.
+        Assets not in the matrix are ignored, like Portfolio.run.
+        """
+        if isinstance(weights, (dict, pd.Series)):
+            pairs = [(self.column_of[a], float(w)) for a, w in weights.items() if a in self.column_of and w]
+            if not pairs:
+                return _EMPTY_INDEX, _EMPTY_WEIGHTS
+            pairs.sort()
+            idx, w = zip(*pairs)
+            return np.array(idx, dtype=np.int32), np.array(w, dtype=np.float64)
+        dense = np.asarray(weights, dtype=np.float64).ravel()
+        if len(dense) != len(self.assets):
+            raise ValueError(f"dense weights have {len(dense)} entries, matrix has {len(self.assets)} assets")
+        idx = np.flatnonzero(dense).astype(np.int32)
+        return idx, dense[idx]
+
+
+class Position:
+    """One holding of a compact portfolio: asset, its matrix column and weight."""
+
+    __slots__ = ("asset", "column", "weight")
+
+    def __init__(self, asset, column, weight):
+        self.asset = asset
+        self.column = column
+        self.weight = weight
+
+    def __repr__(self):
+        return f"Position({self.asset!r}, weight={self.weight:.6g})"
+
+
+class CompactPortfolio:
+    """Fixed-weight portfolio stored as (column index, weight) arrays over a shared ReturnsMatrix."""
+
+    __slots__ = ("matrix", "index", "weights", "name")
+
+    def __init__(self, matrix, weights, name=None):
+        self.matrix = matrix
+        self.index, self.weights = matrix.encode(weights)
+        self.name = name
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return f"CompactPortfolio({self.name!r}, {len(self)} positions)"
+
+    @property
+    def nbytes(self):
+        """Bytes held by this portfolio itself (the shared matrix is not counted)."""
+        return self.index.nbytes + self.weights.nbytes
+
+    def positions(self):
+        assets = self.matrix.assets
+        return [Position(assets[c], int(c), float(w)) for c, w in zip(self.index, self.weights)]
+
+    def weights_dict(self):
+        assets = self.matrix.assets
+        return {assets[c]: float(w) for c, w in zip(self.index, self.weights)}
+
+    def dense_weights(self):
+        """Weights as a length-N array in matrix column order."""
+        out = np.zeros(len(self.matrix.assets))
+        out[self.index] = self.weights
+        return out
+
+    def with_weights(self, weights, name=None):
+        """A new portfolio on the same matrix."""
+        return CompactPortfolio(self.matrix, weights, self.name if name is None else name)
+
+    def returns(self):
+        """Length-T array of portfolio returns (R[:, held] @ w)."""
+        if not len(self.index):
+            return np.zeros(len(self.matrix.dates))
+        return self.matrix.values[:, self.index] @ self.weights
+
+    def run(self):
+        """Portfolio return series as a one-column DataFrame, like Portfolio.run."""
+        return pd.DataFrame({"portfolio_return": self.returns()}, index=self.matrix.dates)
+
+    def total_return(self):
+        return float(np.prod(1.0 + self.returns()) - 1.0)
+
+
+class PortfolioBook:
+    """Many CompactPortfolios on one ReturnsMatrix, evaluated in batches.
+
+    The book keeps only the portfolio objects; the K x N weight matrix for a
+    batch computation is assembled on demand (chunked in run()).
+    """
+
+    def __init__(self, matrix, portfolios=()):
+        self.matrix = matrix
+        self.portfolios = []
+        for p in portfolios:
+            self.append(p)
+
+    @classmethod
+    def from_weights(cls, matrix, weights, names=None):
+        """Book from a K x N array, a DataFrame (rows = portfolios) or a list of dicts."""
+        book = cls(matrix)
+        if isinstance(weights, pd.DataFrame):
+            names = list(weights.index) if names is None else names
+            weights = weights.reindex(columns=list(matrix.assets), fill_value=0.0).fillna(0.0).to_numpy(dtype=float)
+        names = range(len(weights)) if names is None else names
+        for w, name in zip(weights, names):
+            book.add(w, name)
+        return book
+
+    def __len__(self):
+        return len(self.portfolios)
+
+    def __iter__(self):
+        return iter(self.portfolios)
+
+    def __getitem__(self, i):
+        return self.portfolios[i]
+
+    def add(self, weights, name=None):
+        p = CompactPortfolio(self.matrix, weights, len(self.portfolios) if name is None else name)
+        self.portfolios.append(p)
+        return p
+
+    def append(self, portfolio):
+        if portfolio.matrix is not self.matrix:
+            raise ValueError("portfolio is built on a different ReturnsMatrix")
+        self.portfolios.append(portfolio)
+
+    @property
+    def names(self):
+        return [p.name for p in self.portfolios]
+
+    def weight_matrix(self, start=0, stop=None):
+        """Dense K x N weights for portfolios[start:stop]."""
+        chunk = self.portfolios[start:stop]
+        W = np.zeros((len(chunk), len(self.matrix.assets)))
+        for k, p in enumerate(chunk):
+            W[k, p.index] = p.weights
+        return W
+
+    def returns(self, chunk_size=1024):
+        """T x K array of portfolio returns, R @ W.T in chunks of portfolios."""
+        R = self.matrix.values
+        out = np.empty((len(R), len(self.portfolios)))
+        for a in range(0, len(self.portfolios), chunk_size):
+            W = self.weight_matrix(a, a + chunk_size)
+            out[:, a:a + len(W)] = R @ W.T
+        return out
+
+    def run(self, chunk_size=1024):
+        """T x K DataFrame of portfolio returns, like Portfolio.run_many."""
+        return pd.DataFrame(self.returns(chunk_size), index=self.matrix.dates, columns=self.names)
+
+    def evaluate(self, chunk_size=None, path_stats=True):
+        """Per-portfolio summary stats (see portfolio_math.evaluate_portfolios)."""
+        from portfolio_math import evaluate_portfolios
+        W = pd.DataFrame(self.weight_matrix(), index=self.names, columns=list(self.matrix.assets))
+        return evaluate_portfolios(W, self.matrix.to_frame(), chunk_size=chunk_size, path_stats=path_stats)
+
+    def stress(self, scenarios, chunk_size=None):
+        """StressEngine summary per portfolio and scenario: {name: summary DataFrame}."""
+        from stress_engine import StressEngine
+        engine = StressEngine(self.matrix.to_frame(), self.matrix.first_price_date)
+        kwargs = {} if chunk_size is None else {"chunk_size": chunk_size}
+        return {p.name: engine.run(scenarios, p.weights_dict(), **kwargs) for p in self.portfolios}
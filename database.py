@@ -1,7 +1,14 @@
 import sqlite3, pandas as pd
+from incremental_ingest import append_new_rows
+from instrumentation import timer
 DB_PATH = "results/portfolio_returns.db"
 
-def save_portfolio_returns(df, table_name="portfolio_returns"):
+def save_portfolio_returns(df, table_name="portfolio_returns", mode="replace"):
+    """mode='replace' rewrites the table; mode='append' only inserts dates not yet stored."""
     conn = sqlite3.connect(DB_PATH)
-    df.to_sql(table_name, conn, if_exists="replace", index=True)
+    with timer("sqlite_write", table=table_name):
+        if mode == "append":
+            append_new_rows(conn, table_name, df, key=df.index.name or "index")
+        else:
+            df.to_sql(table_name, conn, if_exists="replace", index=True)
     conn.close()
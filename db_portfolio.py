@@ -1,49 +1,186 @@
 import sqlite3
+import datetime
+import queue
+import threading
+import time
+import atexit
 import pandas as pd
 from typing import Dict
 
+from instrumentation import count, timer
+
 DB_PATH = 'milestone2_portfolio.db'
 
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS portfolio (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        date_run TEXT,
+        total_return REAL,
+        volatility REAL
+    );
+    CREATE TABLE IF NOT EXISTS portfolio_assets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        portfolio_id INTEGER,
+        asset TEXT,
+        weight REAL,
+        mean_return REAL,
+        variance REAL,
+        FOREIGN KEY(portfolio_id) REFERENCES portfolio(id)
+    );
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        rule TEXT,
+        message TEXT,
+        ts TEXT
+    );
+    CREATE INDEX IF NOT EXISTS ix_portfolio_assets_portfolio_id ON portfolio_assets(portfolio_id);
+    CREATE INDEX IF NOT EXISTS ix_portfolio_date_run ON portfolio(date_run);
+'''
+
+
+class PortfolioStore:
+    """One long-lived WAL-mode connection per DB file.
+
+    store_many() writes a batch of portfolios in a single transaction with
+    executemany; submit() queues a portfolio for a background writer that
+    commits every `batch_size` records or `flush_interval` seconds.
+    A portfolio record is (name, date_run, total_return, volatility, assets).
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_size=5000, flush_interval=1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA busy_timeout=5000')
+        self.conn.executescript(SCHEMA)
+        self.pending = queue.Queue()
+        self.writer = None
+        # separate from self.lock, which is held for whole batch writes
+        self.writer_lock = threading.Lock()
+
+    # ---- synchronous batch writes ----
+    def store_many(self, records):
+        """Insert many portfolios (and their assets) in one transaction. Returns their ids."""
+        records = list(records)
+        if not records:
+            return []
+        with self.lock, timer('sqlite_write', table='portfolio'):
+            c = self.conn
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                # ids are assigned here so asset rows can reference them without per-row lastrowid
+                seq = c.execute("SELECT seq FROM sqlite_sequence WHERE name = 'portfolio'").fetchone()
+                top = c.execute('SELECT MAX(id) FROM portfolio').fetchone()[0]
+                base = max(seq[0] if seq else 0, top or 0) + 1
+                ids = list(range(base, base + len(records)))
+                c.executemany('INSERT INTO portfolio (id, name, date_run, total_return, volatility) VALUES (?, ?, ?, ?, ?)',
+                              [(pid, name, date_run, total_return, volatility)
+                               for pid, (name, date_run, total_return, volatility, _) in zip(ids, records)])
+                c.executemany('INSERT INTO portfolio_assets (portfolio_id, asset, weight, mean_return, variance) VALUES (?, ?, ?, ?, ?)',
+                              [(pid, asset, meta.get('weight'), meta.get('mean_return'), meta.get('variance'))
+                               for pid, rec in zip(ids, records) for asset, meta in rec[4].items()])
+                c.execute('COMMIT')
+            except Exception:
+                c.execute('ROLLBACK')
+                raise
+        count('sqlite_rows', len(records), table='portfolio')
+        return ids
+
+    def add_alerts(self, rows):
+        ts = datetime.datetime.utcnow().isoformat()
+        with self.lock, timer('sqlite_write', table='alerts'):
+            c = self.conn
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                c.executemany('INSERT INTO alerts (rule, message, ts) VALUES (?, ?, ?)',
+                              [(rule, message, ts) for rule, message in rows])
+                c.execute('COMMIT')
+            except Exception:
+                c.execute('ROLLBACK')
+                raise
+
+    # ---- write-behind queue ----
+    def submit(self, name, date_run, total_return, volatility, assets):
+        if self.writer is None:
+            with self.writer_lock:
+                if self.writer is None:
+                    writer = threading.Thread(target=self._drain, name='portfolio-writer', daemon=True)
+                    writer.start()
+                    self.writer = writer
+        self.pending.put((name, date_run, total_return, volatility, assets))
+
+    def _drain(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            records = [r for r in batch if r is not None]
+            try:
+                self.store_many(records)
+            except Exception as e:
+                print('[db_portfolio] background write failed:', e)
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+
+    def flush(self):
+        """Block until everything submitted so far is committed."""
+        if self.writer is not None:
+            self.pending.put(None)   # wake the writer so it does not wait out flush_interval
+            self.pending.join()
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path=DB_PATH):
+    """Shared PortfolioStore for `db_path` (connection opened once per process)."""
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = _stores[db_path] = PortfolioStore(db_path)
+            atexit.register(store.close)
+        return store
+
+
 def init_db(path=DB_PATH):
-    conn = sqlite3.connect(path)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS portfolio (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            date_run TEXT,
-            total_return REAL,
-            volatility REAL
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS portfolio_assets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            portfolio_id INTEGER,
-            asset TEXT,
-            weight REAL,
-            mean_return REAL,
-            variance REAL,
-            FOREIGN KEY(portfolio_id) REFERENCES portfolio(id)
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    get_store(path)
 
 def store_portfolio(name: str, date_run: str, total_return: float, volatility: float, assets: Dict, db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('INSERT INTO portfolio (name, date_run, total_return, volatility) VALUES (?, ?, ?, ?)', 
-              (name, date_run, total_return, volatility))
-    pid = c.lastrowid
-    for asset, meta in assets.items():
-        c.execute('INSERT INTO portfolio_assets (portfolio_id, asset, weight, mean_return, variance) VALUES (?, ?, ?, ?, ?)',
-                  (pid, asset, meta.get('weight'), meta.get('mean_return'), meta.get('variance')))
-    conn.commit()
-    conn.close()
+    return get_store(db_path).store_many([(name, date_run, total_return, volatility, assets)])[0]
+
+def store_portfolios(records, db_path=DB_PATH):
+    """Bulk version of store_portfolio: records of (name, date_run, total_return, volatility, assets)."""
+    return get_store(db_path).store_many(records)
+
+def add_alerts(rows, db_path=DB_PATH):
+    """Store many (rule, message) alerts in one transaction."""
+    get_store(db_path).add_alerts(rows)
+
+def add_alert(rule: str, message: str, db_path=DB_PATH):
+    add_alerts([(rule, message)], db_path)
 
 def fetch_portfolios(db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query('SELECT * FROM portfolio', conn)
-    conn.close()
+    store = get_store(db_path)
+    store.flush()
+    with store.lock:
+        df = pd.read_sql_query('SELECT * FROM portfolio', store.conn)
     return df
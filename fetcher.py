@@ -0,0 +1,415 @@
+# fetcher.py
+# Concurrent historical bar downloader with an on-disk response cache.
+#
+# A source knows how to fetch OHLCV bars for one symbol over one time range:
+#   YFinanceSource   yfinance (optional dependency, imported on first use)
+#   BinanceSource    Binance REST /api/v3/klines over urllib
+#   FixtureSource    local CSVs (Binance_<SYMBOL>_d.csv or <SYMBOL>.csv), offline
+# FixtureServer serves local CSVs through a Binance-compatible klines endpoint,
+# so BinanceSource (and its retry / rate-limit path) can be exercised without
+# the network.
+#
+# Requested ranges are split into chunks on a fixed, epoch-aligned grid of
+# `max_bars` bars per chunk, so the same chunk has the same cache key no matter
+# which start / end asked for it. Finished chunks are cached on disk keyed by
+# (source, interval, symbol, chunk range); a later call only requests the
+# chunks it does not have (plus the still-open chunk containing "now").
+# Missing chunks for every symbol are downloaded together on a bounded thread
+# pool, behind a shared token bucket, with jittered exponential backoff on
+# throttling, server errors and timeouts.
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import glob, json, os, pickle, re, threading, time
+import urllib.error, urllib.parse, urllib.request
+import numpy as np
+import pandas as pd
+
+from instrumentation import count, timer
+from ratelimit import TokenBucket, retry_call
+
+CACHE_DIR = os.path.join("results", "fetch_cache")
+COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+# interval name -> seconds
+INTERVALS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "4h": 14400, "1d": 86400, "1w": 604800}
+
+
+class RetriableError(Exception):
+    """Throttling or a transient server error: worth retrying after a backoff."""
+
+
+class FetchError(Exception):
+    """The request itself is wrong (unknown symbol, bad range): retrying will not help."""
+
+
+def _empty():
+    return pd.DataFrame({c: pd.Series(dtype="datetime64[ns]" if c == "date" else float) for c in COLUMNS})
+
+
+def _interval_seconds(interval):
+    if interval not in INTERVALS:
+        raise ValueError(f"unknown interval {interval!r}; expected one of {list(INTERVALS)}")
+    return INTERVALS[interval]
+
+
+def chunk_ranges(start, end, interval="1d", max_bars=1000):
+    """Epoch-aligned [chunk_start, chunk_end) Timestamps covering [start, end)."""
+    span = _interval_seconds(interval) * max_bars
+    s = int(pd.Timestamp(start).timestamp())
+    e = int(pd.Timestamp(end).timestamp())
+    if e <= s:
+        return []
+    first, last = s // span, (e - 1) // span
+    return [(pd.Timestamp(k * span, unit="s"), pd.Timestamp((k + 1) * span, unit="s"))
+            for k in range(first, last + 1)]
+
+
+# ---- sources ----
+
+class YFinanceSource:
+    """Daily / intraday bars from Yahoo Finance via yfinance (symbols like BTC-USD)."""
+
+    name = "yfinance"
+    max_bars = 2000
+    rate = 2.0              # requests per second
+    max_workers = 4
+    _intervals = {"1w": "1wk"}
+
+    def fetch(self, symbol, start, end, interval="1d"):
+        try:
+            import yfinance as yf
+        except ImportError:
+            raise ImportError("YFinanceSource needs the 'yfinance' package (pip install yfinance)")
+        try:
+            data = yf.download(symbol, start=start.strftime("%Y-%m-%d"), end=end.strftime("%Y-%m-%d"),
+                               interval=self._intervals.get(interval, interval), progress=False,
+                               auto_adjust=False, threads=False)
+        except Exception as e:
+            raise RetriableError(f"yfinance {symbol}: {e}") from e
+        if data is None or data.empty:
+            return _empty()
+        data = data.reset_index()
+        # yfinance may return (field, ticker) MultiIndex columns
+        data.columns = [str(col[0] if isinstance(col, tuple) else col).lower() for col in data.columns]
+        data = data.rename(columns={"datetime": "date"})
+        dates = pd.to_datetime(data["date"])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_convert(None)
+        out = pd.DataFrame({"date": dates})
+        for c in COLUMNS[1:]:
+            out[c] = pd.to_numeric(data[c], errors="coerce") if c in data.columns else np.nan
+        return out
+
+
+class BinanceSource:
+    """Klines from the Binance REST API (symbols like BTCUSDT); 1000 bars per request."""
+
+    name = "binance"
+    max_bars = 1000
+    rate = 10.0
+    max_workers = 8
+
+    def __init__(self, base_url="https://api.binance.com", timeout=15):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def fetch(self, symbol, start, end, interval="1d"):
+        query = urllib.parse.urlencode({
+            "symbol": symbol, "interval": interval, "limit": self.max_bars,
+            "startTime": int(start.timestamp() * 1000), "endTime": int(end.timestamp() * 1000) - 1,
+        })
+        url = f"{self.base_url}/api/v3/klines?{query}"
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as resp:
+                rows = json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            if e.code in (418, 429) or e.code >= 500:
+                raise RetriableError(f"{symbol}: HTTP {e.code}") from e
+            raise FetchError(f"{symbol}: HTTP {e.code} {e.read()[:200]!r}") from e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise RetriableError(f"{symbol}: {e}") from e
+        if not rows:
+            return _empty()
+        arr = np.asarray([r[:6] for r in rows], dtype=float)
+        out = pd.DataFrame(arr[:, 1:], columns=COLUMNS[1:])
+        out.insert(0, "date", pd.to_datetime(arr[:, 0].astype(np.int64), unit="ms"))
+        return out
+
+
+def _load_fixture_frames(paths):
+    from price_store import read_csv_cached, _symbol_from_filename
+    frames = {}
+    for p in paths:
+        df = read_csv_cached(p)
+        df.columns = [c.lower() for c in df.columns]
+        if "date" not in df.columns or "close" not in df.columns:
+            continue
+        out = pd.DataFrame({"date": pd.to_datetime(df["date"])})
+        for c in COLUMNS[1:]:
+            out[c] = pd.to_numeric(df[c], errors="coerce") if c in df.columns else np.nan
+        name = os.path.basename(p)
+        sym = _symbol_from_filename(p) if name.lower().startswith("binance_") else os.path.splitext(name)[0]
+        frames[sym] = out.sort_values("date").reset_index(drop=True)
+    return frames
+
+
+class FixtureSource:
+    """Bars from local CSVs, for offline runs and tests.
+
+    frames: {symbol: DataFrame with COLUMNS}, or None to load `paths`
+    (default Binance_*_d.csv in the working directory).
+    """
+
+    name = "fixture"
+    max_bars = 1000
+    rate = None
+    max_workers = 4
+
+    def __init__(self, paths=None, frames=None):
+        self.frames = frames if frames is not None else _load_fixture_frames(
+            sorted(glob.glob("Binance_*_d.csv")) if paths is None else paths)
+
+    def fetch(self, symbol, start, end, interval="1d"):
+        df = self.frames.get(symbol)
+        if df is None:
+            raise FetchError(f"no fixture data for {symbol}")
+        return df[(df["date"] >= start) & (df["date"] < end)].reset_index(drop=True)
+
+
+class FixtureServer:
+    """Local HTTP server answering /api/v3/klines from fixture frames.
+
+    with FixtureServer(latency=0.05, fail_every=10) as srv:
+        Fetcher(BinanceSource(srv.url)).fetch_many(...)
+
+    latency: seconds slept per request; fail_every: answer every n-th request with HTTP 429.
+    """
+
+    def __init__(self, frames=None, paths=None, latency=0.0, fail_every=None, host="127.0.0.1", port=0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.frames = frames if frames is not None else FixtureSource(paths).frames
+        self.latency = latency
+        self.fail_every = fail_every
+        self.requests = 0
+        self.lock = threading.Lock()
+        # per symbol: open times in ms and the OHLCV values as strings, built once
+        self.tables = {}
+        for sym, df in self.frames.items():
+            ms = df["date"].to_numpy().astype("datetime64[ms]").astype(np.int64)
+            self.tables[sym] = (ms, df[COLUMNS[1:]].to_numpy().astype(str).tolist())
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    n = server.requests
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.fail_every and n % server.fail_every == 0:
+                    return self._send(429, {"code": -1003, "msg": "Too many requests"})
+                url = urllib.parse.urlparse(self.path)
+                if url.path != "/api/v3/klines":
+                    return self._send(404, {"code": -1, "msg": "not found"})
+                q = dict(urllib.parse.parse_qsl(url.query))
+                table = server.tables.get(q.get("symbol"))
+                if table is None:
+                    return self._send(400, {"code": -1121, "msg": "Invalid symbol."})
+                ms, values = table
+                lo = int(np.searchsorted(ms, int(q.get("startTime", 0)), side="left"))
+                hi = int(np.searchsorted(ms, int(q.get("endTime", 2 ** 62)), side="right"))
+                hi = min(hi, lo + int(q.get("limit", 500)))
+                step = INTERVALS.get(q.get("interval", "1d"), 86400) * 1000
+                self._send(200, [[int(ms[i]), *values[i], int(ms[i]) + step - 1] for i in range(lo, hi)])
+
+            def _send(self, code, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+# ---- cache ----
+
+class ResponseCache:
+    """Finished chunks as pickled frames under <root>/<source>/<interval>/<symbol>/<start>_<end>.pkl."""
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+
+    def _path(self, source, symbol, interval, start, end):
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", symbol)
+        return os.path.join(self.root, source, interval, safe,
+                            f"{start.strftime('%Y%m%dT%H%M%S')}_{end.strftime('%Y%m%dT%H%M%S')}.pkl")
+
+    def get(self, source, symbol, interval, start, end):
+        path = self._path(source, symbol, interval, start, end)
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # unreadable entry: treat as missing and fetch again
+            return None
+
+    def put(self, source, symbol, interval, start, end, frame):
+        path = self._path(source, symbol, interval, start, end)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+
+# ---- fetcher ----
+
+class Fetcher:
+    """Download bars for many symbols at once, reusing cached chunks.
+
+    f = Fetcher(BinanceSource())
+    frames = f.fetch_many(["BTCUSDT", "ETHUSDT"], "2020-01-01", "2024-01-01")   # {symbol: DataFrame}
+    f.stats   # requests, cache hits, retries, failures, seconds
+
+    max_workers / rate default to the source's; rate is requests per second
+    shared by all workers (None = unlimited).
+    """
+
+    def __init__(self, source=None, cache_dir=CACHE_DIR, max_workers=None, rate="source", retries=4,
+                 base_delay=0.5, use_cache=True):
+        self.source = source or BinanceSource()
+        self.cache = ResponseCache(cache_dir) if use_cache and cache_dir else None
+        self.max_workers = max_workers or getattr(self.source, "max_workers", 4)
+        rate = getattr(self.source, "rate", None) if rate == "source" else rate
+        self.limiter = TokenBucket(rate, burst=max(1, int(rate))) if rate else None
+        self.retries = retries
+        self.base_delay = base_delay
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.errors = {}
+
+    def _bump(self, key, n=1):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def _fetch_chunk(self, symbol, interval, start, end):
+        def call():
+            if self.limiter:
+                self.limiter.acquire()
+            self._bump("requests")
+            with timer("http_fetch", source=self.source.name):
+                return self.source.fetch(symbol, start, end, interval)
+
+        def on_retry(attempt, e, delay):
+            self._bump("retries")
+            count("fetch_retries", source=self.source.name)
+
+        frame = retry_call(call, attempts=self.retries, base_delay=self.base_delay,
+                           exceptions=(RetriableError,), on_retry=on_retry)
+        return frame[(frame["date"] >= start) & (frame["date"] < end)]
+
+    def fetch_many(self, symbols, start, end=None, interval="1d", starts=None):
+        """{symbol: bars in [start, end)}; starts={symbol: start} overrides `start` per symbol.
+
+        Symbols whose download failed are left out and listed in self.errors.
+        """
+        t0 = time.perf_counter()
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp.now("UTC").tz_localize(None)
+        step = pd.Timedelta(seconds=_interval_seconds(interval))
+        # a chunk is final once its last bar has closed
+        final_before = pd.Timestamp.now("UTC").tz_localize(None) - step
+        max_bars = getattr(self.source, "max_bars", 1000)
+        self.stats, self.errors = {}, {}
+        ranges = {s: (pd.Timestamp((starts or {}).get(s, start)), end) for s in symbols}
+        parts = {s: {} for s in symbols}
+        todo = []
+        for sym, (s, e) in ranges.items():
+            for cs, ce in chunk_ranges(s, e, interval, max_bars):
+                cached = self.cache.get(self.source.name, sym, interval, cs, ce) if self.cache else None
+                if cached is not None:
+                    parts[sym][cs] = cached
+                    self._bump("cache_hits")
+                else:
+                    todo.append((sym, cs, ce))
+        if todo:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(todo))) as ex:
+                futures = {ex.submit(self._fetch_chunk, sym, interval, cs, ce): (sym, cs, ce) for sym, cs, ce in todo}
+                for fut in as_completed(futures):
+                    sym, cs, ce = futures[fut]
+                    try:
+                        frame = fut.result()
+                    except Exception as e:
+                        self.errors.setdefault(sym, []).append(f"{cs:%Y-%m-%d}..{ce:%Y-%m-%d}: {e}")
+                        self._bump("failures")
+                        continue
+                    parts[sym][cs] = frame
+                    if self.cache and ce <= final_before:
+                        self.cache.put(self.source.name, sym, interval, cs, ce, frame)
+        out = {}
+        for sym, chunks in parts.items():
+            if sym in self.errors:
+                print(f"[WARN] {sym}: {len(self.errors[sym])} chunk(s) failed, e.g. {self.errors[sym][0]}")
+                continue
+            s, e = ranges[sym]
+            frames = [chunks[k] for k in sorted(chunks)]
+            df = pd.concat(frames, ignore_index=True) if frames else _empty()
+            out[sym] = df[(df["date"] >= s) & (df["date"] < e)].drop_duplicates("date", keep="last") \
+                .reset_index(drop=True)
+        self.stats["seconds"] = time.perf_counter() - t0
+        self.stats["symbols"] = len(out)
+        count("fetch_requests", self.stats.get("requests", 0), source=self.source.name)
+        count("fetch_cache_hits", self.stats.get("cache_hits", 0), source=self.source.name)
+        return out
+
+    def fetch(self, symbol, start, end=None, interval="1d"):
+        return self.fetch_many([symbol], start, end, interval).get(symbol, _empty())
+
+
+def backfill(symbols, start, end=None, interval="1d", source=None, **kwargs):
+    """One-call helper: Fetcher(source, **kwargs).fetch_many(...)."""
+    return Fetcher(source, **kwargs).fetch_many(symbols, start, end, interval)
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Backfill historical bars into the response cache.")
+    ap.add_argument("symbols", nargs="+")
+    ap.add_argument("--start", default="2020-01-01")
+    ap.add_argument("--end", default=None)
+    ap.add_argument("--interval", default="1d", choices=list(INTERVALS))
+    ap.add_argument("--source", default="binance", choices=["binance", "yfinance", "fixture"])
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+    src = {"binance": BinanceSource, "yfinance": YFinanceSource, "fixture": FixtureSource}[args.source]()
+    f = Fetcher(src, max_workers=args.workers)
+    frames = f.fetch_many(args.symbols, args.start, args.end, args.interval)
+    for sym, df in frames.items():
+        print(f"[INFO] {sym}: {len(df)} bars" + (f" {df['date'].iloc[0]:%Y-%m-%d} .. {df['date'].iloc[-1]:%Y-%m-%d}"
+                                                  if len(df) else ""))
+    print("[INFO]", f.stats)
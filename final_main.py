@@ -22,27 +22,52 @@ def safe_import(mod_name_variants):
             continue
     return None
 
-rules_mod = safe_import(["rules"])
-portfolio_mod = safe_import(["portfolio"])
-stress_mod = safe_import(["stress_test", "stress_test_full"])
-database_mod = safe_import(["database"])
-predictor_mod = safe_import(["predictor"])
-db_portfolio_mod = safe_import(["DB_portfolio", "db_portfolio"])
-mail_mod = safe_import(["mailSending", "mail_sending", "mail"])
-
-get_weights_risk_parity = getattr(rules_mod, "get_weights_risk_parity", None)
-PortfolioClass = getattr(portfolio_mod, "Portfolio", None)
-apply_shock = getattr(stress_mod, "apply_shock", None) if stress_mod is not None else None
-save_portfolio_returns = getattr(database_mod, "save_portfolio_returns", None)
-predictor = predictor_mod
-add_alert = getattr(db_portfolio_mod, "add_alert", None) if db_portfolio_mod else None
-send_alert = getattr(mail_mod, "send_alert", None) if mail_mod else None
-ai_alert = getattr(mail_mod, "ai_alert", None) if mail_mod else None
-
-import pandas as pd, sqlite3
+# Optional modules are resolved on first use, so each subcommand only pays
+# for what it touches (a risk check never loads sklearn or the mail stack).
+MODULES = {
+    "rules": ["rules"],
+    "portfolio": ["portfolio"],
+    "stress_test": ["stress_test", "stress_test_full"],
+    "stress_engine": ["stress_engine"],
+    "database": ["database"],
+    "predictor": ["predictor"],
+    "db_portfolio": ["DB_portfolio", "db_portfolio"],
+    "mail": ["mailSending", "mail_sending", "mail"],
+    "risk": ["Risk_checker", "risk_checker", "RiskChecker"],
+}
+_loaded = {}
+
+def module(key):
+    """Import the first available variant of MODULES[key] once; None if none import."""
+    if key not in _loaded:
+        _loaded[key] = safe_import(MODULES[key])
+    return _loaded[key]
+
+def _attr(key, name):
+    mod = module(key)
+    return getattr(mod, name, None) if mod is not None else None
+
+def _send_alert():
+    return _attr("mail", "send_alert_async") or _attr("mail", "send_alert")
+
+# names this module used to bind eagerly at import time
+_COMPAT = {
+    "get_weights_risk_parity": lambda: _attr("rules", "get_weights_risk_parity"),
+    "PortfolioClass": lambda: _attr("portfolio", "Portfolio"),
+    "apply_shock": lambda: _attr("stress_test", "apply_shock"),
+    "save_portfolio_returns": lambda: _attr("database", "save_portfolio_returns"),
+    "predictor": lambda: module("predictor"),
+    "add_alerts": lambda: _attr("db_portfolio", "add_alerts"),
+    "send_alert": _send_alert,
+    "ai_alert": lambda: _attr("mail", "ai_alert"),
+}
+
+def __getattr__(name):
+    if name in _COMPAT:
+        return _COMPAT[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 RESULTS_DIR = "results"
-os.makedirs(RESULTS_DIR, exist_ok=True)
 
 def find_csv_candidate():
     candidates = [
@@ -59,35 +84,19 @@ def find_csv_candidate():
             return f
     return None
 
-def load_combined(path=None):
+def load_combined(path=None, store=None):
     if path is None:
         path = find_csv_candidate()
     if path is None:
         raise FileNotFoundError("No CSV found. Place Crypto_metrics_daily.csv in project root or data/")
+    import pandas as pd
+    from price_store import read_csv_cached
+    from streaming_loader import column_map
     print(f"[INFO] Loading CSV: {path}")
-    df = pd.read_csv(path)
-    # Normalize column names
-    col_map = {}
-    lower_map = {c.lower(): c for c in df.columns}
-    if "asset" not in [c.lower() for c in df.columns]:
-        for alt in ("symbol", "ticker", "asset_name"):
-            if alt in lower_map:
-                col_map[lower_map[alt]] = "asset"
-                break
-    if "close" not in [c.lower() for c in df.columns]:
-        for alt in ("close_price", "price", "last_price"):
-            if alt in lower_map:
-                col_map[lower_map[alt]] = "close"
-                break
-    if "date" not in [c.lower() for c in df.columns]:
-        for alt in ("timestamp", "time", "datetime"):
-            if alt in lower_map:
-                col_map[lower_map[alt]] = "date"
-                break
-    # New auto-fix: map 'daily_return' to 'close' if present
-    if "daily_return" in lower_map and "close" not in [c.lower() for c in df.columns]:
-        col_map[lower_map["daily_return"]] = "close"
-        print("[INFO] Detected 'daily_return' column — mapping it to 'close' automatically.")
+    # Served from the columnar price store when it holds a fresh ingest of this CSV
+    df = read_csv_cached(path, store)
+    # Normalize column names (shared with the chunked loader)
+    col_map = column_map(df.columns)
     if col_map:
         df = df.rename(columns=col_map)
         print(f"[INFO] Renamed columns: {col_map}")
@@ -103,12 +112,18 @@ def load_combined(path=None):
     return df
 
 def save_portfolio_sql(df, db_path=os.path.join(RESULTS_DIR, "portfolio_returns.db")):
+    import sqlite3
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    from instrumentation import timer
     conn = sqlite3.connect(db_path)
-    df.to_sql("portfolio_returns", conn, if_exists="replace", index=True)
+    with timer("sqlite_write", table="portfolio_returns"):
+        df.to_sql("portfolio_returns", conn, if_exists="replace", index=True)
     conn.close()
     print(f"[INFO] Saved portfolio returns to {db_path}")
 
 def run_risk_parity(df):
+    get_weights_risk_parity = _attr("rules", "get_weights_risk_parity")
+    PortfolioClass = _attr("portfolio", "Portfolio")
     if get_weights_risk_parity is None or PortfolioClass is None:
         print("[WARN] Risk-Parity or Portfolio modules not available. Skipping this step.")
         return None, None
@@ -119,6 +134,7 @@ def run_risk_parity(df):
         print(f"  {a}: {w:.4f}")
     p = PortfolioClass(df)
     port_ret = p.run(weights)
+    save_portfolio_returns = _attr("database", "save_portfolio_returns")
     if save_portfolio_returns:
         try:
             save_portfolio_returns(port_ret)
@@ -131,26 +147,32 @@ def run_risk_parity(df):
     return port_ret, weights
 
 def run_stress_test(df, weights):
-    if apply_shock is None or PortfolioClass is None:
+    stress_engine_mod = module("stress_engine")
+    PortfolioClass = _attr("portfolio", "Portfolio")
+    if stress_engine_mod is None or PortfolioClass is None:
         print("[WARN] Stress test module not available. Skipping.")
         return None
+    # one pivot, then every scenario is evaluated on the return matrix
+    engine = stress_engine_mod.StressEngine.from_portfolio(PortfolioClass(df))
     shock_date = df["date"].iloc[len(df)//2] if "date" in df.columns else df.index[len(df)//2]
-    assets = sorted(df["asset"].unique())
-    shock_map = {a: -0.20 for a in assets}
-    shocked = apply_shock(df, shock_date, shock_map)
-    p_shocked = PortfolioClass(shocked)
-    shocked_ret = p_shocked.run(weights)
+    scenarios = [{"name": "shock -20%", "shock_date": shock_date, "shocks": -0.20}]
+    scenarios += stress_engine_mod.regime_scenarios()
+    summary = engine.run(scenarios, weights)
+    shocked_ret = engine.portfolio_paths(scenarios[:1], weights).iloc[0].to_frame(name="portfolio_return")
     print(f"[INFO] Stress test (-20%) sample output:")
     print(shocked_ret.head())
+    print("[INFO] Stress scenarios (P&L / max drawdown):")
+    print(summary[["pnl", "max_drawdown", "worst_day"]])
     return shocked_ret
 
 def run_predictor():
+    predictor = module("predictor")
     if predictor is None:
         print("[WARN] predictor module not available. Skipping predictions.")
         return None
     try:
         dfp = predictor.load_data_from_csvs()
-        results = predictor.run_all_predictions(dfp)
+        results = predictor.run_all_predictions(dfp, online=True)
         if hasattr(predictor, "store_predictions") and results:
             try:
                 predictor.store_predictions(results)
@@ -161,73 +183,216 @@ def run_predictor():
         print("[ERROR] Prediction run failed:", e)
         return None
 
-def run_risk_checks(port_ret=None):
-    risk_mod = safe_import(["Risk_checker", "risk_checker", "RiskChecker"])
+def run_risk_checks(port_ret=None, weights=None):
+    risk_mod = module("risk")
     if risk_mod is None:
         print("[WARN] Risk checker module not found. Skipping risk rules.")
         return None
     try:
-        results = risk_mod.run_all_rules()
+        if port_ret is not None:
+            import pandas as pd
+            w = pd.DataFrame([weights], index=list(port_ret.columns)) if weights else None
+            results, breaches = risk_mod.evaluate_rules(returns=port_ret, weights=w)
+        else:
+            results, breaches = risk_mod.evaluate_rules()
     except Exception as e:
         print("[ERROR] Running risk rules failed:", e)
         return None
-    any_fail = False
-    for rname, passed, val in results:
-        print(f"Rule {rname}: passed={passed}, value={val}")
-        if not passed:
-            any_fail = True
-            if add_alert:
-                try:
-                    add_alert(rname, str(val))
-                except Exception:
-                    pass
-            if send_alert:
-                try:
-                    send_alert(f"Risk Alert: {rname}", str(val))
-                except Exception:
-                    pass
-            if ai_alert:
-                try:
-                    ai_alert(rname, str(val), {"rule": rname})
-                except Exception:
-                    pass
-    if any_fail:
-        print("[INFO] One or more risk rules failed. Alerts attempted.")
+    for rname, portfolio, passed, val in results:
+        print(f"Rule {rname} [{portfolio}]: passed={passed}, value={val}")
+    if breaches:
+        # one batched dispatch for every breach (DB, email digest, AI log)
+        from risk_engine import dispatch
+        dispatch(breaches, add_alerts=_attr("db_portfolio", "add_alerts"), send_alert=_send_alert(),
+                 ai_alert=_attr("mail", "ai_alert"))
+        print(f"[INFO] {len(breaches)} risk rule breach(es). Alerts dispatched once.")
     else:
         print("[INFO] All risk rules passed.")
     return results
 
-def main():
-    print("=== Crypto Portfolio Manager (Final Main v3) ===")
+def _load():
+    os.makedirs(RESULTS_DIR, exist_ok=True)
     try:
         df = load_combined()
     except Exception as e:
         print("[FATAL] Failed to load CSV:", e)
         print("Please ensure a CSV with 'asset' and 'close' columns exists in project root or data/ folder.")
-        return
+        return None
     if "asset" not in df.columns or "close" not in df.columns:
         print("[FATAL] Required columns missing after load. Columns found:", df.columns.tolist())
-        return
+        return None
+    return df
+
+def _weights(df):
     try:
-        port_ret, weights = run_risk_parity(df)
+        return run_risk_parity(df)
     except Exception as e:
         print("[ERROR] Risk-Parity step failed:", e)
-        port_ret, weights = None, None
+        return None, None
+
+# ---- subcommands ----
+def cmd_ingest(args):
+    from price_store import ingest_all, default_sources
+    paths = args.paths or default_sources()
+    ingest_all(paths, incremental=not args.full)
+    print(f"[INFO] Ingested {len(paths)} file(s) into the price store.")
+
+def cmd_weights(args):
+    df = _load()
+    if df is not None:
+        _weights(df)
+
+def cmd_stress(args):
+    df = _load()
+    if df is None:
+        return
+    _, weights = _weights(df)
     try:
         if weights is not None:
-            _ = run_stress_test(df, weights)
+            run_stress_test(df, weights)
     except Exception as e:
         print("[ERROR] Stress test failed:", e)
+
+def cmd_predict(args):
     try:
-        _ = run_predictor()
+        run_predictor()
     except Exception as e:
         print("[ERROR] Predictor error:", e)
+
+def cmd_risk(args):
+    df = _load()
+    if df is None:
+        return
+    port_ret, weights = _weights(df)
     try:
-        _ = run_risk_checks(port_ret)
+        run_risk_checks(port_ret, weights)
     except Exception as e:
         print("[ERROR] Risk check error:", e)
+
+def cmd_live(args):
+    from live_stream import CSVReplaySource, WebSocketSource, run_live
+    source = WebSocketSource(args.url) if args.url else CSVReplaySource(speed=args.speed)
+    stats = run_live(source, max_steps=args.steps)
+    print("[INFO] Live stream finished:", {k: round(v, 6) if isinstance(v, float) else v for k, v in stats.items()})
+
+# files run_predictor reads on its own (it does not use the loaded frame)
+PREDICTOR_FILES = ["Binance_*_d.csv", "portfolio_vs_assests*.csv", "Portfolio_vs_assests*.csv"]
+
+def build_pipeline(max_workers=4, use_cache=True):
+    """The report run as a DAG: predict is independent of load -> weights -> (stress, risk)."""
+    from pipeline import Pipeline, Stage
+
+    def load():
+        df = _load()
+        if df is None:
+            raise RuntimeError("no usable CSV")
+        return df
+
+    def weights(df):
+        port_ret, w = _weights(df)
+        return {"port_ret": port_ret, "weights": w}
+
+    def stress(df, weights):
+        return run_stress_test(df, weights) if weights is not None else None
+
+    csv = find_csv_candidate()
+    return Pipeline([
+        Stage("load", load, outputs=["df"], files=[csv] if csv else [],
+              modules=["price_store", "streaming_loader"]),
+        # weights saves portfolio returns, predict stores predictions and risk
+        # dispatches alerts: side effects, so they run every time
+        Stage("weights", weights, inputs=["df"], outputs=["port_ret", "weights"], cache=False),
+        Stage("stress", stress, inputs=["df", "weights"], outputs=["stress"],
+              modules=["stress_engine", "portfolio"]),
+        Stage("predict", run_predictor, outputs=["predictions"], files=PREDICTOR_FILES, cache=False),
+        Stage("risk", run_risk_checks, inputs=["port_ret", "weights"], outputs=["risk"], cache=False),
+    ], max_workers=max_workers, use_cache=use_cache)
+
+def cmd_report(args):
+    print("=== Crypto Portfolio Manager (Final Main v3) ===")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    from pipeline import format_report
+    pipe = build_pipeline(max_workers=1 if args.sequential else args.workers, use_cache=not args.no_cache)
+    _, report = pipe.run()
     print("=== Demo Complete ===")
+    print(format_report(report))
     print(f"Check the {RESULTS_DIR}/ folder and SQLite DB files for outputs.")
 
+# modules a bare `import final_main` must not pull in
+HEAVY_MODULES = ("pandas", "numpy", "sklearn", "matplotlib", "scipy")
+
+def check_import_budget(budget=0.3, forbidden=HEAVY_MODULES, python=None):
+    """Import final_main in a fresh interpreter; returns (ok, seconds, heavy modules loaded).
+
+    Meant for CI / cron health checks: fails when startup exceeds `budget`
+    seconds or when importing the entry point drags in a heavy dependency.
+    """
+    import subprocess
+    code = ("import sys, time; t = time.perf_counter(); import final_main; "
+            "print(time.perf_counter() - t); "
+            f"print(','.join(m for m in {tuple(forbidden)!r} if m in sys.modules))")
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([python or sys.executable, "-c", code], cwd=here, capture_output=True, text=True, check=True)
+    lines = out.stdout.strip().splitlines()
+    elapsed = float(lines[0])
+    loaded = [m for m in (lines[1].split(",") if len(lines) > 1 else []) if m]
+    return elapsed <= budget and not loaded, elapsed, loaded
+
+def cmd_check_startup(args):
+    ok, elapsed, loaded = check_import_budget(args.budget)
+    print(f"[INFO] import final_main: {elapsed * 1000:.1f} ms (budget {args.budget * 1000:.0f} ms)")
+    if loaded:
+        print("[WARN] Heavy modules imported at startup:", ", ".join(loaded))
+    return 0 if ok else 1
+
+COMMANDS = {
+    "ingest": (cmd_ingest, "ingest CSVs into the columnar price store"),
+    "weights": (cmd_weights, "compute risk-parity weights and save portfolio returns"),
+    "stress": (cmd_stress, "run stress scenarios on the risk-parity portfolio"),
+    "predict": (cmd_predict, "refresh forecasts and store predictions"),
+    "risk": (cmd_risk, "evaluate risk rules and dispatch alerts"),
+    "report": (cmd_report, "run every step (default)"),
+    "live": (cmd_live, "stream prices into live valuation and risk alerts"),
+    "check-startup": (cmd_check_startup, "verify import time stays within budget"),
+}
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="final_main.py", description="Crypto Portfolio Manager")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record timings / counters and write them to results/metrics (also PORTFOLIO_METRICS=1)")
+    parser.add_argument("--profile", choices=("cprofile", "sample"),
+                        help="profile each pipeline stage into results/profiles")
+    sub = parser.add_subparsers(dest="command")
+    for name, (_, help_text) in COMMANDS.items():
+        sp = sub.add_parser(name, help=help_text)
+        if name == "ingest":
+            sp.add_argument("paths", nargs="*", help="CSV files (default: project CSVs)")
+            sp.add_argument("--full", action="store_true", help="re-ingest everything instead of only new rows")
+        if name == "report":
+            sp.add_argument("--workers", type=int, default=4, help="stages run concurrently")
+            sp.add_argument("--sequential", action="store_true", help="run stages one at a time")
+            sp.add_argument("--no-cache", action="store_true", help="rerun stages even if their inputs are unchanged")
+        if name == "live":
+            sp.add_argument("--speed", type=float, default=None, help="replayed bars per second (default: max)")
+            sp.add_argument("--steps", type=int, default=None, help="stop after this many timestamps")
+            sp.add_argument("--url", default=None, help="websocket kline stream instead of replaying the Binance CSVs")
+        if name == "check-startup":
+            sp.add_argument("--budget", type=float, default=0.3, help="seconds")
+    argv = list(sys.argv[1:] if argv is None else argv)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args = parser.parse_args(argv + ["report"])
+    if args.metrics or args.profile:
+        import instrumentation
+        instrumentation.enable(profile=args.profile)
+    fn = COMMANDS[args.command][0]
+    rc = fn(args)
+    if "instrumentation" in sys.modules and sys.modules["instrumentation"].enabled():
+        instrumentation = sys.modules["instrumentation"]
+        print(instrumentation.format_summary())
+        print(f"[INFO] Metrics written to {instrumentation.export()}")
+    return rc
+
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,265 @@
+# forecasting.py
+# Walk-forward, out-of-sample forecasting of next-day returns from OHLCV features.
+#
+# Features are built once for every symbol as date x symbol panels (lagged
+# returns, rolling mean / volatility, intraday range, volume change, distance
+# from moving average) and flattened to one pooled row per (date, symbol),
+# ordered by date. Each fold trains on every row before its test block and
+# scores the next block (expanding window), so no fold ever sees its own
+# evaluation data. Linear candidates fit from X'X / X'y which are accumulated
+# fold to fold, so a new fold only adds its new rows instead of refitting on
+# the whole prefix. Candidates run in parallel worker processes.
+
+from concurrent.futures import ProcessPoolExecutor
+import glob, os, time
+import numpy as np
+import pandas as pd
+
+from price_store import read_csv_cached
+
+OHLCV = ("open", "high", "low", "close", "volume")
+
+
+# ---- data ----
+
+def load_ohlcv_panel(paths=None, store=None):
+    """Binance_<SYMBOL>_d.csv files -> {column: date x symbol DataFrame}."""
+    if paths is None:
+        paths = sorted(glob.glob("Binance_*_d.csv"))
+    frames = {}
+    for p in paths:
+        df = read_csv_cached(p, store)
+        df.columns = [c.lower() for c in df.columns]
+        if "date" not in df.columns or "close" not in df.columns:
+            continue
+        stem = os.path.splitext(os.path.basename(p))[0]
+        parts = stem.split("_")
+        sym = parts[1] if len(parts) >= 3 else stem     # Binance_BTCUSDT_d -> BTCUSDT
+        df["date"] = pd.to_datetime(df["date"])
+        df["symbol"] = sym
+        frames[sym] = df
+    if not frames:
+        return {}
+    return panel_from_long(pd.concat(frames.values(), ignore_index=True))
+
+
+def panel_from_long(df, symbol_col="symbol"):
+    """Long frame (date, symbol, open, high, low, close, volume) -> {column: date x symbol}."""
+    df = df.drop_duplicates(["date", symbol_col], keep="last")
+    panel = {}
+    for col in OHLCV:
+        if col in df.columns:
+            panel[col] = df.pivot(index="date", columns=symbol_col, values=col).sort_index().astype(float)
+    return panel
+
+
+# ---- features ----
+
+def build_features(panel, lags=(1, 2, 3, 5, 10), windows=(5, 10, 20)):
+    """-> (X rows x F, y rows, row date position, row symbol position, feature names, dates, symbols).
+
+    Row t of a symbol only uses data up to date t; its target is the return
+    from t to t+1. Rows with any missing feature or target are dropped.
+    """
+    close = panel["close"]
+    dates, symbols = close.index, close.columns
+    C = close.to_numpy()
+    ret = close.pct_change(fill_method=None)
+    feats, names = [], []
+    for k in lags:
+        feats.append(ret.shift(k - 1).to_numpy())
+        names.append(f"ret_lag{k}")
+    for w in windows:
+        roll = ret.rolling(w, min_periods=w)
+        feats += [roll.mean().to_numpy(), roll.std().to_numpy(),
+                  C / close.rolling(w, min_periods=w).mean().to_numpy() - 1.0]
+        names += [f"ret_mean{w}", f"ret_std{w}", f"dist_ma{w}"]
+    if "high" in panel and "low" in panel:
+        feats.append((panel["high"].to_numpy() - panel["low"].to_numpy()) / C)
+        names.append("hl_range")
+    if "open" in panel:
+        feats.append(C / panel["open"].to_numpy() - 1.0)
+        names.append("open_close")
+    if "volume" in panel:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lv = np.log(panel["volume"].where(panel["volume"] > 0))
+        feats.append(lv.diff().to_numpy())
+        names.append("log_volume_chg")
+    target = ret.shift(-1).to_numpy()
+
+    X = np.stack(feats, axis=-1).reshape(-1, len(feats))      # rows ordered by (date, symbol)
+    y = target.reshape(-1)
+    ok = np.isfinite(X).all(axis=1) & np.isfinite(y)
+    pos = np.flatnonzero(ok)
+    return X[ok], y[ok], pos // len(symbols), pos % len(symbols), names, dates, symbols
+
+
+def expanding_folds(row_dates, n_dates, n_folds=5, min_train=60):
+    """Row slices [(train_end, test_end)] for expanding-window folds over date positions."""
+    first = int(row_dates.min()) if len(row_dates) else 0
+    start = first + min_train
+    if start >= n_dates:
+        return []
+    edges = np.linspace(start, n_dates, n_folds + 1).astype(int)
+    bounds = np.searchsorted(row_dates, edges, side="left")
+    return [(int(bounds[i]), int(bounds[i + 1])) for i in range(n_folds) if bounds[i + 1] > bounds[i]]
+
+
+# ---- candidates ----
+
+def _sklearn_candidates():
+    try:
+        from sklearn.ensemble import HistGradientBoostingRegressor
+    except ImportError:
+        return {}
+    return {"hgb": ("sklearn", {"factory": HistGradientBoostingRegressor,
+                                "params": {"max_iter": 100, "learning_rate": 0.05}})}
+
+
+def default_candidates():
+    cands = {
+        "zero": ("zero", {}),
+        "mean": ("mean", {}),
+        "ols": ("linear", {"alpha": 0.0}),
+        "ridge": ("linear", {"alpha": 1.0}),
+        "ridge_strong": ("linear", {"alpha": 100.0}),
+    }
+    cands.update(_sklearn_candidates())
+    return cands
+
+
+def _solve_linear(G, b, alpha):
+    """Ridge on standardised features from the augmented Gram matrix [1, X]'[1, X].
+
+    Penalising standardised coefficients is the same as adding alpha * n * var_j
+    to the diagonal for the raw coefficients; the intercept is not penalised.
+    """
+    n = G[0, 0]
+    mean = G[0, 1:] / n
+    var = np.maximum(np.diag(G)[1:] / n - mean ** 2, 1e-18)
+    A = G.copy()
+    A[1:, 1:][np.diag_indices(len(var))] += alpha * n * var
+    try:
+        return np.linalg.solve(A, b)
+    except np.linalg.LinAlgError:
+        return np.linalg.lstsq(A, b, rcond=None)[0]
+
+
+def _score(y, pred):
+    err = y - pred
+    mse = float(np.mean(err ** 2))
+    sst = float(np.mean(y ** 2))
+    return {
+        "mse": mse,
+        "mae": float(np.mean(np.abs(err))),
+        # out-of-sample R^2 against the zero-return forecast
+        "r2_oos": 1.0 - mse / sst if sst > 0 else 0.0,
+        "hit_rate": float(np.mean(np.sign(pred) == np.sign(y))),
+    }
+
+
+def evaluate_candidate(name, spec, X, y, folds):
+    """Run one candidate over every fold -> list of per-fold report dicts."""
+    kind, params = spec
+    rows = []
+    G = np.zeros((X.shape[1] + 1, X.shape[1] + 1))
+    b = np.zeros(X.shape[1] + 1)
+    seen = 0
+    for i, (train_end, test_end) in enumerate(folds):
+        t0 = time.perf_counter()
+        if kind in ("linear", "mean"):
+            # accumulate only rows added since the previous fold
+            Xa = np.column_stack([np.ones(train_end - seen), X[seen:train_end]])
+            G += Xa.T @ Xa
+            b += Xa.T @ y[seen:train_end]
+            seen = train_end
+        model = None
+        if kind == "linear":
+            model = _solve_linear(G, b, params.get("alpha", 0.0))
+        elif kind == "sklearn":
+            model = params["factory"](**params.get("params", {})).fit(X[:train_end], y[:train_end])
+        fit_time = time.perf_counter() - t0
+        t1 = time.perf_counter()
+        Xt = X[train_end:test_end]
+        if kind == "zero":
+            pred = np.zeros(len(Xt))
+        elif kind == "mean":
+            pred = np.full(len(Xt), b[0] / G[0, 0] if G[0, 0] else 0.0)
+        elif kind == "linear":
+            pred = model[0] + Xt @ model[1:]
+        else:
+            pred = model.predict(Xt)
+        predict_time = time.perf_counter() - t1
+        row = {"model": name, "fold": i, "train_rows": train_end, "test_rows": test_end - train_end,
+               "fit_time": fit_time, "predict_time": predict_time}
+        row.update(_score(y[train_end:test_end], pred))
+        rows.append(row)
+    return rows
+
+
+_worker = {}
+
+
+def _init_worker(X, y, folds):
+    _worker.update(X=X, y=y, folds=folds)
+
+
+def _evaluate_remote(item):
+    name, spec = item
+    return evaluate_candidate(name, spec, _worker["X"], _worker["y"], _worker["folds"])
+
+
+class WalkForwardForecaster:
+    """Build features once, then evaluate every candidate model walk-forward.
+
+    fc = WalkForwardForecaster(load_ohlcv_panel())
+    report = fc.evaluate()          # one row per (model, fold)
+    fc.summary(report)              # mean accuracy / total time per model
+    """
+
+    def __init__(self, panel, lags=(1, 2, 3, 5, 10), windows=(5, 10, 20)):
+        t0 = time.perf_counter()
+        (self.X, self.y, self.row_dates, self.row_symbols,
+         self.features, self.dates, self.symbols) = build_features(panel, lags, windows)
+        self.feature_time = time.perf_counter() - t0
+
+    def evaluate(self, candidates=None, n_folds=5, min_train=60, max_workers=None):
+        candidates = candidates or default_candidates()
+        folds = expanding_folds(self.row_dates, len(self.dates), n_folds, min_train)
+        if not folds:
+            return pd.DataFrame()
+        items = list(candidates.items())
+        max_workers = min(max_workers or os.cpu_count() or 1, len(items))
+        if max_workers <= 1:
+            parts = [evaluate_candidate(n, s, self.X, self.y, folds) for n, s in items]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(self.X, self.y, folds)) as ex:
+                parts = list(ex.map(_evaluate_remote, items))
+        report = pd.DataFrame([r for part in parts for r in part])
+        fold_dates = [self.dates[self.row_dates[s]] for s, _ in folds]
+        report["test_start"] = report["fold"].map(dict(enumerate(fold_dates)))
+        return report
+
+    @staticmethod
+    def summary(report):
+        if report.empty:
+            return report
+        agg = report.groupby("model").agg(mse=("mse", "mean"), mae=("mae", "mean"), r2_oos=("r2_oos", "mean"),
+                                          hit_rate=("hit_rate", "mean"), fit_time=("fit_time", "sum"),
+                                          predict_time=("predict_time", "sum"))
+        return agg.sort_values("mse")
+
+
+if __name__ == "__main__":
+    panel = load_ohlcv_panel()
+    if not panel:
+        print("[WARN] No Binance_*_d.csv files found.")
+    else:
+        fc = WalkForwardForecaster(panel)
+        print(f"[INFO] {len(fc.y)} rows x {len(fc.features)} features for {len(fc.symbols)} symbols "
+              f"({fc.feature_time:.2f}s)")
+        report = fc.evaluate()
+        print(report.round(6).to_string(index=False))
+        print()
+        print(fc.summary(report).round(6))
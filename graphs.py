@@ -2,9 +2,10 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from rules import get_weights_risk_parity
 from portfolio import Portfolio
+from price_store import read_csv_cached
 
-# Load combined CSV
-df = pd.read_csv("data/Crypto_metrics_daily.csv", parse_dates=["date"])
+# Load combined CSV (or its price-store copy)
+df = read_csv_cached("data/Crypto_metrics_daily.csv", parse_dates=["date"])
 assets = sorted(df["asset"].unique())
 
 # Get weights from Risk-Parity
@@ -0,0 +1,211 @@
+# incremental_ingest.py
+# Append-only SQLite ingestion of OHLCV bars.
+# Each symbol keeps a high-water-mark timestamp; a refresh inserts only bars past
+# it (deduplicated on (symbol, ts)) in one batched transaction and folds just
+# those new bars into the running close-price metrics.
+# Databases written by the old rebuild-every-run script (one table per symbol
+# such as BTC_USD, and a keyless metrics table) are migrated on first open.
+
+import re, sqlite3
+import numpy as np
+import pandas as pd
+
+BAR_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+_LEGACY_TABLE = re.compile(r"[A-Z0-9]+_[A-Z0-9]+")
+
+
+def _has_primary_key(conn, table):
+    return any(r[5] for r in conn.execute(f'PRAGMA table_info("{table}")'))
+
+
+def _legacy_price_tables(conn):
+    """Per-symbol tables (BTC_USD, ...) written by the old script with to_sql."""
+    out = []
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+        if not _LEGACY_TABLE.fullmatch(name):
+            continue
+        cols = {r[1].lower() for r in conn.execute(f'PRAGMA table_info("{name}")')}
+        if {"date", "close"} <= cols:
+            out.append(name)
+    return out
+
+
+def init_bars_db(conn):
+    """Create the bars / ingest_state / metrics tables, migrating a legacy DB.
+
+    The old script's metrics table has no primary key, so INSERT OR REPLACE
+    would append to it; it is dropped and rebuilt from ingest_state. Legacy
+    per-symbol tables are folded into bars (symbol BTC_USD -> BTC-USD) and dropped.
+    """
+    legacy_metrics = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metrics'").fetchone() is not None \
+        and not _has_primary_key(conn, "metrics")
+    if legacy_metrics:
+        with conn:
+            conn.execute("DROP TABLE metrics")
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS bars (
+            symbol TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            open REAL, high REAL, low REAL, close REAL, volume REAL,
+            PRIMARY KEY (symbol, ts)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS ingest_state (
+            symbol TEXT PRIMARY KEY,
+            hwm TEXT,
+            n INTEGER,
+            mean_close REAL,
+            m2_close REAL,
+            min_close REAL,
+            max_close REAL
+        );
+        CREATE TABLE IF NOT EXISTS metrics (
+            "Crypto" TEXT PRIMARY KEY,
+            "Mean Close" REAL,
+            "Min Close" REAL,
+            "Max Close" REAL,
+            "Volatility" REAL
+        );
+    ''')
+    legacy = _legacy_price_tables(conn)
+    if legacy:
+        frames = {name.replace("_", "-"): pd.read_sql(f'SELECT * FROM "{name}"', conn) for name in legacy}
+        _append_frames(conn, frames)
+        with conn:
+            for name in legacy:
+                conn.execute(f'DROP TABLE "{name}"')
+        print(f"[INFO] Migrated legacy tables into bars: {', '.join(legacy)}")
+    if legacy_metrics:
+        state = conn.execute(
+            "SELECT symbol, n, mean_close, m2_close, min_close, max_close FROM ingest_state").fetchall()
+        with conn:
+            for symbol, n, mean, m2, lo, hi in state:
+                _write_metrics(conn, symbol, n, mean, m2, lo, hi)
+
+
+def high_water_mark(conn, symbol):
+    row = conn.execute("SELECT hwm FROM ingest_state WHERE symbol = ?", (symbol,)).fetchone()
+    return None if row is None or row[0] is None else pd.Timestamp(row[0])
+
+
+def _normalize_bars(df):
+    """Lower-case OHLCV columns and an ISO 'ts' column, sorted, one row per ts."""
+    lower_map = {str(c).lower(): c for c in df.columns}
+    ts_col = next((lower_map[k] for k in ("date", "datetime", "timestamp", "ts") if k in lower_map), None)
+    if ts_col is None:
+        raise ValueError("bars need a date/timestamp column")
+    out = pd.DataFrame({"ts": pd.to_datetime(df[ts_col]).dt.strftime("%Y-%m-%d %H:%M:%S")})
+    for c in BAR_COLUMNS:
+        out[c] = pd.to_numeric(df[lower_map[c]], errors="coerce") if c in lower_map else np.nan
+    out = out.dropna(subset=["ts"]).sort_values("ts")
+    return out.drop_duplicates("ts", keep="last")
+
+
+def _merge_stats(state, close):
+    """Fold new close prices into (n, mean, M2, min, max) - Chan et al. parallel update."""
+    close = close[~np.isnan(close)]
+    n_a, mean_a, m2_a, lo, hi = state
+    n_b = len(close)
+    if n_b == 0:
+        return state
+    mean_b = float(close.mean())
+    m2_b = float(((close - mean_b) ** 2).sum())
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    lo = float(close.min()) if lo is None else min(lo, float(close.min()))
+    hi = float(close.max()) if hi is None else max(hi, float(close.max()))
+    return n, mean, m2, lo, hi
+
+
+def append_bars(conn, frames):
+    """Append new bars for many symbols in one transaction.
+
+    frames: {symbol: DataFrame with a date column and OHLCV columns}.
+    Returns {symbol: rows inserted}.
+    """
+    init_bars_db(conn)
+    return _append_frames(conn, frames)
+
+
+def _append_frames(conn, frames):
+    inserted = {}
+    with conn:
+        for symbol, df in frames.items():
+            bars = _normalize_bars(df)
+            row = conn.execute(
+                "SELECT hwm, n, mean_close, m2_close, min_close, max_close FROM ingest_state WHERE symbol = ?",
+                (symbol,)).fetchone()
+            hwm, state = (row[0], row[1:]) if row else (None, (0, 0.0, 0.0, None, None))
+            if hwm is not None:
+                bars = bars[bars["ts"] > hwm]
+            if bars.empty:
+                inserted[symbol] = 0
+                continue
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO bars (symbol, ts, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(symbol,) + tuple(None if pd.isna(v) else v for v in r)
+                 for r in bars[["ts"] + BAR_COLUMNS].itertuples(index=False, name=None)])
+            inserted[symbol] = conn.total_changes - before
+            # metrics are derived from the new tail only
+            n, mean, m2, lo, hi = _merge_stats(tuple(state), bars["close"].to_numpy(dtype=float))
+            conn.execute(
+                "INSERT OR REPLACE INTO ingest_state (symbol, hwm, n, mean_close, m2_close, min_close, max_close) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (symbol, bars["ts"].iloc[-1], n, mean, m2, lo, hi))
+            _write_metrics(conn, symbol, n, mean, m2, lo, hi)
+    return inserted
+
+
+def _write_metrics(conn, symbol, n, mean, m2, lo, hi):
+    vol = float(np.sqrt(m2 / (n - 1))) if n > 1 else None
+    conn.execute(
+        'INSERT OR REPLACE INTO metrics ("Crypto", "Mean Close", "Min Close", "Max Close", "Volatility") '
+        "VALUES (?, ?, ?, ?, ?)",
+        (symbol, mean if n else None, lo, hi, vol))
+
+
+def _after(keys, last):
+    """Mask of `keys` greater than the stored maximum `last`, compared in the keys' own type
+    (numbers numerically, dates as timestamps; text only when it is neither)."""
+    if pd.api.types.is_datetime64_any_dtype(keys):
+        return (keys > pd.Timestamp(last)).to_numpy()
+    if pd.api.types.is_numeric_dtype(keys):
+        return (keys > pd.to_numeric(last)).to_numpy()
+    as_dates = pd.to_datetime(keys, errors="coerce", format="mixed")
+    last_date = pd.to_datetime(str(last), errors="coerce")
+    if as_dates.notna().all() and not pd.isna(last_date):
+        return (as_dates > last_date).to_numpy()
+    return (keys.astype(str) > str(last)).to_numpy()
+
+
+def append_new_rows(conn, table, df, key="date"):
+    """Append rows of an index-keyed frame whose key is not yet in `table`.
+
+    Creates the table on first use with a unique index on `key`, so repeated
+    refreshes only write the new tail instead of replacing the whole table.
+    """
+    frame = df.reset_index() if key not in df.columns else df
+    frame = frame.drop_duplicates(key, keep="last")
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if not exists:
+        frame.head(0).to_sql(table, conn, index=False)
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "ux_{table}_{key}" ON "{table}" ("{key}")')
+    last = conn.execute(f'SELECT MAX("{key}") FROM "{table}"').fetchone()[0]
+    if last is not None:
+        frame = frame[_after(frame[key], last)]
+    if frame.empty:
+        return 0
+    cols = ", ".join(f'"{c}"' for c in frame.columns)
+    marks = ", ".join("?" for _ in frame.columns)
+    rows = [tuple(v.to_pydatetime().strftime("%Y-%m-%d %H:%M:%S") if isinstance(v, pd.Timestamp) else v for v in r)
+            for r in frame.itertuples(index=False, name=None)]
+    with conn:
+        before = conn.total_changes
+        conn.executemany(f'INSERT OR IGNORE INTO "{table}" ({cols}) VALUES ({marks})', rows)
+        return conn.total_changes - before
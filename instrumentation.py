@@ -0,0 +1,433 @@
+# instrumentation.py
+# Timers, counters and memory snapshots for pipeline stages and I/O calls
+# (CSV reads, SQLite writes, SMTP sends, model fits), plus opt-in per-stage
+# profiling.
+#
+# Off by default; when off every hook is one flag check returning a shared
+# no-op, so the calls can stay in hot paths. Switch on with
+#   PORTFOLIO_METRICS=1              record timers / counters / memory
+#   PORTFOLIO_PROFILE=cprofile       also profile each stage (or =sample for a
+#                                    sampling profiler writing collapsed stacks)
+#   PORTFOLIO_PROFILE_STAGES=a,b     only profile these stages (default: all)
+#   PORTFOLIO_METRICS_DIR=path       output directory (default results/metrics)
+# or call enable(). Recorded events are written at exit (or by export()) as
+# JSON lines and as a Prometheus text file; profiles go to results/profiles.
+# In long-running processes the event buffer is spilled to the JSON lines
+# file every SPILL_EVENTS events, and never holds more than MAX_EVENTS.
+#
+#   with timer("sqlite_write", table="portfolio"):
+#       ...
+#   count("csv_rows", len(df), source="store")
+#   @timed("model_fit")
+#   def fit(...): ...
+
+import atexit, functools, json, os, resource, sys, threading, time
+from collections import defaultdict, deque
+
+METRICS_DIR = os.path.join("results", "metrics")
+PROFILE_DIR = os.path.join("results", "profiles")
+PROFILE_MODES = ("cprofile", "sample")
+SPILL_EVENTS = 10_000       # append buffered events to metrics.jsonl past this many
+MAX_EVENTS = 100_000        # hard cap; the oldest events are dropped if spilling fails
+
+
+class _State:
+    enabled = False
+    profile = None          # None, "cprofile" or "sample"
+    profile_stages = None   # None = every stage
+    metrics_dir = METRICS_DIR
+    profile_dir = PROFILE_DIR
+
+
+_state = _State()
+_lock = threading.Lock()
+_events = deque(maxlen=MAX_EVENTS)
+_timers = defaultdict(lambda: [0, 0.0, 0.0])     # key -> [count, total seconds, max seconds]
+_counters = defaultdict(float)
+_gauges = {}
+_exit_registered = False
+
+
+def rss_mb():
+    """Current resident set size in MB (peak where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024.0
+
+
+# ---- switches ----
+
+def enable(profile=None, stages=None, metrics_dir=None, profile_dir=None):
+    """Turn recording on (and profiling, if `profile` is "cprofile" or "sample")."""
+    global _exit_registered
+    if profile is not None and profile not in PROFILE_MODES:
+        raise ValueError(f"unknown profile mode {profile!r}; expected one of {PROFILE_MODES}")
+    _state.enabled = True
+    _state.profile = profile
+    _state.profile_stages = set(stages) if stages else None
+    _state.metrics_dir = metrics_dir or _state.metrics_dir
+    _state.profile_dir = profile_dir or _state.profile_dir
+    if not _exit_registered:
+        atexit.register(export)
+        _exit_registered = True
+
+
+def disable():
+    _state.enabled = False
+    _state.profile = None
+
+
+def enabled():
+    return _state.enabled
+
+
+def reset():
+    with _lock:
+        _events.clear()
+        _timers.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def _from_env():
+    flag = os.environ.get("PORTFOLIO_METRICS", "").strip().lower()
+    profile = os.environ.get("PORTFOLIO_PROFILE", "").strip().lower() or None
+    if flag in ("1", "true", "yes", "on") or profile:
+        stages = [s for s in os.environ.get("PORTFOLIO_PROFILE_STAGES", "").split(",") if s]
+        enable(profile if profile in PROFILE_MODES else None, stages,
+               os.environ.get("PORTFOLIO_METRICS_DIR") or None)
+        if profile and profile not in PROFILE_MODES:
+            print(f"[WARN] PORTFOLIO_PROFILE={profile!r} ignored; expected one of {PROFILE_MODES}")
+
+
+# ---- recording ----
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def _check_labels(name, labels):
+    if "name" in labels:
+        # the exported timer families carry the metric name as their `name` label
+        raise ValueError(f"{name}: 'name' is reserved and cannot be used as a metric label")
+
+
+def _record(kind, name, labels, **fields):
+    event = {"ts": time.time(), "kind": kind, "name": name}
+    if labels:
+        event["labels"] = labels
+    event.update(fields)
+    with _lock:
+        _events.append(event)
+        spill = len(_events) >= SPILL_EVENTS
+    if spill:
+        _spill()
+
+
+def _spill():
+    try:
+        export_jsonl(os.path.join(_state.metrics_dir, "metrics.jsonl"))
+    except OSError as e:
+        print(f"[WARN] Could not spill metrics events to {_state.metrics_dir}: {e}")
+
+
+class _Noop:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "memory", "t0", "rss0", "seconds")
+
+    def __init__(self, name, labels, memory):
+        _check_labels(name, labels)
+        self.name, self.labels, self.memory = name, labels, memory
+        self.seconds = 0.0
+
+    def __enter__(self):
+        if self.memory:
+            self.rss0 = rss_mb()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.t0
+        fields = {"seconds": self.seconds}
+        if exc_type is not None:
+            fields["error"] = exc_type.__name__
+        if self.memory:
+            rss = rss_mb()
+            fields.update(rss_mb=rss, rss_delta_mb=rss - self.rss0)
+        key = _key(self.name, self.labels)
+        with _lock:
+            agg = _timers[key]
+            agg[0] += 1
+            agg[1] += self.seconds
+            agg[2] = max(agg[2], self.seconds)
+        _record("timer", self.name, self.labels, **fields)
+        return False
+
+
+def timer(name, memory=False, **labels):
+    """Context manager timing a block (no-op while disabled); memory=True adds RSS before/after."""
+    if not _state.enabled:
+        return _NOOP
+    return _Timer(name, labels, memory)
+
+
+def timed(name=None, **labels):
+    """Decorator form of timer(); the name defaults to module.function."""
+    def wrap(fn):
+        metric = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            with _Timer(metric, labels, False):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(name, value=1, **labels):
+    """Add `value` to a counter (no-op while disabled)."""
+    if not _state.enabled:
+        return
+    _check_labels(name, labels)
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def memory_snapshot(name, **labels):
+    """Record the current RSS as a gauge and an event (no-op while disabled)."""
+    if not _state.enabled:
+        return None
+    _check_labels(name, labels)
+    rss = rss_mb()
+    with _lock:
+        _gauges[_key(name, labels)] = rss
+    _record("memory", name, labels, rss_mb=rss)
+    return rss
+
+
+# ---- per-stage profiling ----
+
+class _SamplingProfiler:
+    """Samples one thread's Python stack every `interval` seconds into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = defaultdict(int)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in sorted(self.samples.items(), key=lambda kv: -kv[1]):
+                f.write(f"{stack} {n}\n")
+
+
+class _Stage:
+    def __init__(self, name, labels, memory=True):
+        self.name = name
+        self.timer = _Timer("stage", dict(labels, stage=name), memory)
+        mode = _state.profile
+        if mode and _state.profile_stages is not None and name not in _state.profile_stages:
+            mode = None
+        self.mode = mode
+        self.profiler = None
+
+    def __enter__(self):
+        if self.mode == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError as e:
+                # Python 3.12+ allows one active cProfile at a time; concurrent stages go unprofiled
+                print(f"[WARN] Not profiling stage {self.name}: {e}")
+                self.profiler = None
+        elif self.mode == "sample":
+            self.profiler = _SamplingProfiler(threading.get_ident())
+            self.profiler.start()
+        self.timer.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.__exit__(exc_type, exc, tb)
+        if self.profiler is not None:
+            try:
+                self._dump()
+            except Exception as e:
+                print(f"[WARN] Could not write profile for stage {self.name}: {e}")
+        return False
+
+    def _dump(self):
+        os.makedirs(_state.profile_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(_state.profile_dir, f"{self.name}-{stamp}-{os.getpid()}")
+        if self.mode == "cprofile":
+            import io, pstats
+            self.profiler.disable()
+            self.profiler.dump_stats(base + ".prof")
+            text = io.StringIO()
+            pstats.Stats(self.profiler, stream=text).sort_stats("cumulative").print_stats(30)
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+            path = base + ".prof"
+        else:
+            self.profiler.stop()
+            path = base + ".folded"
+            self.profiler.dump(path)
+        _record("profile", "stage", {"stage": self.name}, mode=self.mode, path=path)
+
+
+def stage(name, memory=True, **labels):
+    """Time a pipeline stage with RSS before/after, profiling it when profiling is on.
+
+    RSS is process-wide: pass memory=False when other stages run concurrently.
+    """
+    if not _state.enabled:
+        return _NOOP
+    return _Stage(name, labels, memory)
+
+
+# ---- export ----
+
+def snapshot():
+    """Aggregates so far: {"timers": [...], "counters": [...], "gauges": [...]}."""
+    with _lock:
+        return {
+            "timers": [{"name": n, "labels": dict(l), "count": c, "seconds": s, "max_seconds": m}
+                       for (n, l), (c, s, m) in sorted(_timers.items())],
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_counters.items())],
+            "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_gauges.items())],
+        }
+
+
+def export_jsonl(path):
+    """Append every recorded event to `path`, one JSON object per line, and clear them."""
+    with _lock:
+        events = list(_events)
+        _events.clear()
+    if not events:
+        return 0
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pid = os.getpid()
+    with open(path, "a", encoding="utf-8") as f:
+        for e in events:
+            f.write(json.dumps(dict(e, pid=pid), default=str) + "\n")
+    return len(events)
+
+
+def _metric_name(name):
+    return "".join(ch if ch.isalnum() or ch == "_" else "_" for ch in name)
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{_metric_name(k)}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def export_prometheus(path):
+    """Write the aggregates in Prometheus text exposition format (for the node_exporter textfile collector).
+
+    Samples are grouped by metric family, so each family gets exactly one
+    HELP / TYPE header however many label sets it has.
+    """
+    snap = snapshot()
+    families = {}       # metric -> (type, help, [sample lines]), in first-seen order
+
+    def add(metric, kind, help_text, sample):
+        families.setdefault(metric, (kind, help_text, []))[2].append(sample)
+
+    for t in snap["timers"]:
+        labels = _label_str(dict(t["labels"], name=t["name"]))
+        add("portfolio_duration_seconds", "summary", "Time spent in instrumented calls.",
+            f"portfolio_duration_seconds_sum{labels} {t['seconds']:.9f}")
+        add("portfolio_duration_seconds", "summary", "Time spent in instrumented calls.",
+            f"portfolio_duration_seconds_count{labels} {t['count']}")
+    for t in snap["timers"]:
+        add("portfolio_duration_seconds_max", "gauge", "Longest single instrumented call.",
+            f"portfolio_duration_seconds_max{_label_str(dict(t['labels'], name=t['name']))} {t['max_seconds']:.9f}")
+    for c in snap["counters"]:
+        metric = f"portfolio_{_metric_name(c['name'])}_total"
+        add(metric, "counter", f"Counter {c['name']}.", f"{metric}{_label_str(c['labels'])} {c['value']:g}")
+    for g in snap["gauges"]:
+        metric = f"portfolio_{_metric_name(g['name'])}_rss_mb"
+        add(metric, "gauge", f"Resident set size at {g['name']}, MB.",
+            f"{metric}{_label_str(g['labels'])} {g['value']:.3f}")
+    lines = []
+    for metric, (kind, help_text, samples) in families.items():
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"] + samples
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def export(metrics_dir=None):
+    """Write metrics.jsonl (appended) and metrics.prom (replaced) under the metrics directory."""
+    if not _state.enabled and not _events:
+        return None
+    out = metrics_dir or _state.metrics_dir
+    try:
+        export_jsonl(os.path.join(out, "metrics.jsonl"))
+        return export_prometheus(os.path.join(out, "metrics.prom"))
+    except OSError as e:
+        print(f"[WARN] Could not export metrics to {out}: {e}")
+        return None
+
+
+def format_summary():
+    """Timers sorted by total time, for printing at the end of a run."""
+    snap = snapshot()
+    rows = sorted(snap["timers"], key=lambda t: -t["seconds"])
+    lines = [f"{'name':<22} {'labels':<34} {'count':>6} {'total_s':>9} {'max_s':>8}"]
+    for t in rows:
+        labels = ",".join(f"{k}={v}" for k, v in t["labels"].items())
+        lines.append(f"{t['name'][:22]:<22} {labels[:34]:<34} {t['count']:>6} {t['seconds']:>9.3f} "
+                     f"{t['max_seconds']:>8.3f}")
+    return "\n".join(lines)
+
+
+_from_env()
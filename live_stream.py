@@ -0,0 +1,460 @@
+# live_stream.py
+# Asyncio streaming mode: consume a bar / tick feed, keep live positions and
+# the portfolio value up to date incrementally, and push every update through
+# the risk accumulators, rule engine and alerting.
+#
+# Sources are async iterables yielding lists of Bar (one list per message or
+# per timestamp): CSVReplaySource replays the Binance_*_d.csv files at a
+# configurable speed, WebSocketSource reads a live feed (Binance kline stream
+# by default; needs the optional `websockets` package), and any other async
+# iterable of Bar lists works the same way.
+#
+# The source feeds a bounded queue, so a slow consumer slows the source down
+# instead of growing memory. The consumer revalues only the symbols in each
+# batch (O(batch), not O(universe)), updates a RiskAccumulator per step, and
+# evaluates the rules at most every `check_interval` seconds on the
+# accumulated metrics; newly breached rules are dispatched off the event loop
+# (DB + queued email). Prices and valuations go to SQLite through one writer
+# task that commits in batches of `db_batch` rows or every `flush_interval`
+# seconds, behind its own bounded queue.
+
+import argparse, asyncio, glob, json, os, sqlite3, time
+from collections import deque, namedtuple
+import numpy as np
+
+from instrumentation import count, timer
+from risk_engine import DEFAULT_RULES, RiskRuleEngine, dispatch
+from streaming_metrics import RiskAccumulator
+
+Bar = namedtuple("Bar", "ts symbol price")
+
+LIVE_DB = os.path.join("results", "live.db")
+CHECKPOINT = os.path.join("results", "live_risk.json")
+_END = object()
+
+LIVE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS live_prices (ts TEXT, symbol TEXT, price REAL);
+    CREATE TABLE IF NOT EXISTS live_valuations (ts TEXT, value REAL, ret REAL, positions INTEGER);
+"""
+# live_prices is append-only and unindexed: a (symbol, ts) index cuts insert throughput ~6x
+
+
+# ---- sources ----
+
+class CSVReplaySource:
+    """Replay Binance_<SYMBOL>_d.csv files bar by bar, all symbols of a date in one batch.
+
+    speed: timestamps replayed per second (None = as fast as the consumer takes them)
+    """
+
+    def __init__(self, paths=None, speed=None, column="close", store=None):
+        self.paths = sorted(glob.glob("Binance_*_d.csv")) if paths is None else list(paths)
+        self.speed = speed
+        self.column = column
+        self.store = store
+
+    def _load(self):
+        import pandas as pd
+        from price_store import read_csv_cached, _symbol_from_filename
+        frames = []
+        for p in self.paths:
+            df = read_csv_cached(p, self.store)
+            df.columns = [c.lower() for c in df.columns]
+            if "date" not in df.columns or self.column not in df.columns:
+                print(f"[WARN] {p}: no date/{self.column} column, skipped")
+                continue
+            frames.append(pd.DataFrame({"ts": pd.to_datetime(df["date"], errors="coerce"),
+                                        "symbol": _symbol_from_filename(p),
+                                        "price": pd.to_numeric(df[self.column], errors="coerce")}))
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True).dropna().sort_values("ts", kind="stable")
+
+    async def stream(self):
+        data = self._load()
+        if data is None:
+            return
+        ts = data["ts"].dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy()
+        symbols, prices = data["symbol"].to_numpy(), data["price"].to_numpy(dtype=float)
+        bounds = np.flatnonzero(np.r_[True, ts[1:] != ts[:-1], True])
+        delay = 1.0 / self.speed if self.speed else 0.0
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            yield [Bar(ts[lo], symbols[i], prices[i]) for i in range(lo, hi)]
+            # always yield control so the consumer runs between timestamps
+            await asyncio.sleep(delay)
+
+    def __aiter__(self):
+        return self.stream()
+
+
+def parse_binance_kline(msg):
+    """Binance kline message (raw or combined stream) -> [Bar]; other messages -> []."""
+    data = msg.get("data", msg) if isinstance(msg, dict) else msg
+    items = data if isinstance(data, list) else [data]
+    bars = []
+    for d in items:
+        k = d.get("k") if isinstance(d, dict) else None
+        if k is None:
+            continue
+        bars.append(Bar(str(k.get("T", d.get("E", ""))), d.get("s", k.get("s")), float(k["c"])))
+    return bars
+
+
+class WebSocketSource:
+    """Live feed over a websocket, e.g.
+    wss://stream.binance.com:9443/stream?streams=btcusdt@kline_1m/ethusdt@kline_1m
+
+    parse(message dict) -> [Bar]. Reconnects with a fixed delay after a dropped connection.
+    """
+
+    def __init__(self, url, parse=parse_binance_kline, reconnect_delay=1.0, max_reconnects=None):
+        self.url = url
+        self.parse = parse
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnects = max_reconnects
+
+    async def stream(self):
+        try:
+            import websockets
+        except ImportError:
+            raise ImportError("WebSocketSource needs the 'websockets' package (pip install websockets)")
+        attempts = 0
+        while True:
+            try:
+                async with websockets.connect(self.url) as ws:
+                    attempts = 0
+                    async for raw in ws:
+                        bars = self.parse(json.loads(raw))
+                        if bars:
+                            yield bars
+            except (OSError, websockets.WebSocketException) as e:
+                attempts += 1
+                if self.max_reconnects is not None and attempts > self.max_reconnects:
+                    raise
+                print(f"[WARN] websocket {self.url}: {e}; reconnecting in {self.reconnect_delay}s")
+                await asyncio.sleep(self.reconnect_delay)
+
+    def __aiter__(self):
+        return self.stream()
+
+
+# ---- live positions ----
+
+class LivePortfolio:
+    """Positions bought at each symbol's first observed price, revalued bar by bar.
+
+    weights: target weights at entry (None = equal weight over the symbols of the first batch)
+    Unallocated capital is held as cash until a symbol's first price arrives.
+    """
+
+    def __init__(self, weights=None, capital=1_000_000.0):
+        self.targets = dict(weights) if weights else None
+        self.capital = float(capital)
+        self.cash = float(capital)
+        self.index = {}
+        self.symbols = []
+        self.qty = np.zeros(16)
+        self.price = np.full(16, np.nan)
+        self.value = float(capital)
+        self.n_open = 0
+        self.ts = None
+
+    def _slot(self, symbol):
+        i = self.index.get(symbol)
+        if i is None:
+            i = self.index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            if i >= len(self.qty):
+                n = 2 * len(self.qty)
+                self.qty = np.concatenate([self.qty, np.zeros(n - len(self.qty))])
+                self.price = np.concatenate([self.price, np.full(n - len(self.price), np.nan)])
+        return i
+
+    def update(self, bars):
+        """Apply one batch of bars; returns the return since the previous batch."""
+        if self.targets is None:
+            syms = sorted({b.symbol for b in bars})
+            self.targets = {s: 1.0 / len(syms) for s in syms}
+        latest = {}
+        for b in bars:
+            latest[b.symbol] = b.price          # last price of a symbol in the batch wins
+        idx = np.fromiter((self._slot(s) for s in latest), dtype=np.int64, count=len(latest))
+        px = np.fromiter(latest.values(), dtype=float, count=len(latest))
+        old = self.price[idx]
+        new = np.isnan(old)
+        if new.any():
+            # open positions for symbols priced for the first time
+            for j in np.flatnonzero(new):
+                w = self.targets.get(self.symbols[idx[j]], 0.0)
+                if w and px[j] > 0:
+                    self.qty[idx[j]] = self.capital * w / px[j]
+                    self.cash -= self.capital * w
+                    self.n_open += 1
+            old = np.where(new, px, old)
+        prev = self.value
+        self.value += float(self.qty[idx] @ (px - old))
+        self.price[idx] = px
+        self.ts = bars[-1].ts
+        return self.value / prev - 1.0 if prev > 0 else 0.0
+
+    def weights(self):
+        """Current weight of every open position (market value / portfolio value)."""
+        n = len(self.symbols)
+        mv = np.nan_to_num(self.qty[:n] * self.price[:n])
+        total = self.value if self.value else 1.0
+        return {s: float(mv[i] / total) for i, s in enumerate(self.symbols) if self.qty[i]}
+
+    def positions(self):
+        return {s: {"qty": float(self.qty[i]), "price": float(self.price[i])}
+                for i, s in enumerate(self.symbols) if self.qty[i]}
+
+
+# ---- batched SQLite writer ----
+
+class BatchedWriter:
+    """Single writer task: commits queued rows in batches, off the event loop."""
+
+    def __init__(self, db_path=LIVE_DB, batch_size=5000, flush_interval=1.0, max_queue=200):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.q = asyncio.Queue(maxsize=max_queue)
+        self.conn = None
+        self.task = None
+        self.rows_written = 0
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(LIVE_SCHEMA)
+        return conn
+
+    def _write(self, prices, valuations):
+        with timer("sqlite_write", table="live"), self.conn:
+            if prices:
+                self.conn.executemany("INSERT INTO live_prices(ts, symbol, price) VALUES (?, ?, ?)", prices)
+            if valuations:
+                self.conn.executemany("INSERT INTO live_valuations(ts, value, ret, positions) VALUES (?, ?, ?, ?)",
+                                      valuations)
+        count("sqlite_rows", len(prices) + len(valuations), table="live")
+
+    def start(self):
+        """Run the writer as a task on the current loop; returns the task."""
+        self.task = asyncio.create_task(self.run())
+        return self.task
+
+    def _raise_if_stopped(self):
+        if self.task is not None and self.task.done():
+            exc = None if self.task.cancelled() else self.task.exception()
+            raise RuntimeError(f"live DB writer stopped ({exc or 'cancelled'})") from exc
+
+    async def _put(self, item):
+        if not self.q.full():
+            self.q.put_nowait(item)
+            return
+        if self.task is None:
+            await self.q.put(item)
+            return
+        # queue full: wait for room, but not on a writer that has died
+        put = asyncio.ensure_future(self.q.put(item))
+        await asyncio.wait({put, self.task}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            self._raise_if_stopped()
+
+    async def put(self, prices, valuation):
+        # waits when the writer is behind: backpressure on the consumer
+        self._raise_if_stopped()
+        await self._put((prices, valuation))
+
+    async def close(self):
+        if self.task is not None and self.task.done():
+            return
+        await self._put(_END)
+
+    async def run(self):
+        self.conn = await asyncio.to_thread(self._open)
+        loop = asyncio.get_running_loop()
+        done = False
+        try:
+            while not done:
+                item = await self.q.get()
+                if item is _END:
+                    break
+                prices, valuations = list(item[0]), [item[1]]
+                deadline = loop.time() + self.flush_interval
+                while len(prices) + len(valuations) < self.batch_size:
+                    try:
+                        item = await asyncio.wait_for(self.q.get(), max(deadline - loop.time(), 0))
+                    except asyncio.TimeoutError:
+                        break
+                    if item is _END:
+                        done = True
+                        break
+                    prices.extend(item[0])
+                    valuations.append(item[1])
+                await asyncio.to_thread(self._write, prices, valuations)
+                self.rows_written += len(prices) + len(valuations)
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+# ---- the stream ----
+
+class LiveStream:
+    """Wire a source to live valuation, risk rules, alerts and the DB writer.
+
+    live = LiveStream(CSVReplaySource(speed=20), weights={"BTCUSDT": 0.5, "ETHUSDT": 0.5})
+    stats = asyncio.run(live.run())
+
+    dispatch_fn(breaches) is called in a worker thread for newly breached rules
+    (default risk_engine.dispatch: alerts table + queued digest email); a rule
+    has to clear before it alerts again.
+    """
+
+    def __init__(self, source, weights=None, capital=1_000_000.0, rules=None, db_path=LIVE_DB,
+                 queue_size=1000, check_interval=0.25, min_observations=30, store_prices=True,
+                 db_batch=5000, flush_interval=1.0, dispatch_fn=dispatch, checkpoint=CHECKPOINT):
+        self.source = source
+        self.portfolio = LivePortfolio(weights, capital)
+        self.risk = RiskAccumulator()
+        self.engine = RiskRuleEngine(rules or DEFAULT_RULES)
+        self.queue_size = queue_size
+        self.check_interval = check_interval
+        self.min_observations = min_observations
+        self.store_prices = store_prices
+        self.writer = BatchedWriter(db_path, db_batch, flush_interval) if db_path else None
+        self.dispatch_fn = dispatch_fn
+        self.checkpoint = checkpoint
+        self.active = set()
+        self.latencies = deque(maxlen=10000)
+        self.steps = self.bars = self.checks = self.alerts = 0
+        self.on_update = None       # optional callback(LiveStream) after every batch
+
+    async def _produce(self, q, max_steps):
+        n = 0
+        try:
+            async for bars in self.source:
+                await q.put((bars, time.perf_counter()))
+                n += 1
+                if max_steps is not None and n >= max_steps:
+                    break
+        finally:
+            await q.put(_END)
+
+    def _step(self, bars):
+        r = self.portfolio.update(bars)
+        self.risk.update(r)
+        self.steps += 1
+        self.bars += len(bars)
+        if self.on_update is not None:
+            self.on_update(self)
+        return r
+
+    async def _check(self):
+        self.checks += 1
+        with timer("live_rule_check"):
+            _, breaches = self.engine.evaluate(metrics=self.risk.snapshot(), weights=self.portfolio.weights())
+        keys = {(b.alert, b.portfolio, b.asset) for b in breaches}
+        new = [b for b in breaches if (b.alert, b.portfolio, b.asset) not in self.active]
+        self.active = keys
+        if new and self.dispatch_fn is not None:
+            self.alerts += len(new)
+            try:
+                await asyncio.to_thread(self.dispatch_fn, new)
+            except Exception as e:
+                print("[WARN] Live alert dispatch failed:", e)
+
+    async def run(self, max_steps=None):
+        q = asyncio.Queue(maxsize=self.queue_size)
+        producer = asyncio.create_task(self._produce(q, max_steps))
+        writer = self.writer.start() if self.writer else None
+        last_check = 0.0
+        started = time.perf_counter()
+        try:
+            while True:
+                item = await q.get()
+                if item is _END:
+                    break
+                pending = [item]
+                # drain whatever is already queued: one rule check / DB hand-off per drain
+                while len(pending) < self.queue_size:
+                    try:
+                        nxt = q.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    pending.append(nxt)
+                ended = pending[-1] is _END
+                if ended:
+                    pending.pop()
+                for bars, received in pending:
+                    r = self._step(bars)
+                    if self.writer:
+                        prices = [(str(b.ts), b.symbol, float(b.price)) for b in bars] if self.store_prices else []
+                        await self.writer.put(prices, (str(self.portfolio.ts), self.portfolio.value, r,
+                                                       self.portfolio.n_open))
+                now = time.perf_counter()
+                if self.risk.n >= self.min_observations and now - last_check >= self.check_interval:
+                    await self._check()
+                    last_check = time.perf_counter()
+                done = time.perf_counter()
+                self.latencies.extend(done - received for _, received in pending)
+                if ended:
+                    break
+        finally:
+            producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
+            if self.risk.n >= self.min_observations:
+                await self._check()
+            if self.checkpoint:
+                self.risk.save(self.checkpoint)
+            if writer:
+                await self.writer.close()
+                await writer            # re-raises a writer failure
+        return self.stats(time.perf_counter() - started)
+
+    def stats(self, elapsed=None):
+        lat = np.fromiter(self.latencies, dtype=float) if self.latencies else np.zeros(1)
+        out = {"steps": self.steps, "bars": self.bars, "value": self.portfolio.value,
+               "checks": self.checks, "alerts": self.alerts,
+               "latency_p50_ms": float(np.percentile(lat, 50) * 1000),
+               "latency_p99_ms": float(np.percentile(lat, 99) * 1000),
+               "rows_written": self.writer.rows_written if self.writer else 0}
+        if elapsed:
+            out.update(seconds=elapsed, bars_per_second=self.bars / elapsed if elapsed > 0 else 0.0)
+        out.update(self.risk.snapshot())
+        return out
+
+
+def run_live(source=None, weights=None, max_steps=None, **kwargs):
+    """Blocking helper: replay the Binance CSVs (or run `source`) and return the final stats."""
+    return asyncio.run(LiveStream(source or CSVReplaySource(), weights, **kwargs).run(max_steps))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Stream prices into live valuation and risk alerts.")
+    ap.add_argument("paths", nargs="*", help="Binance CSVs to replay (default Binance_*_d.csv)")
+    ap.add_argument("--url", help="websocket URL (Binance kline stream) instead of a CSV replay")
+    ap.add_argument("--speed", type=float, default=None, help="replayed timestamps per second (default: max)")
+    ap.add_argument("--steps", type=int, default=None, help="stop after this many batches")
+    ap.add_argument("--capital", type=float, default=1_000_000.0)
+    ap.add_argument("--db", default=LIVE_DB)
+    ap.add_argument("--no-alerts", action="store_true", help="evaluate rules but do not dispatch alerts")
+    args = ap.parse_args(argv)
+    source = WebSocketSource(args.url) if args.url else CSVReplaySource(args.paths or None, speed=args.speed)
+    stats = run_live(source, max_steps=args.steps, capital=args.capital, db_path=args.db,
+                     dispatch_fn=None if args.no_alerts else dispatch)
+    for k, v in stats.items():
+        print(f"{k:>18}: {v:.6g}" if isinstance(v, float) else f"{k:>18}: {v}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,14 +1,32 @@
 # mailSending.py
 # Email + AI alert system
 
-import os, json, ssl, smtplib
+import os, json, ssl, smtplib, atexit
 from email.message import EmailMessage
 from datetime import datetime
 from pathlib import Path
 
+from instrumentation import count, timer
+from alert_dispatcher import BufferedLogWriter, get_dispatcher
 
-def _load_config():
-    """Load SMTP config from env vars or config.json"""
+_config_cache = None
+_ai_log = BufferedLogWriter('ai_alerts.log')
+atexit.register(_ai_log.close)
+
+
+def _load_config(reload=False):
+    """Load SMTP config from env vars or config.json (read once, then cached)"""
+    global _config_cache
+    if _config_cache is None or reload:
+        _config_cache = _read_config()
+    return _config_cache
+
+
+def _starttls_flag(value):
+    return str(value).strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def _read_config():
     cfg = {}
     # 1) Env vars
     smtp_host = os.getenv('SMTP_HOST')
@@ -24,6 +42,7 @@ def _load_config():
             'smtp_user': smtp_user,
             'smtp_pass': smtp_pass,
             'alert_to': alert_to,
+            'smtp_starttls': _starttls_flag(os.getenv('SMTP_STARTTLS', '1')),
         })
         return cfg
 
@@ -44,6 +63,7 @@ def _load_config():
                     'smtp_user': smtp_user,
                     'smtp_pass': smtp_pass,
                     'alert_to': alert_to,
+                    'smtp_starttls': _starttls_flag(data.get('smtp_starttls', True)),
                 })
                 return cfg
         except Exception:
@@ -78,10 +98,12 @@ def send_alert(subject, body, to_addr=None):
 
         try:
             context = ssl.create_default_context()
-            with smtplib.SMTP(smtp_host, smtp_port, timeout=15) as server:
-                server.starttls(context=context)
+            with timer('smtp_send', transport='direct'), smtplib.SMTP(smtp_host, smtp_port, timeout=15) as server:
+                if cfg.get('smtp_starttls', True):
+                    server.starttls(context=context)
                 server.login(smtp_user, smtp_pass)
                 server.send_message(msg)
+            count('emails_sent', transport='direct')
             print('[mailSending] Email sent to', recipients)
             return True
         except Exception as e:
@@ -95,14 +117,17 @@ def send_alert(subject, body, to_addr=None):
     return False
 
 
+def send_alert_async(subject, body, to_addr=None):
+    """Queue an alert for the background dispatcher and return immediately.
+    Alerts queued close together are sent as one digest per recipient over a
+    reused SMTP session. Returns False only if the queue is full."""
+    return get_dispatcher().submit(subject, body, to_addr)
+
+
 def ai_alert(title, message, metadata=None):
     """AI alert placeholder"""
     log_line = f"{datetime.utcnow().isoformat()}Z\t{title}\t{message}\t{metadata or {}}\n"
-    try:
-        with open('ai_alerts.log', 'a', encoding='utf-8') as f:
-            f.write(log_line)
-    except Exception:
-        pass
+    _ai_log.write(log_line)
     print('--- AI Alert ---')
     print('Title:', title)
     print('Message:', message)
@@ -1,7 +1,8 @@
 import os
-import yfinance as yf
 import pandas as pd
 import sqlite3
+from incremental_ingest import append_bars, high_water_mark, init_bars_db
+from fetcher import Fetcher, YFinanceSource
 
 # ---------------------------
 # 1. Create Folder with Your Name
@@ -16,7 +17,11 @@ if not os.path.exists(folder_name):
 # ---------------------------
 db_file = os.path.join(folder_name, "crypto.db")
 
-if os.path.exists(db_file):
+# Incremental by default: history already in the DB is kept and only newer
+# bars are downloaded. Set FULL_REFRESH = True to rebuild from scratch.
+FULL_REFRESH = False
+
+if FULL_REFRESH and os.path.exists(db_file):
     os.remove(db_file)
     print("🗑️ Old database deleted. Creating new one...")
 
@@ -24,61 +29,42 @@ if os.path.exists(db_file):
 # 3. Database connection
 # ---------------------------
 conn = sqlite3.connect(db_file)
+init_bars_db(conn)
 
 # ---------------------------
-# 4. Function: Save data
-# ---------------------------
-def save_to_db(df, table_name):
-    df.to_sql(table_name, conn, if_exists="replace", index=False)  # overwrite
-    print(f"✅ Data saved to table: {table_name}")
-
-# ---------------------------
-# 5. Download crypto data
+# 4. Download crypto data (only bars after each symbol's high-water mark)
+#    All symbols are fetched concurrently; finished date chunks are cached
+#    under results/fetch_cache so reruns only request what is missing.
 # ---------------------------
 cryptos = ["BTC-USD", "ETH-USD"]
 start = "2023-01-01"
 end = "2023-12-31"
 
+starts = {}
 for symbol in cryptos:
-    data = yf.download(symbol, start=start, end=end)
-    data.reset_index(inplace=True)
-
-    # Fix columns → flatten MultiIndex (in case yfinance returns tuple cols)
-    data.columns = [col[0] if isinstance(col, tuple) else col for col in data.columns]
-
-    save_to_db(data, symbol.replace("-", "_"))  # e.g., BTC_USD
-
-# ---------------------------
-# 6. Calculate Metrics
-# ---------------------------
-metrics = []
-
-for symbol in cryptos:
-    df = pd.read_sql(f"SELECT * FROM {symbol.replace('-', '_')}", conn)
-
-    mean_close = df["Close"].mean()
-    min_close = df["Close"].min()
-    max_close = df["Close"].max()
-    volatility = df["Close"].std()
-
-    metrics.append({
-        "Crypto": symbol,
-        "Mean Close": mean_close,
-        "Min Close": min_close,
-        "Max Close": max_close,
-        "Volatility": volatility
-    })
+    hwm = high_water_mark(conn, symbol)
+    fetch_start = start if hwm is None else (hwm + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    if fetch_start >= end:
+        print(f"⏭️ {symbol} already up to date ({hwm.date()})")
+        continue
+    starts[symbol] = fetch_start
 
-metrics_df = pd.DataFrame(metrics)
+fetcher = Fetcher(YFinanceSource())
+frames = fetcher.fetch_many(list(starts), start, end, starts=starts) if starts else {}
+for symbol, err in fetcher.errors.items():
+    print(f"⚠️ {symbol}: download failed ({err[0]})")
 
 # ---------------------------
-# 7. Save metrics table
+# 5. Append new bars + update metrics for the new tail (one transaction)
 # ---------------------------
-save_to_db(metrics_df, "metrics")
+inserted = append_bars(conn, frames)
+for symbol, n in inserted.items():
+    print(f"✅ {symbol}: {n} new bars appended")
 
 # ---------------------------
-# 8. Show Metrics
+# 6. Show Metrics
 # ---------------------------
+metrics_df = pd.read_sql("SELECT * FROM metrics", conn)
 print("\n📊 Metrics DataFrame:")
 print(metrics_df)
 
@@ -0,0 +1,211 @@
+# optimizer.py
+# Mean-variance optimization: min-variance, max-Sharpe, target-return and the
+# efficient frontier, long-only with a per-asset cap that defaults to the
+# risk_engine max-asset-weight rule (so optimized portfolios pass it).
+#
+# Every problem is a point on the family
+#     min_w  1/2 w' S w - lam * mu' w   s.t.  sum(w) = 1,  lb <= w <= max_weight
+# which is solved for a whole vector of lam at once: one eigendecomposition of
+# S gives the exact unconstrained path (used as the starting point) and the
+# step size, then batched accelerated projected gradient (FISTA with restart)
+# runs all lam rows together as K x N matrix products.
+
+import numpy as np
+import pandas as pd
+
+from risk_engine import MAX_ASSET_WEIGHT
+
+
+def ledoit_wolf(returns):
+    """Ledoit-Wolf (2004) shrinkage of the sample covariance towards a scaled identity.
+
+    Returns (covariance, shrinkage intensity). Well-conditioned even when
+    there are more assets than observations.
+    """
+    X = np.asarray(returns, dtype=float)
+    T, N = X.shape
+    X = X - X.mean(axis=0)
+    S = X.T @ X / T
+    m = np.trace(S) / N
+    d2 = ((S - m * np.eye(N)) ** 2).sum()
+    # sum_t ||x_t x_t' - S||^2 = sum_t ||x_t||^4 - T ||S||^2
+    b2 = (((X ** 2).sum(axis=1) ** 2).sum() - T * (S ** 2).sum()) / T ** 2
+    delta = 0.0 if d2 <= 0 else min(max(b2, 0.0), d2) / d2
+    return delta * m * np.eye(N) + (1.0 - delta) * S, float(delta)
+
+
+def project_capped_simplex(V, upper=None, lower=0.0, iters=100):
+    """Row-wise Euclidean projection onto {w : sum(w) = 1, lower <= w <= upper}.
+
+    Solves sum(clip(v - tau, lower, upper)) = 1 for tau by bisection, all rows at once.
+    lower=None means no lower bound.
+    """
+    V = np.atleast_2d(np.asarray(V, dtype=float))
+    N = V.shape[1]
+    up = np.inf if upper is None else upper
+    lo_b = -np.inf if lower is None else lower
+    mean = (V.sum(axis=1) - 1.0) / N
+    lo = np.minimum(V.min(axis=1) - (0.0 if upper is None else upper) - 1.0, mean)
+    hi = np.maximum(V.max(axis=1) - (0.0 if lower is None else lower), mean)
+    for _ in range(iters):
+        tau = 0.5 * (lo + hi)
+        s = np.clip(V - tau[:, None], lo_b, up).sum(axis=1)
+        big = s > 1.0
+        lo = np.where(big, tau, lo)
+        hi = np.where(big, hi, tau)
+    return np.clip(V - (0.5 * (lo + hi))[:, None], lo_b, up)
+
+
+class PortfolioOptimizer:
+    """Mean-variance optimizer over a return matrix (or a given mean / covariance).
+
+    opt = PortfolioOptimizer(p.returns, shrinkage="ledoit_wolf")
+    opt.min_variance(); opt.max_sharpe(); opt.target_return(0.002)
+    opt.frontier(50)           # one row per frontier point (return, volatility, sharpe, weights)
+
+    shrinkage: None (sample covariance), "ledoit_wolf", or a float delta for
+               risk_parity.shrink_to_diagonal
+    max_weight: per-asset cap (default MAX_ASSET_WEIGHT); None for no cap
+    long_only:  weights >= 0
+    """
+
+    def __init__(self, returns=None, mean=None, cov=None, shrinkage=None, max_weight=MAX_ASSET_WEIGHT,
+                 long_only=True, risk_free=0.0, tol=1e-10, max_iter=5000):
+        self.shrinkage = None
+        if returns is not None:
+            returns = returns.dropna(how="any")
+            self.assets = list(returns.columns)
+            R = returns.to_numpy(dtype=float)
+            mean = R.mean(axis=0) if mean is None else mean
+            if cov is None:
+                if shrinkage == "ledoit_wolf":
+                    cov, self.shrinkage = ledoit_wolf(R)
+                else:
+                    cov = np.cov(R, rowvar=False).reshape(len(self.assets), len(self.assets))
+        else:
+            if mean is None or cov is None:
+                raise ValueError("need returns, or both mean and cov")
+            self.assets = list(mean.index) if isinstance(mean, pd.Series) else list(range(len(mean)))
+        if isinstance(shrinkage, (int, float)) and not isinstance(shrinkage, bool):
+            from risk_parity import shrink_to_diagonal
+            cov, self.shrinkage = shrink_to_diagonal(cov, shrinkage), float(shrinkage)
+        self.mu = np.asarray(mean, dtype=float)
+        self.cov = np.asarray(cov, dtype=float)
+        N = len(self.mu)
+        self.max_weight = max_weight
+        self.long_only = long_only
+        if long_only and max_weight is not None and max_weight * N < 1.0 - 1e-12:
+            raise ValueError(f"max_weight {max_weight} is infeasible for {N} long-only assets")
+        self.risk_free = risk_free
+        self.tol = tol
+        self.max_iter = max_iter
+        # the one factorization everything below reuses
+        evals, evecs = np.linalg.eigh(self.cov)
+        self.L = max(evals[-1], 1e-18)
+        inv = np.where(evals > evals[-1] * 1e-12, 1.0 / np.maximum(evals, 1e-300), 0.0)
+        self._solve = lambda b: evecs @ (inv[:, None] * (evecs.T @ b))   # pseudo-inverse of cov
+
+    @property
+    def constrained(self):
+        return self.long_only or self.max_weight is not None
+
+    # ---- batched core ----
+    def _unconstrained(self, lams):
+        """Exact solution without bounds: w(lam) = w_mv + lam * d (one pair of solves)."""
+        N = len(self.mu)
+        ones = np.ones(N)
+        a, b = self._solve(np.column_stack([ones, self.mu])).T
+        sa = a.sum()
+        if abs(sa) < 1e-300:
+            w_mv, d = ones / N, np.zeros(N)
+        else:
+            w_mv = a / sa
+            d = b - b.sum() * w_mv
+        return w_mv[None, :] + np.asarray(lams, dtype=float)[:, None] * d[None, :]
+
+    def _project(self, W):
+        return project_capped_simplex(W, self.max_weight, 0.0 if self.long_only else None)
+
+    def solve_batch(self, lams):
+        """Optimal weights for each risk-aversion multiplier in `lams` -> K x N array."""
+        lams = np.asarray(lams, dtype=float)
+        W = self._unconstrained(lams)
+        if not self.constrained:
+            return W
+        W = self._project(W)
+        Y, t = W.copy(), np.ones(len(lams))
+        step = 1.0 / self.L
+        lm = lams[:, None] * self.mu[None, :]
+        for _ in range(self.max_iter):
+            G = Y @ self.cov - lm
+            W_new = self._project(Y - step * G)
+            # adaptive restart: drop momentum for rows where it points uphill
+            restart = ((G * (W_new - W)).sum(axis=1) > 0)
+            t_new = np.where(restart, 1.0, 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t)))
+            mom = np.where(restart, 0.0, (t - 1.0) / t_new)
+            change = np.abs(W_new - W).max()
+            Y = W_new + mom[:, None] * (W_new - W)
+            W, t = W_new, t_new
+            if change < self.tol:
+                break
+        return W
+
+    def _stats(self, W):
+        ret = W @ self.mu
+        vol = np.sqrt(np.maximum(np.einsum("ij,jk,ik->i", W, self.cov, W), 0.0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sharpe = np.where(vol > 0, (ret - self.risk_free) / vol, 0.0)
+        return ret, vol, sharpe
+
+    def _lambda_grid(self, n):
+        spread = np.ptp(self.mu) if len(self.mu) else 0.0
+        scale = self.L / spread if spread > 0 else 1.0
+        return np.concatenate([[0.0], scale * np.logspace(-4, 2, max(n - 1, 1))])
+
+    def _series(self, w):
+        return pd.Series(w, index=self.assets)
+
+    # ---- public problems ----
+    def min_variance(self):
+        return self._series(self.solve_batch([0.0])[0])
+
+    def max_sharpe(self, n_grid=64, refine=2):
+        lams = self._lambda_grid(n_grid)
+        for _ in range(refine + 1):
+            W = self.solve_batch(lams)
+            k = int(np.argmax(self._stats(W)[2]))
+            lo, hi = lams[max(k - 1, 0)], lams[min(k + 1, len(lams) - 1)]
+            best = W[k]
+            lams = np.linspace(lo, hi, 16)
+        return self._series(best)
+
+    def target_return(self, target, n_grid=64, refine=3):
+        """Minimum-variance portfolio with expected return >= target."""
+        lams = self._lambda_grid(n_grid)
+        W = self.solve_batch(lams)
+        ret = self._stats(W)[0]
+        if ret[0] >= target:
+            return self._series(W[0])
+        if ret.max() < target - 1e-12:
+            raise ValueError(f"target return {target} is above the highest attainable {ret.max():.6g}")
+        for _ in range(refine):
+            k = max(int(np.argmax(ret >= target)), 1)
+            lams = np.linspace(lams[k - 1], lams[k], 16)
+            W = self.solve_batch(lams)
+            ret = self._stats(W)[0]
+        return self._series(W[int(np.argmax(ret >= target - 1e-12))])
+
+    def frontier(self, n_points=50):
+        """Efficient frontier, evenly spaced in return, from batched risk-aversion sweeps."""
+        lams = self._lambda_grid(32)
+        ret = self._stats(self.solve_batch(lams))[0]
+        # frontier return rises with lam: interpolate the lam that hits each target return
+        ret = np.maximum.accumulate(ret)
+        targets = np.linspace(ret[0], ret[-1], n_points)
+        W = self.solve_batch(np.interp(targets, ret, lams))
+        ret, vol, sharpe = self._stats(W)
+        out = pd.DataFrame(W, columns=self.assets)
+        out.insert(0, "sharpe", sharpe)
+        out.insert(0, "volatility", vol)
+        out.insert(0, "return", ret)
+        return out.sort_values("volatility").drop_duplicates(subset=["return", "volatility"]).reset_index(drop=True)
@@ -1,46 +1,197 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import datetime
-from portfolio_math import load_prices, returns_from_prices, equal_weights, rule_based_weights, portfolio_return, portfolio_volatility
-from db_portfolio import init_db, store_portfolio
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import datetime, itertools, os
+import numpy as np
 import pandas as pd
+from portfolio_math import load_prices, returns_from_prices, equal_weights, rule_based_weights, return_stats
+from risk_parity import inverse_vol_weights, erc_weights, shrink_to_diagonal
+from db_portfolio import store_portfolios
 
-def run_strategy(name, prices_path):
-    prices = load_prices(prices_path)
-    returns = returns_from_prices(prices)
-    mean_returns = returns.mean()  # average daily
-    cov = returns.cov()  # daily covariance
-
-    if name == 'equal':
-        weights = equal_weights(returns.columns)
-    elif name == 'rule':
-        weights = rule_based_weights(returns.columns)
-    else:
-        # default to equal
-        weights = equal_weights(returns.columns)
-
-    total_ret = portfolio_return(weights, mean_returns)
-    vol = portfolio_volatility(weights, cov)
-
-    assets_meta = {}
-    for a in returns.columns:
-        assets_meta[a] = {
-            'weight': float(weights[a]),
-            'mean_return': float(mean_returns[a]),
-            'variance': float(returns[a].var())
+# Returns, mean returns and covariance are computed once in the parent and
+# published through multiprocessing.shared_memory; worker processes attach to
+# them zero-copy and only receive (strategy, params) tasks. Results come back
+# to the parent, which is the single DB writer.
+
+
+# ---- shared-memory plumbing ----
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers the block again with the resource tracker
+        # the pool inherited from the parent; the parent's unlink clears it
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedArrays:
+    """Owns shared-memory copies of a dict of NumPy arrays."""
+
+    def __init__(self, arrays):
+        self.blocks = {}
+        self.spec = {}
+        for key, arr in arrays.items():
+            arr = np.ascontiguousarray(arr, dtype=np.float64)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            self.blocks[key] = shm
+            self.spec[key] = (shm.name, arr.shape, arr.dtype.str)
+
+    def close(self):
+        for shm in self.blocks.values():
+            shm.close()
+            shm.unlink()
+        self.blocks = {}
+
+
+_worker = {}
+
+
+def _init_worker(spec, assets):
+    _worker["assets"] = assets
+    _worker["shm"] = []
+    for key, (name, shape, dtype) in spec.items():
+        shm = _attach(name)
+        _worker["shm"].append(shm)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        _worker[key] = arr
+
+
+# ---- strategies: fn(assets, data, **params) -> weight array ----
+
+def _window(data, window):
+    R = data["returns"]
+    if window is None or window >= len(R):
+        return data["mean"], data["cov"], data["var"]
+    tail = R[-window:]
+    return tail.mean(axis=0), np.cov(tail, rowvar=False), tail.var(axis=0, ddof=1)
+
+
+def strategy_equal(assets, data):
+    return equal_weights(assets).to_numpy()
+
+
+def strategy_rule(assets, data):
+    return rule_based_weights(assets).to_numpy()
+
+
+def strategy_inverse_vol(assets, data, window=None):
+    _, _, var = _window(data, window)
+    return inverse_vol_weights(np.sqrt(var))
+
+
+def strategy_erc(assets, data, window=None, shrinkage=0.1):
+    _, cov, var = _window(data, window)
+    live = var > 0
+    w = np.zeros(len(assets))
+    if live.any():
+        w[live], _ = erc_weights(shrink_to_diagonal(cov[np.ix_(live, live)], shrinkage))
+    return w
+
+
+STRATEGIES = {
+    'equal': strategy_equal,
+    'rule': strategy_rule,
+    'inverse_vol': strategy_inverse_vol,
+    'erc': strategy_erc,
+}
+
+
+def _evaluate(task, data=None):
+    name, params = task
+    data = data or _worker
+    assets = data["assets"]
+    # unknown strategies default to equal
+    fn = STRATEGIES.get(name, strategy_equal)
+    w = np.asarray(fn(assets, data, **params), dtype=float)
+    total_ret = float(w @ data["mean"])
+    vol = float(np.sqrt(max(w @ data["cov"] @ w, 0.0)))
+    return {'name': name, 'params': params, 'total_return': total_ret, 'volatility': vol, 'weights': w}
+
+
+def _evaluate_chunk(tasks):
+    return [_evaluate(t) for t in tasks]
+
+
+class StrategyRunner:
+    """Load prices once, then fan strategies / parameter grids out over a process pool.
+
+    runner = StrategyRunner('sample_prices.csv')
+    results = runner.run([('equal', {}), ('inverse_vol', {'window': 5})])
+    results = runner.run_grid({'inverse_vol': {'window': [30, 60, 90]}})
+    """
+
+    def __init__(self, prices_path=None, returns=None, max_workers=None):
+        if returns is None:
+            returns = returns_from_prices(load_prices(prices_path))
+        self.assets = list(returns.columns)
+        # daily mean / covariance / variance, reused across runs over unchanged prices
+        stats = return_stats(returns)
+        self.data = {
+            'returns': returns.to_numpy(dtype=float),
+            'mean': stats['mean'],
+            'cov': stats['cov'],
+            'var': stats['var'],
         }
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def run(self, tasks, store=True, chunksize=None):
+        tasks = [(t, {}) if isinstance(t, str) else (t[0], dict(t[1])) for t in tasks]
+        if self.max_workers <= 1 or len(tasks) <= 1:
+            local = dict(self.data, assets=self.assets)
+            results = [_evaluate(t, local) for t in tasks]
+        else:
+            if chunksize is None:
+                chunksize = max(1, len(tasks) // (self.max_workers * 4))
+            chunks = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+            shared = SharedArrays(self.data)
+            try:
+                with ProcessPoolExecutor(max_workers=min(self.max_workers, len(chunks)),
+                                         initializer=_init_worker,
+                                         initargs=(shared.spec, self.assets)) as ex:
+                    results = [r for chunk in ex.map(_evaluate_chunk, chunks) for r in chunk]
+            finally:
+                shared.close()
+        if store:
+            self.store(results)
+        return results
 
-    # store into DB
-    init_db()
-    store_portfolio(name, datetime.datetime.utcnow().isoformat(), float(total_ret), float(vol), assets_meta)
+    def run_grid(self, grid, store=True):
+        """grid: {strategy: {param: [values, ...]}} -> every combination."""
+        tasks = []
+        for name, params in grid.items():
+            keys = list(params)
+            for combo in itertools.product(*(params[k] for k in keys)):
+                tasks.append((name, dict(zip(keys, combo))))
+        return self.run(tasks, store=store)
 
-    return {'name': name, 'total_return': total_ret, 'volatility': vol, 'weights': weights}
+    def _assets_meta(self, w):
+        var = self.data['var']
+        mean = self.data['mean']
+        return {a: {'weight': float(w[i]), 'mean_return': float(mean[i]), 'variance': float(var[i])}
+                for i, a in enumerate(self.assets)}
+
+    def store(self, results):
+        # single writer: only the parent process touches the DB, in one bulk transaction
+        date_run = datetime.datetime.utcnow().isoformat()
+        records = []
+        for res in results:
+            label = res['name'] if not res['params'] else \
+                res['name'] + '(' + ','.join(f'{k}={v}' for k, v in res['params'].items()) + ')'
+            records.append((label, date_run, res['total_return'], res['volatility'], self._assets_meta(res['weights'])))
+        store_portfolios(records)
+
+
+def run_strategy(name, prices_path):
+    runner = StrategyRunner(prices_path, max_workers=1)
+    res = runner.run([name])[0]
+    return {'name': name, 'total_return': res['total_return'], 'volatility': res['volatility'],
+            'weights': pd.Series(res['weights'], index=runner.assets)}
 
 def run_all(prices_path):
     strategies = ['equal', 'rule', 'performance']
-    results = []
-    with ThreadPoolExecutor(max_workers=3) as ex:
-        futures = {ex.submit(run_strategy, s, prices_path): s for s in strategies}
-        for fut in as_completed(futures):
-            res = fut.result()
-            results.append(res)
-    return results
+    runner = StrategyRunner(prices_path, max_workers=min(3, os.cpu_count() or 1))
+    results = runner.run(strategies)
+    return [{'name': r['name'], 'total_return': r['total_return'], 'volatility': r['volatility'],
+             'weights': pd.Series(r['weights'], index=runner.assets)} for r in results]
@@ -0,0 +1,266 @@
+# pipeline.py
+# Small DAG runner: stages declare named inputs and outputs, every stage whose
+# inputs are ready runs on a thread pool, and each stage's outputs are cached
+# under a content hash of its inputs, the files it reads and the source of the
+# modules it calls, so a rerun over unchanged data and code loads them instead
+# of running the stage again. Stages with side effects (DB writes, alerts)
+# are declared cache=False and always run.
+# Per-stage wall time and process RSS are recorded; end-to-end time follows
+# the critical path of the graph rather than the sum of the stages. RSS is
+# process-wide, so a per-stage delta is only reported when stages run serially. Stages also
+# report to instrumentation (timers, and profiles when profiling is on).
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import glob, hashlib, importlib.util, json, os, pickle, sys, threading, time
+
+from instrumentation import count, rss_mb as _rss_mb, stage as instrument_stage
+
+CACHE_DIR = "results/pipeline_cache"
+
+
+class Stage:
+    """fn(**inputs) -> dict of outputs (or a single value when there is one output).
+
+    files: paths or glob patterns the stage reads directly; their size and
+           mtime are part of the cache key
+    modules: names of the modules the stage calls into; their source is part
+           of the cache key (fn's own module always is)
+    cache: False for stages that must always run, e.g. ones with side effects
+    """
+
+    def __init__(self, name, fn, inputs=(), outputs=(), files=(), modules=(), cache=True):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.files = tuple(files)
+        self.modules = tuple(modules)
+        self.cache = cache
+
+
+def _value_hash(value):
+    try:
+        from stats_cache import fingerprint
+        import numpy as np, pandas as pd
+        if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+            return fingerprint(value)
+    except ImportError:
+        pass
+    try:
+        data = pickle.dumps(value, protocol=4)
+    except Exception:
+        data = repr(value).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _files_state(patterns):
+    state = []
+    for pat in patterns:
+        for p in sorted(glob.glob(pat)) or [pat]:
+            try:
+                st = os.stat(p)
+                state.append((p, st.st_size, st.st_mtime_ns))
+            except OSError:
+                state.append((p, None, None))
+    return state
+
+
+def _module_file(name):
+    mod = sys.modules.get(name)
+    path = getattr(mod, "__file__", None)
+    if path is None:
+        try:
+            spec = importlib.util.find_spec(name)      # locate without importing
+        except (ImportError, ValueError):
+            spec = None
+        path = getattr(spec, "origin", None)
+    return path if path and os.path.isfile(path) else None
+
+
+def _modules_state(names):
+    """(name, content hash of its source file) per module; None when it cannot be found."""
+    state = []
+    for name in names:
+        path = _module_file(name)
+        digest = None
+        if path:
+            with open(path, "rb") as f:
+                digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        state.append((name, digest))
+    return state
+
+
+class Pipeline:
+    """Run stages in dependency order with independent stages in parallel.
+
+    pipe = Pipeline([Stage("load", load, outputs=["df"], files=["prices.csv"]),
+                     Stage("weights", weights, inputs=["df"], outputs=["w"])])
+    values, report = pipe.run()
+    """
+
+    def __init__(self, stages, max_workers=4, cache_dir=CACHE_DIR, use_cache=True):
+        self.stages = {s.name: s for s in stages}
+        self.max_workers = max_workers
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache and cache_dir is not None
+        producers = {}
+        for s in stages:
+            for o in s.outputs:
+                if o in producers:
+                    raise ValueError(f"output {o!r} produced by both {producers[o]} and {s.name}")
+                producers[o] = s.name
+        self.producers = producers
+        self._check_acyclic()
+        self.manifest_lock = threading.Lock()
+
+    def _deps(self, stage, initial):
+        return {self.producers[i] for i in stage.inputs if i not in initial}
+
+    def _check_acyclic(self):
+        state = {}
+
+        def visit(name):
+            if state.get(name) == 1:
+                raise ValueError(f"pipeline has a cycle through {name!r}")
+            if state.get(name) == 2:
+                return
+            state[name] = 1
+            for i in self.stages[name].inputs:
+                if i in self.producers:
+                    visit(self.producers[i])
+            state[name] = 2
+
+        for name in self.stages:
+            visit(name)
+
+    # ---- cache ----
+    def _manifest_path(self):
+        return os.path.join(self.cache_dir, "manifest.json")
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, self._manifest_path())
+
+    def _key(self, stage, kwargs):
+        h = hashlib.blake2b(digest_size=16)
+        code = getattr(stage.fn, "__code__", None)
+        h.update(repr((stage.name, getattr(stage.fn, "__qualname__", repr(stage.fn)),
+                       code.co_code if code is not None else b"", stage.outputs)).encode())
+        for k in sorted(kwargs):
+            h.update(k.encode())
+            h.update(_value_hash(kwargs[k]).encode())
+        h.update(repr(_files_state(stage.files)).encode())
+        own = getattr(stage.fn, "__module__", None)
+        h.update(repr(_modules_state(((own,) if own else ()) + stage.modules)).encode())
+        return h.hexdigest()
+
+    def _run_stage(self, stage, kwargs, manifest):
+        t0 = time.perf_counter()
+        rss0 = _rss_mb()
+        key = None
+        if self.use_cache and stage.cache:
+            key = self._key(stage, kwargs)
+            path = os.path.join(self.cache_dir, stage.name + ".pkl")
+            if manifest.get(stage.name) == key and os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        out = pickle.load(f)
+                    count("pipeline_cache_hits", stage=stage.name)
+                    return out, self._row(stage, "cached", t0, rss0)
+                except Exception:
+                    pass
+        with instrument_stage(stage.name, memory=self.max_workers == 1):
+            result = stage.fn(**kwargs)
+        if len(stage.outputs) == 1 and not (isinstance(result, dict) and set(result) == set(stage.outputs)):
+            result = {stage.outputs[0]: result}
+        out = {o: (result or {}).get(o) for o in stage.outputs}
+        if key is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                path = os.path.join(self.cache_dir, stage.name + ".pkl")
+                with open(path + ".tmp", "wb") as f:
+                    pickle.dump(out, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(path + ".tmp", path)
+                with self.manifest_lock:
+                    manifest[stage.name] = key
+            except Exception as e:
+                print(f"[WARN] pipeline: could not cache {stage.name}: {e}")
+        return out, self._row(stage, "ran", t0, rss0)
+
+    def _row(self, stage, status, t0, rss0):
+        rss1 = _rss_mb()
+        row = {"stage": stage.name, "status": status, "seconds": time.perf_counter() - t0, "rss_mb": rss1}
+        if self.max_workers == 1:
+            # with concurrent stages the difference would include the others' allocations
+            row["rss_delta_mb"] = rss1 - rss0
+        return row
+
+    # ---- scheduling ----
+    def run(self, initial=None, targets=None):
+        """Run every stage (or only those needed for `targets`). Returns (values, report rows)."""
+        values = dict(initial or {})
+        todo = set(self.stages)
+        if targets:
+            todo = set()
+            stack = list(targets)
+            while stack:
+                name = stack.pop()
+                if name not in todo:
+                    todo.add(name)
+                    stack.extend(self._deps(self.stages[name], values))
+        manifest = self._load_manifest() if self.use_cache else {}
+        report, running, failed = [], {}, set()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as ex:
+            while todo or running:
+                for name in sorted(todo):
+                    stage = self.stages[name]
+                    deps = self._deps(stage, values)
+                    if deps & failed:
+                        todo.discard(name)
+                        failed.add(name)
+                        report.append({"stage": name, "status": "skipped (upstream failed)", "seconds": 0.0})
+                    elif all(i in values for i in stage.inputs):
+                        todo.discard(name)
+                        kwargs = {i: values[i] for i in stage.inputs}
+                        fut = ex.submit(self._run_stage, stage, kwargs, manifest)
+                        running[fut] = (name, time.perf_counter() - start)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name, began = running.pop(fut)
+                    try:
+                        out, row = fut.result()
+                        values.update(out)
+                    except Exception as e:
+                        print(f"[ERROR] Stage {name} failed:", e)
+                        failed.add(name)
+                        row = {"stage": name, "status": f"failed: {e}", "seconds": time.perf_counter() - start - began}
+                    row["start"] = began
+                    report.append(row)
+        if self.use_cache:
+            self._save_manifest(manifest)
+        total = time.perf_counter() - start
+        report.append({"stage": "(total)", "status": f"{sum(r.get('seconds', 0) for r in report):.3f}s of stage time",
+                       "seconds": total, "start": 0.0})
+        return values, report
+
+
+def format_report(report):
+    """Report rows as a table; proc_rss is process RSS when the stage ended, d_rss only in serial runs."""
+    lines = [f"{'stage':<12} {'status':<28} {'start':>8} {'seconds':>9} {'proc_rss':>8} {'d_rss':>7}"]
+    for r in report:
+        lines.append(f"{r['stage']:<12} {r['status'][:28]:<28} {r.get('start', 0):>8.3f} {r['seconds']:>9.3f} "
+                     f"{r.get('rss_mb', float('nan')):>8.1f} {r.get('rss_delta_mb', float('nan')):>7.1f}")
+    return "\n".join(lines)
@@ -2,12 +2,57 @@ import pandas as pd
 
 class Portfolio:
     def __init__(self, combined_df):
-        self.df = combined_df.copy()
-        self.df["date"] = pd.to_datetime(self.df["date"])
-        self.close_pivot = self.df.pivot(index="date", columns="asset", values="close").sort_index()
+        # only the three pivot columns are copied; the long frame is not kept on the instance
+        long = combined_df[["date", "asset", "close"]].assign(date=lambda d: pd.to_datetime(d["date"]))
+        self.close_pivot = long.pivot(index="date", columns="asset", values="close").sort_index()
         self.returns = self.close_pivot.pct_change().dropna()
+        self._matrix = None
+
+    @classmethod
+    def from_csv(cls, path, chunksize=None, float32=False):
+        """Build from a long-format CSV read in chunks, never holding the long frame (see streaming_loader)."""
+        from streaming_loader import CHUNK_ROWS, load_returns
+        self = cls.__new__(cls)
+        self.close_pivot, self.returns = load_returns(path, chunksize or CHUNK_ROWS, float32)
+        self._matrix = None
+        return self
+
+    @property
+    def matrix(self):
+        """Shared read-only return matrix for compact portfolios (see compact_portfolio.ReturnsMatrix)."""
+        if self._matrix is None:
+            from compact_portfolio import ReturnsMatrix
+            self._matrix = ReturnsMatrix.from_portfolio(self)
+        return self._matrix
+
+    def compact(self, weights, name=None):
+        """Lightweight fixed-weight portfolio over self.matrix: O(assets) memory per instance."""
+        from compact_portfolio import CompactPortfolio
+        return CompactPortfolio(self.matrix, weights, name)
+
+    def book(self, weights=None, names=None):
+        """PortfolioBook of many compact portfolios sharing self.matrix."""
+        from compact_portfolio import PortfolioBook
+        if weights is None:
+            return PortfolioBook(self.matrix)
+        return PortfolioBook.from_weights(self.matrix, weights, names)
 
     def run(self, weights):
         w_series = pd.Series({a: weights.get(a,0) for a in self.close_pivot.columns})
         port_ret = (self.returns * w_series).sum(axis=1).to_frame(name="portfolio_return")
         return port_ret
+
+    def run_many(self, weights):
+        """Portfolio returns for many weight vectors at once: T x K DataFrame (see portfolio_math.portfolio_returns_batch)."""
+        from portfolio_math import portfolio_returns_batch
+        return portfolio_returns_batch(weights, self.returns)
+
+    def backtest(self, weight_fn="inverse_vol", schedule="monthly", window=90, **kwargs):
+        """Walk-forward rebalancing backtest over this portfolio's returns (see backtest.walk_forward)."""
+        from backtest import walk_forward
+        return walk_forward(self.returns, weight_fn, schedule=schedule, window=window, **kwargs)
+
+    def simulate(self, weights=None, n_paths=10000, horizon=365, method="bootstrap", seed=None, **kwargs):
+        """Monte Carlo VaR / CVaR / drawdown simulation over this portfolio's returns (see simulation.simulate)."""
+        from simulation import simulate
+        return simulate(self.returns, weights, n_paths=n_paths, horizon=horizon, method=method, seed=seed, **kwargs)
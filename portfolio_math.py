@@ -1,8 +1,9 @@
 import numpy as np
 import pandas as pd
+from price_store import read_csv_cached
 
-def load_prices(path):
-    df = pd.read_csv(path, parse_dates=['date']).set_index('date').sort_index()
+def load_prices(path, store=None):
+    df = read_csv_cached(path, store, parse_dates=['date']).set_index('date').sort_index()
     return df
 
 def returns_from_prices(prices_df):
@@ -35,5 +36,126 @@ def portfolio_return(weights, mean_returns):
 
 def portfolio_volatility(weights, cov_matrix):
     w = weights.values.reshape(-1,1)
-    var = float(w.T @ cov_matrix.values @ w)
+    var = (w.T @ cov_matrix.values @ w).item()
     return np.sqrt(var)
+
+# ---- risk metrics used by Risk_checker (batch; see streaming_metrics for O(1) updates) ----
+
+def _ratio(num, den):
+    if den > 0:
+        return num / den
+    return 0.0 if num == 0 else float(np.copysign(np.inf, num))
+
+def _ratio_batch(num, den):
+    """Element-wise _ratio: 0 for 0/0, +/-inf for a non-zero mean over zero deviation."""
+    num = np.asarray(num, dtype=float)
+    den = np.asarray(den, dtype=float)
+    out = np.zeros(num.shape)
+    pos = den > 0
+    out[pos] = num[pos] / den[pos]
+    flat = ~pos & (num != 0)
+    out[flat] = np.copysign(np.inf, num[flat])
+    return out
+
+def returns_to_volatility(returns, periods_per_year=1):
+    r = np.asarray(returns, dtype=float)
+    if len(r) < 2:
+        return 0.0
+    return float(r.std(ddof=1) * np.sqrt(periods_per_year))
+
+def sharpe_ratio(returns, risk_free=0.0, periods_per_year=1):
+    r = np.asarray(returns, dtype=float) - risk_free
+    if len(r) < 2:
+        return 0.0
+    return float(_ratio(r.mean(), r.std(ddof=1)) * np.sqrt(periods_per_year))
+
+def downside_deviation(returns, target=0.0):
+    r = np.asarray(returns, dtype=float)
+    if len(r) == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(np.minimum(r - target, 0.0) ** 2)))
+
+def sortino_ratio(returns, target=0.0, periods_per_year=1):
+    r = np.asarray(returns, dtype=float)
+    if len(r) == 0:
+        return 0.0
+    return float(_ratio((r - target).mean(), downside_deviation(r, target)) * np.sqrt(periods_per_year))
+
+def max_drawdown(cum_returns):
+    # cum_returns: cumulative return path (0 = starting value); result is <= 0
+    wealth = 1.0 + np.asarray(cum_returns, dtype=float)
+    if len(wealth) == 0:
+        return 0.0
+    peak = np.maximum.accumulate(np.maximum(wealth, 1.0))
+    return float(np.min(wealth / peak - 1.0))
+
+def return_stats(returns, window=None, estimator="sample"):
+    """Mean / variance / covariance of `returns` (last `window` rows), via the shared stats cache."""
+    from stats_cache import get_cache
+    return get_cache().stats(returns, window=window, estimator=estimator)
+
+# ---- batched evaluation: K weight vectors x one return matrix ----
+
+EVAL_CHUNK_BYTES = 64 * 1024 * 1024
+
+def weight_matrix(weights, assets):
+    """K x A weight array (and portfolio labels) from a DataFrame, dict, list of dicts or array."""
+    if isinstance(weights, pd.DataFrame):
+        return weights.reindex(columns=assets, fill_value=0.0).fillna(0.0).to_numpy(dtype=float), list(weights.index)
+    if isinstance(weights, (dict, pd.Series)):
+        weights = [weights]
+    if isinstance(weights, (list, tuple)) and weights and isinstance(weights[0], (dict, pd.Series)):
+        W = np.array([[float(w.get(a, 0.0)) for a in assets] for w in weights])
+        return W, list(range(len(W)))
+    W = np.atleast_2d(np.asarray(weights, dtype=float))
+    return W, list(range(len(W)))
+
+def portfolio_returns_batch(weights, returns):
+    """T x K portfolio return series in one matmul (R @ W.T)."""
+    W, names = weight_matrix(weights, list(returns.columns))
+    return pd.DataFrame(returns.to_numpy(dtype=float) @ W.T, index=returns.index, columns=names)
+
+def portfolio_volatility_batch(W, cov):
+    """sqrt(diag(W cov W')) without forming the K x K product."""
+    W = np.atleast_2d(np.asarray(W, dtype=float))
+    return np.sqrt(np.maximum(np.einsum("ij,ij->i", W @ np.asarray(cov, dtype=float), W), 0.0))
+
+def evaluate_portfolios(weights, returns, chunk_size=None, path_stats=True):
+    """Summary stats for K portfolios over one return matrix, K processed in chunks.
+
+    mean_return / volatility / sharpe come from mu and the covariance
+    (W @ mu, diag(W cov W')); with path_stats the realized series R @ W.T is
+    also built chunk by chunk for total_return, sortino and max_drawdown.
+    All values are per period, like the functions above.
+    """
+    assets = list(returns.columns)
+    W, names = weight_matrix(weights, assets)
+    R = returns.to_numpy(dtype=float)
+    T, K = len(R), len(W)
+    stats = return_stats(returns)
+    mu, cov = stats["mean"], stats["cov"]
+    if chunk_size is None:
+        chunk_size = max(1, EVAL_CHUNK_BYTES // (8 * max(T, len(assets)) * 3))
+    cols = {k: np.empty(K) for k in ("mean_return", "volatility", "sharpe")}
+    if path_stats:
+        cols.update({k: np.empty(K) for k in ("total_return", "sortino", "max_drawdown")})
+    for a in range(0, K, chunk_size):
+        Wc = W[a:a + chunk_size]
+        m = Wc @ mu
+        v = portfolio_volatility_batch(Wc, cov)
+        cols["mean_return"][a:a + len(Wc)] = m
+        cols["volatility"][a:a + len(Wc)] = v
+        cols["sharpe"][a:a + len(Wc)] = _ratio_batch(m, v) if T > 1 else 0.0
+        if path_stats:
+            if T == 0:
+                for k in ("total_return", "sortino", "max_drawdown"):
+                    cols[k][a:a + len(Wc)] = 0.0
+                continue
+            P = R @ Wc.T                                   # T x chunk
+            wealth = np.cumprod(1.0 + P, axis=0)
+            peak = np.maximum.accumulate(np.maximum(wealth, 1.0), axis=0)
+            dd = np.sqrt(np.mean(np.minimum(P, 0.0) ** 2, axis=0))
+            cols["total_return"][a:a + len(Wc)] = wealth[-1] - 1.0
+            cols["max_drawdown"][a:a + len(Wc)] = (wealth / peak - 1.0).min(axis=0)
+            cols["sortino"][a:a + len(Wc)] = _ratio_batch(P.mean(axis=0), dd)
+    return pd.DataFrame(cols, index=names)
@@ -5,13 +5,16 @@
 import pandas as pd
 import numpy as np
 import sqlite3
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error, r2_score
+import json, os
 from datetime import datetime
 from pathlib import Path
+from price_store import read_csv_cached
+from instrumentation import count, timed, timer
+from stats_cache import fingerprint
 
-def load_data_from_csvs():
-    """Load Binance or Portfolio CSVs. If not found, generate synthetic demo data."""
+def load_data_from_csvs(store=None):
+    """Load Binance or Portfolio CSVs. If not found, generate synthetic demo data.
+    Files already ingested into the price store are read from there."""
     files = {
         "BTC": Path("Binance_BTCUSDT_d.csv"),
         "ETH": Path("Binance_ETHUSDT_d.csv"),
@@ -22,15 +25,15 @@ def load_data_from_csvs():
 
     for k, p in files.items():
         if p.exists():
-            tmp = pd.read_csv(p)
+            tmp = read_csv_cached(p, store)
             cols_lower = [c.lower() for c in tmp.columns]
             if "close" in cols_lower:
                 col = tmp.columns[cols_lower.index("close")]
-                prices = pd.to_numeric(tmp[col], errors="coerce").fillna(method="ffill").fillna(0)
+                prices = pd.to_numeric(tmp[col], errors="coerce").ffill().fillna(0)
             else:
                 numeric_cols = tmp.select_dtypes(include=[np.number]).columns
                 if len(numeric_cols) > 0:
-                    prices = pd.to_numeric(tmp[numeric_cols[0]], errors="coerce").fillna(method="ffill").fillna(0)
+                    prices = pd.to_numeric(tmp[numeric_cols[0]], errors="coerce").ffill().fillna(0)
                 else:
                     continue
             series = prices.pct_change().fillna(0)
@@ -49,7 +52,7 @@ def load_data_from_csvs():
     ]
     for p in portfolio_paths:
         if p.exists():
-            tmp = pd.read_csv(p)
+            tmp = read_csv_cached(p, store)
             candidates = [c for c in tmp.columns if "portfolio" in c.lower() and ("pct" in c.lower() or "change" in c.lower())]
             if candidates:
                 col = candidates[0]
@@ -78,9 +81,14 @@ def train_and_predict_series(series, label):
     if N == 0:
         return None
 
+    # imported here so loading predictor (online / batched paths) does not pull in sklearn
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import mean_squared_error, r2_score
+
     X_full = np.arange(N).reshape(-1, 1)
     model = LinearRegression()
-    model.fit(X_full, y)
+    with timer("model_fit", model="linear_regression"):
+        model.fit(X_full, y)
     y_pred_full = model.predict(X_full)
 
     mse = mean_squared_error(y, y_pred_full)
@@ -98,45 +106,291 @@ def train_and_predict_series(series, label):
         "pred_last": pred_last.tolist(),
     }
 
-def run_all_predictions(df):
+TAIL = 10
+MODEL_PATH = "results/models/predictor_models.json"
+
+
+class OnlineTrendModel:
+    """Linear trend y = a + b*t fitted from running sufficient statistics.
+
+    Keeps n, the means of t and y and their centred co-moments (the stable
+    form of sum t, sum y, sum ty, sum t^2, sum y^2), so update() costs
+    O(new rows) and gives exactly the least-squares fit on the full series.
+    """
+
+    def __init__(self, n=0, mean_x=0.0, mean_y=0.0, cxx=0.0, cxy=0.0, cyy=0.0, tail=None):
+        self.n = n
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.cxx = cxx
+        self.cxy = cxy
+        self.cyy = cyy
+        self.tail = list(tail or [])
+
+    def update(self, y):
+        """Append new observations (their t continues from the last one seen)."""
+        y = np.asarray(y, dtype=float)
+        m = len(y)
+        if m == 0:
+            return self
+        x = np.arange(self.n, self.n + m, dtype=float)
+        mx, my = x.mean(), y.mean()
+        xc, yc = x - mx, y - my
+        n = self.n + m
+        dx, dy = mx - self.mean_x, my - self.mean_y
+        f = self.n * m / n
+        # Chan et al. pairwise merge of the co-moments
+        self.cxx += xc @ xc + dx * dx * f
+        self.cxy += xc @ yc + dx * dy * f
+        self.cyy += yc @ yc + dy * dy * f
+        self.mean_x += dx * m / n
+        self.mean_y += dy * m / n
+        self.n = n
+        self.tail = (self.tail + y[-TAIL:].tolist())[-TAIL:]
+        return self
+
+    @property
+    def slope(self):
+        return self.cxy / self.cxx if self.cxx > 0 else 0.0
+
+    @property
+    def intercept(self):
+        return self.mean_y - self.slope * self.mean_x
+
+    def predict(self, t):
+        return self.intercept + self.slope * np.asarray(t, dtype=float)
+
+    @property
+    def mse(self):
+        if self.n == 0:
+            return 0.0
+        sse = self.cyy - self.slope * self.cxy
+        return max(sse, 0.0) / self.n
+
+    @property
+    def r2(self):
+        if self.cyy <= 0:
+            return 1.0 if self.mse == 0 else 0.0
+        return 1.0 - self.mse * self.n / self.cyy
+
+    def result(self, label):
+        """Same shape as train_and_predict_series()."""
+        k = len(self.tail)
+        return {
+            "label": label,
+            "mse": float(self.mse),
+            "r2": float(self.r2),
+            "actual_last": list(self.tail),
+            "pred_last": self.predict(np.arange(self.n - k, self.n)).tolist(),
+        }
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(**state)
+
+
+@timed("model_fit", model="trend_batch")
+def fit_trend_batch(Y):
+    """Closed-form trend fit of every column of Y (N x S) at once -> list of OnlineTrendModel."""
+    Y = np.asarray(Y, dtype=float)
+    N, S = Y.shape
+    if N == 0:
+        return [OnlineTrendModel() for _ in range(S)]
+    x = np.arange(N, dtype=float)
+    mx = x.mean()
+    xc = x - mx
+    my = Y.mean(axis=0)
+    Yc = Y - my
+    cxx = float(xc @ xc)
+    cxy = xc @ Yc
+    cyy = np.einsum("ij,ij->j", Yc, Yc)
+    tail = Y[-TAIL:]
+    return [OnlineTrendModel(N, mx, float(my[j]), cxx, float(cxy[j]), float(cyy[j]), tail[:, j].tolist())
+            for j in range(S)]
+
+
+def load_models(path=MODEL_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    # files written before prefix fingerprints carry no "prefix" and get refitted once
+    return {label: (OnlineTrendModel.from_dict(m["model"]), m.get("prefix")) for label, m in state.items()}
+
+
+def save_models(models, path=MODEL_PATH):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({label: {"model": m.to_dict(), "prefix": prefix} for label, (m, prefix) in models.items()}, f)
+    os.replace(tmp, path)
+
+
+@timed("model_fit", model="trend_online")
+def update_models(df, cols, path=MODEL_PATH):
+    """Feed only rows added since the last run into each persisted model.
+
+    Each model stores a fingerprint of the prefix it has consumed; it is
+    refitted from scratch if its series got shorter or any consumed row
+    changed (the history was rewritten).
+    """
+    models = load_models(path)
+    stale = []
+    for c in cols:
+        y = df[c].fillna(0).to_numpy(dtype=float)
+        entry = models.get(c)
+        if entry is not None:
+            m, prefix = entry
+            if 0 < m.n <= len(y) and fingerprint(y[:m.n]) == prefix:
+                if len(y) > m.n:
+                    m.update(y[m.n:])
+                    models[c] = (m, fingerprint(y))
+                continue
+        stale.append(c)
+    if stale:
+        # everything new or rewritten is fitted in one batched solve
+        Y = df[stale].fillna(0).to_numpy(dtype=float)
+        for j, m in enumerate(fit_trend_batch(Y)):
+            models[stale[j]] = (m, fingerprint(np.ascontiguousarray(Y[:, j])))
+    save_models(models, path)
+    return {c: models[c][0] for c in cols}
+
+
+def _print_result(c, res):
+    lines = [f"--- {c} ---", f"MSE: {res['mse']:.4f} R²: {res['r2']:.4f}", "Asset Actual Predicted"]
+    lines += [f"{c} {a:.6f} {p:.6f}" for a, p in zip(res["actual_last"], res["pred_last"])]
+    print("\n".join(lines) + "\n")
+
+
+def run_all_predictions(df, online=False, model_path=MODEL_PATH, verbose=True):
+    """Trend forecast for every return column.
+
+    online=False fits all columns in one batched closed-form solve;
+    online=True updates the models persisted at `model_path` with only the new rows.
+    """
     results = {}
     cols = [c for c in df.columns if c.lower().endswith("_pct_change") or "portfolio" in c.lower()]
     if not cols:
         print("No suitable columns found.")
         return results
 
+    if len(df) == 0:
+        return results
+    if online:
+        models = update_models(df, cols, model_path)
+    else:
+        models = dict(zip(cols, fit_trend_batch(df[cols].fillna(0).to_numpy(dtype=float))))
     for c in cols:
-        res = train_and_predict_series(df[c].fillna(0), c)
-        if res is None:
-            continue
+        res = models[c].result(c)
         results[c] = res
-        print(f"--- {c} ---")
-        print(f"MSE: {res['mse']:.4f} R²: {res['r2']:.4f}")
-        display_df = pd.DataFrame({
-            "Asset": [c]*len(res["actual_last"]),
-            "Actual": np.round(res["actual_last"], 6),
-            "Predicted": np.round(res["pred_last"], 6)
-        })
-        print(display_df.to_string(index=False))
-        print()
+        if verbose:
+            _print_result(c, res)
     return results
 
+PREDICTION_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS prediction_runs (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT, ts TIMESTAMP, n_assets INTEGER);
+    CREATE TABLE IF NOT EXISTS predictions
+        (id INTEGER PRIMARY KEY AUTOINCREMENT, asset TEXT, mse REAL, r2 REAL, ts TIMESTAMP);
+    CREATE TABLE IF NOT EXISTS prediction_rows
+        (id INTEGER PRIMARY KEY AUTOINCREMENT, asset TEXT, actual REAL, predicted REAL, ts TIMESTAMP);
+"""
+
+# created after the run_id migration; the asset indexes end in rowid order, so
+# "latest N for an asset" is an index range scan in reverse
+PREDICTION_INDEXES = """
+    CREATE INDEX IF NOT EXISTS ix_predictions_asset_run ON predictions(asset, run_id, mse, r2, ts);
+    CREATE INDEX IF NOT EXISTS ix_predictions_run ON predictions(run_id);
+    CREATE INDEX IF NOT EXISTS ix_prediction_rows_asset_run ON prediction_rows(asset, run_id);
+    CREATE INDEX IF NOT EXISTS ix_prediction_rows_run ON prediction_rows(run_id);
+    CREATE INDEX IF NOT EXISTS ix_prediction_runs_ts ON prediction_runs(ts);
+"""
+
+
+def _ensure_prediction_schema(conn):
+    conn.executescript(PREDICTION_SCHEMA)
+    for table in ("predictions", "prediction_rows"):
+        cols = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if "run_id" not in cols:
+            # databases written before run ids existed: old rows keep run_id NULL
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN run_id INTEGER REFERENCES prediction_runs(run_id)")
+    conn.executescript(PREDICTION_INDEXES)
+
+
 def store_predictions(results, db_path="crypto.db"):
+    """Store one prediction run in a single transaction. Returns its run_id."""
+    ts = datetime.utcnow().isoformat()
     conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute("""CREATE TABLE IF NOT EXISTS predictions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, asset TEXT, mse REAL, r2 REAL, ts TIMESTAMP)""")
-    c.execute("""CREATE TABLE IF NOT EXISTS prediction_rows
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, asset TEXT, actual REAL, predicted REAL, ts TIMESTAMP)""")
-    for asset, vals in results.items():
-        c.execute("INSERT INTO predictions(asset, mse, r2, ts) VALUES (?, ?, ?, ?)",
-                  (asset, vals["mse"], vals["r2"], datetime.utcnow().isoformat()))
-        for a, p in zip(vals["actual_last"], vals["pred_last"]):
-            c.execute("INSERT INTO prediction_rows(asset, actual, predicted, ts) VALUES (?, ?, ?, ?)",
-                      (asset, float(a), float(p), datetime.utcnow().isoformat()))
-    conn.commit()
-    conn.close()
+    try:
+        _ensure_prediction_schema(conn)
+        with timer("sqlite_write", table="predictions"), conn:
+            run_id = conn.execute("INSERT INTO prediction_runs(ts, n_assets) VALUES (?, ?)",
+                                  (ts, len(results))).lastrowid
+            conn.executemany("INSERT INTO predictions(run_id, asset, mse, r2, ts) VALUES (?, ?, ?, ?, ?)",
+                             [(run_id, asset, vals["mse"], vals["r2"], ts) for asset, vals in results.items()])
+            conn.executemany("INSERT INTO prediction_rows(run_id, asset, actual, predicted, ts) VALUES (?, ?, ?, ?, ?)",
+                             [(run_id, asset, float(a), float(p), ts)
+                              for asset, vals in results.items()
+                              for a, p in zip(vals["actual_last"], vals["pred_last"])])
+    finally:
+        conn.close()
+    count("sqlite_rows", len(results), table="predictions")
     print("Predictions stored in DB.")
+    return run_id
+
+
+def fetch_latest_predictions(asset=None, n=10, db_path="crypto.db"):
+    """Latest `n` prediction rows per asset (or for one asset), newest first."""
+    conn = sqlite3.connect(db_path)
+    try:
+        _ensure_prediction_schema(conn)
+        if asset is not None:
+            return pd.read_sql_query(
+                "SELECT run_id, asset, actual, predicted, ts FROM prediction_rows "
+                "WHERE asset = ? ORDER BY run_id DESC, id DESC LIMIT ?", conn, params=(asset, n))
+        return pd.read_sql_query(
+            "SELECT run_id, asset, actual, predicted, ts FROM ("
+            "  SELECT *, ROW_NUMBER() OVER (PARTITION BY asset ORDER BY run_id DESC, id DESC) AS rn"
+            "  FROM prediction_rows) WHERE rn <= ? ORDER BY asset, run_id DESC, id DESC", conn, params=(n,))
+    finally:
+        conn.close()
+
+
+def compact_predictions(keep_runs=30, max_age_days=None, db_path="crypto.db", vacuum=False):
+    """Delete all but the newest `keep_runs` runs (and runs older than `max_age_days`).
+
+    Rows stored before run ids existed count as older than any run.
+    Returns the number of prediction_rows deleted.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        _ensure_prediction_schema(conn)
+        with conn:
+            cutoff = conn.execute("SELECT run_id FROM prediction_runs ORDER BY run_id DESC LIMIT 1 OFFSET ?",
+                                  (max(keep_runs, 1) - 1,)).fetchone()
+            min_keep = cutoff[0] if cutoff else 0
+            if max_age_days is not None:
+                oldest = (datetime.utcnow() - pd.Timedelta(days=max_age_days)).isoformat()
+                # no run young enough -> everything goes
+                row = conn.execute("SELECT COALESCE(MIN(run_id), (SELECT COALESCE(MAX(run_id), 0) + 1 FROM prediction_runs)) "
+                                   "FROM prediction_runs WHERE ts >= ?", (oldest,)).fetchone()
+                min_keep = max(min_keep, row[0])
+            deleted = 0
+            for table in ("prediction_rows", "predictions"):
+                cur = conn.execute(f"DELETE FROM {table} WHERE run_id IS NULL OR run_id < ?", (min_keep,))
+                if table == "prediction_rows":
+                    deleted = cur.rowcount
+            conn.execute("DELETE FROM prediction_runs WHERE run_id < ?", (min_keep,))
+        if vacuum:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return deleted
 
 if __name__ == "__main__":
     print("Loading data...")
@@ -0,0 +1,435 @@
+# price_store.py
+# Local columnar price store.
+# A one-time ingest turns each CSV (Binance OHLCV, long-format metrics, wide
+# price tables) into per-asset contiguous binary columns that are memory-mapped
+# on open, so loaders skip CSV parsing, column sniffing and date parsing.
+#
+# Layout:
+#   <root>/manifest.json
+#   <root>/<table>/<symbol>/<column>.bin   (little-endian int64 / float64 / float32)
+# Dates are stored as int64 nanoseconds since the epoch under column "date".
+# CSV ingests also store each row's position in the source file ("_row"), and
+# record the source's column order, dtypes and date format when the file can
+# be reproduced exactly; read_csv_cached serves only such tables, so it returns
+# the same frame pd.read_csv would.
+
+import os, sys, json, re
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from instrumentation import count, timer
+
+STORE_DIR = os.path.join("results", "price_store")
+MANIFEST = "manifest.json"
+DTYPES = {"int64": "<i8", "float64": "<f8", "float32": "<f4"}
+
+SYMBOL_ALIASES = ("symbol", "asset", "ticker", "asset_name")
+DATE_ALIASES = ("date", "timestamp", "time", "datetime")
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M")
+ROW = "_row"
+
+
+def _find_col(columns, aliases):
+    lower_map = {c.lower(): c for c in columns}
+    for alt in aliases:
+        if alt in lower_map:
+            return lower_map[alt]
+    return None
+
+
+def _table_name(path):
+    return Path(path).stem
+
+
+def _symbol_from_filename(path):
+    # Binance_BTCUSDT_d.csv -> BTCUSDT
+    m = re.match(r"binance_([A-Za-z0-9]+)_", Path(path).name, re.IGNORECASE)
+    return m.group(1).upper() if m else Path(path).stem
+
+
+def _source_stat(path):
+    st = os.stat(path)
+    return {"source": os.path.abspath(path), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def _to_ns(values):
+    dates = pd.to_datetime(values, errors="coerce")
+    return np.asarray(dates.astype("datetime64[ns]")).view("int64")
+
+
+def _numeric_columns(df, skip):
+    out = {}
+    for c in df.columns:
+        if c in skip:
+            continue
+        s = df[c]
+        if pd.api.types.is_integer_dtype(s):
+            out[c] = "int64"
+        elif pd.api.types.is_numeric_dtype(s):
+            out[c] = "float64"
+    return out
+
+
+def _round_trip(source, date_col, sym_col, layout, columns, per_symbol, all_dates_parsed):
+    """What csv_frame needs to rebuild `source` exactly, or None when the
+    store cannot: unparsed dates, dropped non-numeric columns, duplicate
+    (symbol, date) rows, a date text format outside DATE_FORMATS."""
+    if not all_dates_parsed or not len(source):
+        return None
+    kept = {date_col} | ({sym_col} if sym_col else set()) | (set(per_symbol) if layout == "wide" else set(columns))
+    if set(source.columns) != kept:
+        return None
+    if sym_col and (not pd.api.types.is_string_dtype(source[sym_col]) or source[sym_col].isna().any()):
+        return None
+    if any(len(np.unique(ns)) != len(ns) for ns, _ in per_symbol.values()):
+        return None
+    raw = source[date_col]
+    if not pd.api.types.is_string_dtype(raw) or raw.isna().any():
+        return None
+    uniq = pd.unique(raw.to_numpy(dtype=object))
+    parsed = pd.to_datetime(pd.Index(uniq))
+    fmt = next((f for f in DATE_FORMATS if (parsed.strftime(f) == uniq).all()), None)
+    if fmt is None:
+        return None
+    return {"column_order": list(source.columns), "date_format": fmt, "date_dtype": str(parsed.dtype),
+            "dtypes": {c: str(t) for c, t in source.dtypes.items()}}
+
+
+class PriceStore:
+    """Read/write access to a columnar store rooted at `root`."""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.manifest = {"version": 1, "tables": {}}
+        mpath = os.path.join(root, MANIFEST)
+        if os.path.exists(mpath):
+            with open(mpath, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    # ---- metadata ----
+    @property
+    def tables(self):
+        return self.manifest["tables"]
+
+    def symbols(self, table):
+        return list(self.tables[table]["symbols"])
+
+    def is_fresh(self, table, path=None):
+        """True if `table` exists and its source CSV has not changed since ingest."""
+        meta = self.tables.get(table)
+        if meta is None:
+            return False
+        src = meta.get("source")
+        if src is None or (path is not None and os.path.abspath(path) != src):
+            return False
+        if not os.path.exists(src):
+            return True
+        st = os.stat(src)
+        return st.st_mtime_ns == meta["mtime_ns"] and st.st_size == meta["size"]
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, os.path.join(self.root, MANIFEST))
+
+    # ---- column access ----
+    def _col_path(self, table, symbol, col):
+        return os.path.join(self.root, table, symbol, f"{col}.bin")
+
+    def column(self, table, symbol, col):
+        """Memory-mapped, read-only view of one column for one symbol."""
+        meta = self.tables[table]
+        rows = meta["symbols"][symbol]["rows"]
+        dtype = "int64" if col in ("date", ROW) else meta["columns"][col]
+        if rows == 0:
+            return np.empty(0, dtype=DTYPES[dtype])
+        return np.memmap(self._col_path(table, symbol, col), dtype=DTYPES[dtype], mode="r", shape=(rows,))
+
+    def dates(self, table, symbol):
+        return self.column(table, symbol, "date").view("datetime64[ns]")
+
+    # ---- frame reconstruction ----
+    def frame(self, table):
+        """The table as a DataFrame grouped by symbol, dates parsed and the
+        symbol column categorical (see csv_frame for the source CSV's exact frame)."""
+        meta = self.tables[table]
+        layout = meta["layout"]
+        if layout == "wide":
+            wide = self.wide(table, "value")
+            wide.columns.name = None
+            wide.index.name = meta["date_column"]
+            return wide.reset_index()
+        parts = []
+        for sym in meta["symbols"]:
+            data = {meta["date_column"]: self.dates(table, sym)}
+            for col in meta["columns"]:
+                data[col] = self.column(table, sym, col)
+            part = pd.DataFrame(data)
+            if layout == "long":
+                part.insert(1, meta["symbol_column"], sym)
+            parts.append(part)
+        if not parts:
+            return pd.DataFrame(columns=[meta["date_column"]] + list(meta["columns"]))
+        df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        if layout == "long":
+            df[meta["symbol_column"]] = df[meta["symbol_column"]].astype("category")
+        return df
+
+    def wide(self, table, column="close", symbols=None):
+        """Date-indexed DataFrame with one column per symbol."""
+        meta = self.tables[table]
+        if meta["layout"] == "wide" and column == "close":
+            column = "value"
+        series = {}
+        for sym in (symbols or meta["symbols"]):
+            series[sym] = pd.Series(self.column(table, sym, column), index=self.dates(table, sym))
+        df = pd.DataFrame(series).sort_index()
+        df.index.name = "date"
+        return df
+
+    def csv_frame(self, table, parse_dates=False):
+        """The frame pd.read_csv(source) returns (parse_dates=True: with
+        parse_dates=[date column]): source row order, column order and dtypes.
+
+        Only for tables whose source round-trips exactly (meta "round_trip").
+        """
+        meta = self.tables[table]
+        rt = meta.get("round_trip")
+        if not rt:
+            raise ValueError(f"{table}: table does not reproduce its source CSV")
+        syms = list(meta["symbols"])
+        date_col = meta["date_column"]
+        if meta["layout"] == "wide":
+            dates, rows = self.column(table, syms[0], "date"), self.column(table, syms[0], ROW)
+            data = {sym: self.column(table, sym, "value") for sym in syms}
+        else:
+            dates = np.concatenate([self.column(table, s, "date") for s in syms])
+            rows = np.concatenate([self.column(table, s, ROW) for s in syms])
+            data = {c: np.concatenate([self.column(table, s, c) for s in syms]) for c in meta["columns"]}
+            if meta["layout"] == "long":
+                data[meta["symbol_column"]] = np.repeat(np.array(syms, dtype=object),
+                                                        [meta["symbols"][s]["rows"] for s in syms])
+        order = np.argsort(rows, kind="stable")
+        dates = dates[order]
+        if parse_dates:
+            data[date_col] = dates.view("datetime64[ns]").astype(rt["date_dtype"])
+        else:
+            uniq, inv = np.unique(dates, return_inverse=True)
+            text = pd.DatetimeIndex(uniq.view("datetime64[ns]")).strftime(rt["date_format"]).to_numpy(dtype=object)
+            data[date_col] = pd.array(text[inv], dtype=rt["dtypes"][date_col])
+        out = {}
+        for col in rt["column_order"]:
+            values = data[col] if col == date_col else data[col][order]
+            out[col] = values if col == date_col else pd.array(values, dtype=rt["dtypes"][col])
+        return pd.DataFrame(out)
+
+    # ---- ingest ----
+    def _write_symbol(self, table, symbol, date_ns, columns, arrays, rows=0):
+        """Write (rows == 0) or append after the first `rows` rows of each column file.
+
+        The manifest is saved only after the files, so a crash in between can
+        leave bytes past the recorded row count; appends cut every file back
+        to `rows` first instead of writing after (or misaligned with) them.
+        """
+        sdir = os.path.join(self.root, table, symbol)
+        os.makedirs(sdir, exist_ok=True)
+        for col, dtype, values in [("date", "int64", date_ns)] + [(c, t, arrays[c]) for c, t in columns.items()]:
+            path = os.path.join(sdir, f"{col}.bin")
+            values = np.ascontiguousarray(values, dtype=DTYPES[dtype])
+            if rows:
+                os.truncate(path, rows * values.itemsize)
+            with open(path, "ab" if rows else "wb") as f:
+                values.tofile(f)
+
+    def _append_symbol(self, table, symbol, date_ns, arrays):
+        """Append only bars newer than the symbol's high-water mark.
+        Duplicate timestamps inside the batch keep the last row. Returns rows written."""
+        meta = self.tables[table]
+        sym_meta = meta["symbols"].setdefault(symbol, {"rows": 0, "hwm": None})
+        if sym_meta["hwm"] is not None:
+            new = date_ns > sym_meta["hwm"]
+            date_ns, arrays = date_ns[new], {c: v[new] for c, v in arrays.items()}
+        if len(date_ns) == 0:
+            return 0
+        # last occurrence of each timestamp, in time order
+        rev_unique, rev_idx = np.unique(date_ns[::-1], return_index=True)
+        idx = len(date_ns) - 1 - rev_idx
+        date_ns, arrays = rev_unique, {c: v[idx] for c, v in arrays.items()}
+        columns = dict(meta["columns"], **{ROW: "int64"}) if ROW in arrays else meta["columns"]
+        self._write_symbol(table, symbol, date_ns, columns, arrays, rows=sym_meta["rows"])
+        sym_meta["rows"] += int(len(date_ns))
+        sym_meta["hwm"] = int(date_ns[-1])
+        return int(len(date_ns))
+
+    def append(self, table, symbol, frame, date_column="date"):
+        """Append new bars for one symbol from a DataFrame holding the table's columns."""
+        date_ns = _to_ns(frame[date_column])
+        arrays = {c: frame[c].to_numpy() for c in self.tables[table]["columns"]}
+        # rows without a source position: the table no longer mirrors a CSV file
+        self.tables[table].update(row_order=False, round_trip=None)
+        written = self._append_symbol(table, symbol, date_ns, arrays)
+        self._save_manifest()
+        return written
+
+    def high_water_mark(self, table, symbol):
+        hwm = self.tables.get(table, {}).get("symbols", {}).get(symbol, {}).get("hwm")
+        return None if hwm is None else pd.Timestamp(hwm)
+
+    def _history_matches(self, table, per_symbol):
+        """True if the stored rows of every symbol equal the source rows up to its high-water mark.
+
+        `per_symbol` maps symbol -> (date ns sorted, {column: values}) as built
+        by ingest_csv; duplicate timestamps keep the last row, like _append_symbol.
+        """
+        meta = self.tables[table]
+        if not meta.get("row_order") or set(meta["symbols"]) - set(per_symbol):
+            return False
+        for sym, sym_meta in meta["symbols"].items():
+            if sym_meta["hwm"] is None:
+                continue
+            date_ns, arrays = per_symbol[sym]
+            old = date_ns <= sym_meta["hwm"]
+            rev_unique, rev_idx = np.unique(date_ns[old][::-1], return_index=True)
+            idx = int(old.sum()) - 1 - rev_idx
+            if len(rev_unique) != sym_meta["rows"] or not np.array_equal(rev_unique, self.column(table, sym, "date")):
+                return False
+            for col, dtype in dict(meta["columns"], **{ROW: "int64"}).items():
+                src = np.asarray(arrays[col][old][idx], dtype=DTYPES[dtype])
+                if not np.array_equal(src, self.column(table, sym, col), equal_nan=dtype != "int64"):
+                    return False
+        return True
+
+    def ingest_csv(self, path, layout=None, table=None, incremental=False):
+        """Ingest one CSV. `layout` is 'ohlcv', 'long' or 'wide' (sniffed if None).
+
+        With incremental=True an existing table only receives rows past each
+        symbol's high-water mark; files are appended to, never rewritten. If a
+        row at or before a high-water mark was revised in the CSV (or a symbol
+        disappeared), the table is rewritten in full instead.
+        """
+        df = pd.read_csv(path)
+        date_col = _find_col(df.columns, DATE_ALIASES)
+        if date_col is None:
+            raise ValueError(f"{path}: no date column found")
+        sym_col = _find_col(df.columns, SYMBOL_ALIASES)
+        if layout is None:
+            if sym_col is not None:
+                layout = "long"
+            elif "close" in [c.lower() for c in df.columns]:
+                layout = "ohlcv"
+            else:
+                layout = "wide"
+        table = table or _table_name(path)
+        source = df
+        date_ns = _to_ns(df[date_col])
+        rows = np.arange(len(df), dtype=np.int64)
+        keep = date_ns != np.iinfo(np.int64).min
+        df, date_ns, rows = df[keep], date_ns[keep], rows[keep]
+
+        # split into per-symbol (dates, {column: values}) sorted by date
+        per_symbol = {}
+        if layout == "long":
+            columns = _numeric_columns(df, {date_col, sym_col})
+            codes, uniques = pd.factorize(df[sym_col].astype(str))
+            order = np.lexsort((date_ns, codes))
+            codes, sorted_ns = codes[order], date_ns[order]
+            values = {c: df[c].to_numpy()[order] for c in columns}
+            values[ROW] = rows[order]
+            bounds = np.searchsorted(codes, np.arange(len(uniques) + 1))
+            for i, sym in enumerate(uniques):
+                lo, hi = bounds[i], bounds[i + 1]
+                per_symbol[sym] = (sorted_ns[lo:hi], {c: v[lo:hi] for c, v in values.items()})
+        elif layout == "ohlcv":
+            columns = _numeric_columns(df, {date_col})
+            order = np.argsort(date_ns, kind="stable")
+            per_symbol[_symbol_from_filename(path)] = (
+                date_ns[order], dict({c: df[c].to_numpy()[order] for c in columns}, **{ROW: rows[order]}))
+        else:
+            order = np.argsort(date_ns, kind="stable")
+            columns = {"value": "float64"}
+            for sym in _numeric_columns(df, {date_col}):
+                per_symbol[sym] = (date_ns[order], {"value": df[sym].to_numpy()[order], ROW: rows[order]})
+
+        existing = self.tables.get(table)
+        if incremental and existing and existing["layout"] == layout and existing["columns"] == columns \
+                and not self._history_matches(table, per_symbol):
+            print(f"[INFO] {path}: rows up to the high-water mark changed; rewriting {table}")
+            incremental = False
+        if not (incremental and existing and existing["layout"] == layout and existing["columns"] == columns):
+            meta = {"layout": layout, "date_column": date_col, "columns": columns, "symbols": {}, "row_order": True}
+            if layout == "long":
+                meta["symbol_column"] = sym_col
+            self.tables[table] = meta
+        self.tables[table]["round_trip"] = _round_trip(source, date_col, sym_col if layout == "long" else None,
+                                                       layout, columns, per_symbol, bool(keep.all()))
+        written = 0
+        for sym, (sym_ns, arrays) in per_symbol.items():
+            written += self._append_symbol(table, sym, sym_ns, arrays)
+        self.tables[table].update(_source_stat(path))
+        self._save_manifest()
+        print(f"[INFO] Ingested {path} -> {self.root}/{table} "
+              f"({len(per_symbol)} symbols, {written} new rows, layout={layout})")
+        return table
+
+
+def default_sources():
+    """CSV files the project ships with or downloads into the working directory."""
+    found = []
+    for p in ["Crypto_metrics_daily.csv", "data/Crypto_metrics_daily.csv",
+              "sample_prices.csv", "data/sample_prices.csv"]:
+        if os.path.exists(p):
+            found.append(p)
+    found += sorted(str(p) for p in Path(".").glob("Binance_*_*.csv"))
+    return found
+
+
+def ingest_all(paths=None, root=STORE_DIR, incremental=True):
+    store = PriceStore(root)
+    for p in (paths or default_sources()):
+        store.ingest_csv(p, incremental=incremental)
+    return store
+
+
+def open_store(root=STORE_DIR):
+    """Return the store at `root`, or None if nothing was ingested there."""
+    if not os.path.exists(os.path.join(root, MANIFEST)):
+        return None
+    return PriceStore(root)
+
+
+def _store_parse_dates(kwargs, date_col):
+    """True / False when the store can answer read_csv(**kwargs); None otherwise.
+    Only parse_dates=[date column] is supported; any other option reads the CSV."""
+    if not kwargs:
+        return False
+    if set(kwargs) == {"parse_dates"} and isinstance(kwargs["parse_dates"], (list, tuple)) \
+            and list(kwargs["parse_dates"]) == [date_col]:
+        return True
+    return None
+
+
+def read_csv_cached(path, store=None, **read_csv_kwargs):
+    """Load `path` from the store when it holds a fresh, exact copy, otherwise parse the CSV.
+
+    Either way the result equals pd.read_csv(path, **read_csv_kwargs); the
+    store only answers plain reads and parse_dates=[date column].
+    `store` may be a PriceStore, a store directory, or None for the default location.
+    """
+    if not isinstance(store, PriceStore):
+        store = open_store(store or STORE_DIR)
+    table = _table_name(path)
+    parse_dates = None
+    if store is not None and store.is_fresh(table, path) and store.tables[table].get("round_trip"):
+        parse_dates = _store_parse_dates(read_csv_kwargs, store.tables[table]["date_column"])
+    source = "csv" if parse_dates is None else "store"
+    with timer("csv_read", source=source, file=os.path.basename(str(path))):
+        df = store.csv_frame(table, parse_dates) if source == "store" else pd.read_csv(path, **read_csv_kwargs)
+    count("csv_rows", len(df), source=source)
+    return df
+
+
+if __name__ == "__main__":
+    ingest_all(sys.argv[1:] or None)
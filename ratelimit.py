@@ -0,0 +1,54 @@
+# ratelimit.py
+# Small shared helpers for outbound I/O: a thread-safe token bucket and a
+# retry-with-exponential-backoff wrapper.
+
+import random, threading, time
+
+
+class TokenBucket:
+    """Allow `rate` operations per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, n=1):
+        with self.lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return True
+            return False
+
+    def acquire(self, n=1):
+        """Block until `n` tokens are available."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate if self.rate > 0 else 1.0
+            time.sleep(wait)
+
+
+def retry_call(fn, attempts=3, base_delay=0.5, max_delay=30.0, exceptions=(Exception,), on_retry=None):
+    """Call fn() and retry on `exceptions` with jittered exponential backoff."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except exceptions as e:
+            if attempt == attempts:
+                raise
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1)) * (0.5 + random.random() / 2)
+            if on_retry:
+                on_retry(attempt, e, delay)
+            time.sleep(delay)
@@ -0,0 +1,215 @@
+# risk_engine.py
+# Declarative, batched risk rule engine.
+# Rules are plain config dicts; each metric a rule needs is computed once per
+# evaluation, vectorized across every portfolio (columns) or asset, and the
+# engine returns one deduplicated list of breaches that is dispatched in a
+# single batch (one DB write, one email digest, one AI log entry).
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from portfolio_math import _ratio_batch
+
+# Largest weight any single asset may hold; shared with Risk_checker and the optimizer's cap
+MAX_ASSET_WEIGHT = 0.4
+
+# comparator: a breach is raised when `metric <comparator> threshold`
+# scope: "portfolio" (one value per portfolio) or "asset" (one value per asset per portfolio)
+DEFAULT_RULES = [
+    {"name": "Volatility", "alert": "volatility", "metric": "volatility", "comparator": ">",
+     "threshold": 0.5, "scope": "portfolio", "message": "Volatility {value:.2f} above threshold {threshold}"},
+    {"name": "Sharpe", "alert": "sharpe", "metric": "sharpe", "comparator": "<",
+     "threshold": 0.5, "scope": "portfolio", "message": "Sharpe {value:.2f} below {threshold}"},
+    {"name": "Max Drawdown", "alert": "max_drawdown", "metric": "max_drawdown", "comparator": "<",
+     "threshold": -0.2, "scope": "portfolio", "message": "Max Drawdown {value:.2f} below {threshold}"},
+    {"name": "Sortino", "alert": "sortino", "metric": "sortino", "comparator": "<",
+     "threshold": 0.5, "scope": "portfolio", "message": "Sortino {value:.2f} below {threshold}"},
+    {"name": "Max Asset Weight", "alert": "max_asset_weight", "metric": "weight", "comparator": ">",
+     "threshold": MAX_ASSET_WEIGHT, "scope": "asset", "message": "Asset {asset} weight {value:.2f} above {threshold}"},
+]
+
+COMPARATORS = {
+    ">": np.greater, ">=": np.greater_equal,
+    "<": np.less, "<=": np.less_equal,
+}
+
+Breach = namedtuple("Breach", "rule alert portfolio asset value threshold message")
+
+
+# ---- vectorized metrics: R is (T x K), one column per portfolio or asset ----
+
+def _volatility(R):
+    return R.std(axis=0, ddof=1) if len(R) > 1 else np.zeros(R.shape[1])
+
+
+def _sharpe(R):
+    if len(R) < 2:
+        return np.zeros(R.shape[1])
+    return _ratio_batch(R.mean(axis=0), R.std(axis=0, ddof=1))
+
+
+def _sortino(R):
+    if len(R) == 0:
+        return np.zeros(R.shape[1])
+    dd = np.sqrt(np.mean(np.minimum(R, 0.0) ** 2, axis=0))
+    return _ratio_batch(R.mean(axis=0), dd)
+
+
+def _max_drawdown(R):
+    if len(R) == 0:
+        return np.zeros(R.shape[1])
+    wealth = np.cumprod(1.0 + R, axis=0)
+    peak = np.maximum.accumulate(np.maximum(wealth, 1.0), axis=0)
+    return (wealth / peak - 1.0).min(axis=0)
+
+
+METRICS = {
+    "volatility": _volatility,
+    "sharpe": _sharpe,
+    "sortino": _sortino,
+    "max_drawdown": _max_drawdown,
+}
+
+
+def _as_matrix(data, default_label):
+    """-> (2-D float array, column labels)."""
+    if isinstance(data, pd.DataFrame):
+        return data.to_numpy(dtype=float), list(data.columns)
+    if isinstance(data, pd.Series):
+        return data.to_numpy(dtype=float).reshape(-1, 1), [data.name or default_label]
+    arr = np.asarray(data, dtype=float)
+    if arr.ndim == 1:
+        return arr.reshape(-1, 1), [default_label]
+    return arr, list(range(arr.shape[1]))
+
+
+class RiskRuleEngine:
+    """Evaluate a list of rule configs against many portfolios at once.
+
+    returns: T x K portfolio returns (DataFrame columns = portfolio names), or
+             T x A asset returns together with `weights` (K x A, rows = portfolios)
+    weights: K x A DataFrame / dict (single portfolio) of asset weights
+    metrics: precomputed portfolio metrics, e.g. RiskAccumulator.snapshot()
+    """
+
+    def __init__(self, rules=None):
+        self.rules = [dict(r) for r in (rules or DEFAULT_RULES)]
+        for r in self.rules:
+            if r["comparator"] not in COMPARATORS:
+                raise ValueError(f"rule {r['name']}: unknown comparator {r['comparator']}")
+            if r["scope"] not in ("portfolio", "asset"):
+                raise ValueError(f"rule {r['name']}: scope must be 'portfolio' or 'asset'")
+
+    def evaluate(self, returns=None, weights=None, asset_returns=None, metrics=None):
+        """Returns (results, breaches).
+
+        results:  list of (rule name, portfolio, passed, values) with `values`
+                  the metric per portfolio (or per asset for asset-scope rules)
+        breaches: deduplicated list of Breach
+        """
+        W, assets, names, w_names = None, None, None, None
+        if weights is not None:
+            if isinstance(weights, dict):
+                weights = pd.DataFrame([weights], index=["portfolio"])
+            W = weights.to_numpy(dtype=float)
+            assets, w_names = list(weights.columns), list(weights.index)
+            names = w_names
+        A = None
+        if asset_returns is not None:
+            A, a_cols = _as_matrix(asset_returns, "asset")
+            if assets is not None and list(a_cols) != assets:
+                A = pd.DataFrame(A, columns=a_cols).reindex(columns=assets, fill_value=0.0).to_numpy()
+            else:
+                assets = assets or a_cols
+        if returns is not None:
+            P, names = _as_matrix(returns, "portfolio")
+        elif A is not None and W is not None:
+            P = A @ W.T          # all portfolios in one matmul
+        else:
+            P = None
+        if names is None:
+            names = ["portfolio"]
+
+        cache = {}
+
+        def metric(scope, name):
+            """-> (values, row labels); computed at most once per evaluation."""
+            key = (scope, name)
+            if key not in cache:
+                if name == "weight":
+                    cache[key] = (W, w_names)
+                elif scope == "portfolio" and metrics is not None and name in metrics:
+                    cache[key] = (np.broadcast_to(np.asarray(metrics[name], dtype=float), (len(names),)), names)
+                elif scope == "portfolio":
+                    cache[key] = (None if P is None else METRICS[name](P), names)
+                else:
+                    # per-asset metric over the asset return matrix: one row for the universe
+                    cache[key] = (None if A is None else METRICS[name](A)[None, :], ["universe"])
+            return cache[key]
+
+        results, breaches, seen = [], [], set()
+        for rule in self.rules:
+            values, labels = metric(rule["scope"], rule["metric"])
+            if values is None:
+                continue
+            breached = COMPARATORS[rule["comparator"]](values, rule["threshold"])
+            if rule["scope"] == "portfolio":
+                for k, name in enumerate(labels):
+                    results.append((rule["name"], name, not breached[k], float(values[k])))
+                hits = [(k, None) for k in np.flatnonzero(breached)]
+            else:
+                for k, name in enumerate(labels):
+                    results.append((rule["name"], name, not breached[k].any(), values[k]))
+                hits = list(zip(*np.nonzero(breached)))
+            for k, j in hits:
+                asset = None if j is None else assets[j]
+                portfolio = labels[k]
+                key = (rule["alert"], portfolio, asset)
+                if key in seen:
+                    continue
+                seen.add(key)
+                value = float(values[k] if j is None else values[k][j])
+                msg = rule["message"].format(value=value, threshold=rule["threshold"], asset=asset)
+                breaches.append(Breach(rule["name"], rule["alert"], portfolio, asset, value,
+                                       rule["threshold"], msg))
+        return results, breaches
+
+
+def _resolve(module_names, attr):
+    for name in module_names:
+        try:
+            fn = getattr(__import__(name), attr, None)
+        except Exception:
+            continue
+        if fn is not None:
+            return fn
+    return None
+
+
+def dispatch(breaches, add_alerts=None, send_alert=None, ai_alert=None):
+    """Send one batch of breach events: one DB write, one queued digest email, one AI log entry."""
+    if not breaches:
+        return 0
+    add_alerts = add_alerts or _resolve(["db_portfolio", "DB_portfolio"], "add_alerts")
+    # queued for the background dispatcher: evaluation never waits on SMTP
+    send_alert = send_alert or _resolve(["mailSending"], "send_alert_async")
+    ai_alert = ai_alert or _resolve(["mailSending"], "ai_alert")
+    lines = [f"[{b.portfolio}] {b.message}" for b in breaches]
+    body = "\n".join(lines)
+    if add_alerts:
+        try:
+            add_alerts([(b.alert, f"[{b.portfolio}] {b.message}") for b in breaches])
+        except Exception as e:
+            print("[WARN] Storing alerts failed:", e)
+    if send_alert:
+        try:
+            send_alert(f"Risk Alert: {len(breaches)} rule breach(es)", body)
+        except Exception as e:
+            print("[WARN] Sending alert email failed:", e)
+    if ai_alert:
+        try:
+            ai_alert("risk_digest", body, {"rules": sorted({b.alert for b in breaches}),
+                                           "portfolios": len({b.portfolio for b in breaches})})
+        except Exception as e:
+            print("[WARN] AI alert failed:", e)
+    return len(breaches)
@@ -0,0 +1,167 @@
+# risk_parity.py
+# Vectorized risk-parity weights over the pivoted (date x asset) return matrix.
+# Modes:
+#   "inverse_vol" - weight proportional to 1 / windowed volatility (rules.py behaviour)
+#   "erc"         - equal risk contribution using the full covariance matrix,
+#                   solved with Newton iterations (line search) and optional warm start
+
+import numpy as np
+import pandas as pd
+
+
+def pivot_returns(price_df):
+    """Long (date, asset, close) frame -> date x asset simple returns.
+
+    Each asset's return is taken against its own previous observation, so gaps
+    in one asset's history do not produce NaNs in the middle of its series.
+    """
+    df = price_df[["date", "asset", "close"]].copy()
+    df["date"] = pd.to_datetime(df["date"])
+    prices = df.pivot_table(index="date", columns="asset", values="close", aggfunc="last", observed=True).sort_index()
+    values = prices.to_numpy(dtype=float)
+    prev = prices.ffill().shift(1).to_numpy(dtype=float)
+    rets = values / prev - 1.0
+    rets[np.isnan(values)] = np.nan
+    return pd.DataFrame(rets, index=prices.index, columns=prices.columns)
+
+
+def windowed_volatility(returns, window=90):
+    """Std of each column's last `window` non-NaN returns, in one NumPy pass.
+
+    Columns with fewer than `window` observations use all of them, matching
+    the per-asset behaviour of rules.get_weights_risk_parity.
+    """
+    r = returns.to_numpy(dtype=float) if isinstance(returns, pd.DataFrame) else np.asarray(returns, dtype=float)
+    valid = ~np.isnan(r)
+    from_end = np.cumsum(valid[::-1], axis=0)[::-1]
+    mask = valid & (from_end <= window)
+    n = mask.sum(axis=0)
+    x = np.where(mask, r, 0.0)
+    mean = x.sum(axis=0) / np.maximum(n, 1)
+    ss = (np.where(mask, r - mean, 0.0) ** 2).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vol = np.sqrt(ss / (n - 1))
+    vol[n < 2] = np.nan
+    if isinstance(returns, pd.DataFrame):
+        return pd.Series(vol, index=returns.columns)
+    return vol
+
+
+def inverse_vol_weights(vol):
+    vol = np.asarray(vol, dtype=float)
+    inv = np.zeros_like(vol)
+    ok = np.isfinite(vol) & (vol > 0)
+    inv[ok] = 1.0 / vol[ok]
+    total = inv.sum()
+    if total == 0:
+        return np.full(len(vol), 1.0 / len(vol))
+    return inv / total
+
+
+def erc_weights(cov, budget=None, x0=None, tol=1e-10, max_iter=100):
+    """Equal-risk-contribution weights for covariance `cov`.
+
+    Minimises 0.5 x'Cx - b'log(x) (Spinu 2013) with Newton steps and a
+    backtracking line search; the normalised minimiser gives risk
+    contributions proportional to `budget`. `x0` (e.g. the previous
+    rebalance's weights) warm-starts the solver. `cov` must be positive
+    definite - see shrink_to_diagonal for short windows. Returns (weights, iterations).
+    """
+    C = np.asarray(cov, dtype=float)
+    n = C.shape[0]
+    b = np.full(n, 1.0 / n) if budget is None else np.asarray(budget, dtype=float) / np.sum(budget)
+    if x0 is None:
+        x = 1.0 / np.sqrt(np.clip(np.diag(C), 1e-18, None))
+    else:
+        x = np.clip(np.asarray(x0, dtype=float), 1e-12, None)
+    # rescale so x'Cx = sum(b), which holds at the optimum
+    x = x * np.sqrt(b.sum() / max(x @ C @ x, 1e-300))
+
+    def objective(v):
+        return 0.5 * v @ C @ v - b @ np.log(v)
+
+    fx = objective(x)
+    it = 0
+    for it in range(1, max_iter + 1):
+        grad = C @ x - b / x
+        hess = C + np.diag(b / (x * x))
+        step = np.linalg.solve(hess, grad)
+        decrement = grad @ step
+        if decrement / 2 < tol:
+            break
+        # largest step keeping x > 0, then backtrack until sufficient decrease
+        t = 1.0
+        pos = step > 0
+        if np.any(pos):
+            t = min(t, 0.99 * np.min(x[pos] / step[pos]))
+        while True:
+            x_new = x - t * step
+            f_new = objective(x_new)
+            if f_new <= fx - 0.25 * t * decrement or t < 1e-12:
+                break
+            t *= 0.5
+        x, fx = x_new, f_new
+    return x / x.sum(), it
+
+
+def shrink_to_diagonal(cov, delta):
+    """(1 - delta) * cov + delta * diag(cov); makes short-window covariances
+    positive definite so ERC has a solution."""
+    C = np.asarray(cov, dtype=float)
+    return (1.0 - delta) * C + delta * np.diag(np.diag(C))
+
+
+def risk_contributions(weights, cov):
+    w = np.asarray(weights, dtype=float)
+    mrc = np.asarray(cov, dtype=float) @ w
+    total = w @ mrc
+    return w * mrc / total if total > 0 else np.zeros_like(w)
+
+
+class RiskParityEngine:
+    """Computes risk-parity weights from a return matrix pivoted once.
+
+    engine = RiskParityEngine(price_df)          # long frame, or
+    engine = RiskParityEngine(returns=p.returns) # Portfolio.returns
+    engine.weights(window=90, mode="erc")
+    Successive "erc" calls warm-start from the previous solution.
+    """
+
+    def __init__(self, price_df=None, returns=None):
+        if returns is None:
+            returns = pivot_returns(price_df)
+        self.returns = returns
+        self.assets = list(returns.columns)
+        self._last_erc = None
+        self.last_iterations = 0
+
+    def volatility(self, window=90, end=None):
+        r = self.returns if end is None else self.returns.loc[:end]
+        return windowed_volatility(r, window)
+
+    def covariance(self, window=90, end=None):
+        r = self.returns if end is None else self.returns.loc[:end]
+        return r.iloc[-window:].cov(min_periods=2).fillna(0.0)
+
+    def weights(self, window=90, mode="inverse_vol", end=None, warm_start=True, shrinkage=None):
+        if mode == "inverse_vol":
+            w = inverse_vol_weights(self.volatility(window, end).to_numpy())
+        elif mode == "erc":
+            cov = self.covariance(window, end).to_numpy()
+            if shrinkage is None:
+                # fewer observations than assets -> singular sample covariance
+                shrinkage = 0.1 if min(window, len(self.returns)) <= len(self.assets) else 0.0
+            if shrinkage:
+                cov = shrink_to_diagonal(cov, shrinkage)
+            # assets with no variance in the window cannot carry risk; leave them out
+            live = np.diag(cov) > 0
+            w = np.zeros(len(self.assets))
+            x0 = self._last_erc[live] if warm_start and self._last_erc is not None else None
+            if x0 is not None and x0.sum() <= 0:
+                x0 = None
+            if live.any():
+                w[live], self.last_iterations = erc_weights(cov[np.ix_(live, live)], x0=x0)
+            self._last_erc = w
+        else:
+            raise ValueError(f"unknown risk-parity mode: {mode}")
+        return pd.Series(w, index=self.assets)
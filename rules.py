@@ -1,11 +1,19 @@
 import pandas as pd
+from risk_parity import RiskParityEngine, inverse_vol_weights
+from stats_cache import get_cache, fingerprint
 
-def get_weights_risk_parity(assets, price_df, window=90):
-    vol = {}
-    for a in assets:
-        s = price_df[price_df["asset"]==a].sort_values("date")["close"].pct_change().dropna()
-        vol[a] = s[-window:].std() if len(s) >= window else (s.std() if len(s)>0 else 0)
-    inv_vol = {a:(1/vol[a] if vol[a]>0 else 0) for a in assets}
-    total = sum(inv_vol.values())
-    if total==0: return {a:1/len(assets) for a in assets}
-    return {a: inv_vol[a]/total for a in assets}
+def get_weights_risk_parity(assets, price_df, window=90, mode="inverse_vol"):
+    # same prices, assets, window and mode -> served from the stats cache
+    subset = price_df[price_df["asset"].isin(assets)]
+    key = ("risk_parity", fingerprint(subset), tuple(assets), window, mode)
+    return dict(get_cache().get_or_compute(key, lambda: _risk_parity_weights(assets, subset, window, mode)))
+
+def _risk_parity_weights(assets, price_df, window, mode):
+    # pivot once and compute every asset's windowed vol in one vectorized pass
+    engine = RiskParityEngine(price_df)
+    if mode == "inverse_vol":
+        vol = engine.volatility(window).reindex(assets)
+        w = inverse_vol_weights(vol.to_numpy())
+        return {a: float(w[i]) for i, a in enumerate(assets)}
+    w = engine.weights(window, mode=mode).reindex(assets, fill_value=0.0)
+    return {a: float(w[a]) for a in assets}
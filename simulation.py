@@ -0,0 +1,224 @@
+# simulation.py
+# Monte Carlo / historical-bootstrap risk simulation for fixed-weight portfolios.
+#
+# Paths are generated from the asset return matrix (Portfolio.returns) with
+#   "bootstrap"  moving-block bootstrap of historical days
+#   "gaussian"   correlated normal returns (Cholesky)
+#   "student_t"  correlated multivariate Student-t returns (Cholesky)
+#   "fhs"        filtered historical simulation: EWMA-standardised residuals
+#                bootstrapped and rescaled by a simulated EWMA volatility
+# and summarised as VaR / CVaR of the horizon return, the max-drawdown
+# distribution and the probability of breaching each risk_engine rule.
+#
+# With fixed (daily-rebalanced) weights a portfolio return is w . r, so every
+# method is applied to the K portfolio series directly: bootstrap draws the
+# same days for every portfolio, and the parametric methods use the Cholesky
+# factor of W cov W' (the asset covariance projected onto the portfolios),
+# which gives the same distribution as simulating all assets and weighting
+# them. Paths are generated in chunks of bounded size; each chunk gets its own
+# child SeedSequence so results depend only on the seed, not on the number of
+# worker processes.
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+import pandas as pd
+
+from risk_engine import DEFAULT_RULES, COMPARATORS, METRICS, RiskRuleEngine
+
+METHODS = ("bootstrap", "gaussian", "student_t", "fhs")
+
+# per-chunk path buffer target (chunk x horizon x portfolios float64)
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def _cholesky(cov):
+    """Cholesky factor, falling back to a PSD square root for singular covariances."""
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        vals, vecs = np.linalg.eigh(cov)
+        return vecs * np.sqrt(np.clip(vals, 0.0, None))
+
+
+def _ewma_sigma(P, lam):
+    """EWMA volatility per day (T x K), seeded with the sample variance."""
+    var = np.empty_like(P)
+    v = P.var(axis=0) if len(P) > 1 else np.zeros(P.shape[1])
+    mu = P.mean(axis=0)
+    for t in range(len(P)):
+        var[t] = v
+        v = lam * v + (1.0 - lam) * (P[t] - mu) ** 2
+    return np.sqrt(var), np.sqrt(v)
+
+
+class MonteCarloSimulator:
+    """Simulate horizon paths for one or more fixed-weight portfolios.
+
+    returns: T x A asset returns (e.g. Portfolio.returns)
+    weights: dict for one portfolio, K x A DataFrame (rows = portfolios), or None for equal weight
+
+    sim = MonteCarloSimulator(p.returns, weights, method="student_t")
+    res = sim.run(n_paths=100000, horizon=365, seed=42)
+    res.summary()
+    """
+
+    def __init__(self, returns, weights=None, method="bootstrap", block_size=10, dof=5,
+                 ewma_lambda=0.94, rules=None):
+        if method not in METHODS:
+            raise ValueError(f"unknown method {method!r}; expected one of {METHODS}")
+        returns = returns.dropna(how="any")
+        assets = list(returns.columns)
+        if weights is None:
+            weights = {a: 1.0 / len(assets) for a in assets}
+        if isinstance(weights, dict):
+            weights = pd.DataFrame([weights], index=["portfolio"])
+        self.weights = weights.reindex(columns=assets, fill_value=0.0).fillna(0.0)
+        self.names = list(self.weights.index)
+        W = self.weights.to_numpy(dtype=float)
+        R = returns.to_numpy(dtype=float)
+        self.method = method
+        self.block_size = max(1, int(block_size))
+        self.dof = float(dof)
+        if method == "student_t" and self.dof <= 2:
+            raise ValueError("student_t needs dof > 2")
+        self.ewma_lambda = float(ewma_lambda)
+        self.P = R @ W.T                                   # T x K historical portfolio returns
+        self.mu = self.P.mean(axis=0)
+        cov = np.atleast_2d(np.cov(R, rowvar=False)) if len(R) > 1 else np.zeros((len(assets), len(assets)))
+        self.L = _cholesky(W @ cov @ W.T)                  # K x K
+        if method == "fhs":
+            sigma, self.sigma_last = _ewma_sigma(self.P, self.ewma_lambda)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self.Z = np.where(sigma > 0, (self.P - self.mu) / sigma, 0.0)
+        self.rules = [dict(r) for r in (rules or DEFAULT_RULES)]
+        # weight rules do not depend on the path: evaluate them once
+        self.static = {}
+        asset_rules = [r for r in self.rules if r["scope"] == "asset"]
+        if asset_rules:
+            results, _ = RiskRuleEngine(asset_rules).evaluate(weights=self.weights)
+            for name, portfolio, passed, _ in results:
+                self.static.setdefault(name, {})[portfolio] = 0.0 if passed else 1.0
+
+    # ---- path generation: rng -> (n x horizon x K) ----
+    def _paths(self, rng, n, horizon):
+        T, K = self.P.shape
+        if self.method == "bootstrap":
+            b = min(self.block_size, T)
+            blocks = -(-horizon // b)
+            starts = rng.integers(0, T - b + 1, size=(n, blocks))
+            idx = (starts[:, :, None] + np.arange(b)).reshape(n, blocks * b)[:, :horizon]
+            return self.P[idx]
+        if self.method in ("gaussian", "student_t"):
+            z = rng.standard_normal((n, horizon, K))
+            if self.method == "student_t":
+                # shared chi-square mixing per day, scaled so the covariance is unchanged
+                g = rng.chisquare(self.dof, size=(n, horizon, 1))
+                z *= np.sqrt((self.dof - 2.0) / g)
+            return self.mu + z @ self.L.T
+        # fhs
+        out = np.empty((n, horizon, K))
+        var = np.broadcast_to(self.sigma_last ** 2, (n, K)).copy()
+        lam = self.ewma_lambda
+        for t in range(horizon):
+            eps = np.sqrt(var) * self.Z[rng.integers(0, T, size=n)]
+            out[:, t] = self.mu + eps
+            var = lam * var + (1.0 - lam) * eps ** 2
+        return out
+
+    def _chunk(self, seed_seq, n, horizon):
+        """Simulate one chunk and reduce it to per-path statistics."""
+        rng = np.random.default_rng(seed_seq)
+        paths = self._paths(rng, n, horizon)
+        K = paths.shape[2]
+        terminal = np.empty((n, K))
+        drawdown = np.empty((n, K))
+        breaches = {r["name"]: np.zeros(K, dtype=np.int64) for r in self.rules if r["scope"] == "portfolio"}
+        for k in range(K):
+            Rk = paths[:, :, k].T                          # horizon x n, one column per path
+            terminal[:, k] = np.prod(1.0 + Rk, axis=0) - 1.0
+            cache = {"max_drawdown": METRICS["max_drawdown"](Rk)}
+            drawdown[:, k] = cache["max_drawdown"]
+            for r in self.rules:
+                if r["scope"] != "portfolio":
+                    continue
+                if r["metric"] not in cache:
+                    cache[r["metric"]] = METRICS[r["metric"]](Rk)
+                breaches[r["name"]][k] = COMPARATORS[r["comparator"]](cache[r["metric"]], r["threshold"]).sum()
+        return terminal, drawdown, breaches
+
+    def run(self, n_paths=10000, horizon=365, seed=None, chunk_size=None, max_workers=None):
+        K = self.P.shape[1]
+        if chunk_size is None:
+            chunk_size = max(1, min(n_paths, CHUNK_BYTES // (8 * horizon * K * 3)))
+        sizes = [min(chunk_size, n_paths - i) for i in range(0, n_paths, chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        max_workers = min(max_workers or os.cpu_count() or 1, len(sizes))
+        if max_workers <= 1:
+            parts = [self._chunk(s, n, horizon) for s, n in zip(seeds, sizes)]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(self,)) as ex:
+                parts = list(ex.map(_run_chunk, seeds, sizes, [horizon] * len(sizes)))
+        terminal = np.concatenate([p[0] for p in parts])
+        drawdown = np.concatenate([p[1] for p in parts])
+        prob = {}
+        for r in self.rules:
+            if r["scope"] == "portfolio":
+                prob[r["name"]] = sum(p[2][r["name"]] for p in parts) / n_paths
+            else:
+                prob[r["name"]] = np.array([self.static.get(r["name"], {}).get(nm, 0.0) for nm in self.names])
+        return SimulationResult(self.names, terminal, drawdown, prob, self.method, horizon)
+
+
+_worker = {}
+
+
+def _init_worker(sim):
+    _worker["sim"] = sim
+
+
+def _run_chunk(seed_seq, n, horizon):
+    return _worker["sim"]._chunk(seed_seq, n, horizon)
+
+
+class SimulationResult:
+    """Per-path horizon returns and max drawdowns (n_paths x K) plus rule breach probabilities."""
+
+    def __init__(self, names, terminal, drawdown, breach_probability, method, horizon):
+        self.names = names
+        self.terminal = terminal
+        self.drawdown = drawdown
+        self.breach_probability = breach_probability
+        self.method = method
+        self.horizon = horizon
+
+    def var(self, level=0.95):
+        """Value at Risk of the horizon return, as a positive loss."""
+        return -np.quantile(self.terminal, 1.0 - level, axis=0)
+
+    def cvar(self, level=0.95):
+        """Expected shortfall: mean loss in the worst (1 - level) tail."""
+        q = np.quantile(self.terminal, 1.0 - level, axis=0)
+        tail = np.where(self.terminal <= q, self.terminal, np.nan)
+        return -np.nanmean(tail, axis=0)
+
+    def drawdown_quantiles(self, qs=(0.5, 0.05, 0.01)):
+        return pd.DataFrame(np.quantile(self.drawdown, qs, axis=0).T, index=self.names,
+                            columns=[f"dd_q{q:g}" for q in qs])
+
+    def summary(self, levels=(0.95, 0.99)):
+        out = pd.DataFrame({"mean_return": self.terminal.mean(axis=0)}, index=self.names)
+        for lvl in levels:
+            out[f"VaR_{lvl:g}"] = self.var(lvl)
+            out[f"CVaR_{lvl:g}"] = self.cvar(lvl)
+        out = out.join(self.drawdown_quantiles())
+        for name, p in self.breach_probability.items():
+            out[f"P({name})"] = p
+        return out
+
+
+def simulate(returns, weights=None, n_paths=10000, horizon=365, method="bootstrap", seed=None,
+             chunk_size=None, max_workers=None, **kwargs):
+    """One-call helper: build a MonteCarloSimulator and run it."""
+    sim = MonteCarloSimulator(returns, weights, method=method, **kwargs)
+    return sim.run(n_paths, horizon, seed=seed, chunk_size=chunk_size, max_workers=max_workers)
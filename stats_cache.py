@@ -0,0 +1,208 @@
+# stats_cache.py
+# Cache of return statistics (mean / variance / covariance) and other derived
+# results, keyed by (dataset fingerprint, asset set, window, estimator).
+#
+# Entries live in an in-memory LRU and, optionally, as pickles under
+# `cache_dir` so repeated runs over unchanged data skip the O(T * N^2)
+# covariance. For the sample estimator with a finite window the cache also
+# keeps a RollingWindowStats per (assets, window): when new bars are appended
+# to data it has already seen, the window is advanced by adding the new rows
+# and subtracting the ones that fall out instead of recomputing. The rows the
+# window covers are hashed, so a revised row inside it forces a recompute.
+
+from collections import OrderedDict
+import hashlib, os, pickle, threading
+import numpy as np
+import pandas as pd
+
+from backtest import RollingWindowStats
+
+
+def fingerprint(obj):
+    """Content hash of a DataFrame / Series / array (values, index and labels)."""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(obj, pd.DataFrame) and all(pd.api.types.is_numeric_dtype(t) for t in obj.dtypes) \
+            and (pd.api.types.is_numeric_dtype(obj.index) or pd.api.types.is_datetime64_any_dtype(obj.index)):
+        # all-numeric frames (return matrices): hash the raw buffers, much faster than per-row hashing
+        h.update(np.ascontiguousarray(obj.to_numpy()).tobytes())
+        h.update(np.ascontiguousarray(obj.index.to_numpy()).tobytes())
+        h.update(repr((obj.shape, list(obj.columns))).encode())
+    elif isinstance(obj, (pd.DataFrame, pd.Series)):
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        if isinstance(obj, pd.DataFrame):
+            h.update(repr(list(obj.columns)).encode())
+    else:
+        arr = np.ascontiguousarray(obj)
+        h.update(repr((arr.shape, arr.dtype.str)).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def _key_name(key):
+    return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+
+def _estimate(R, estimator):
+    n, N = R.shape
+    mean = R.mean(axis=0) if n else np.zeros(N)
+    if estimator == "ledoit_wolf":
+        from optimizer import ledoit_wolf
+        cov = ledoit_wolf(R)[0] if n > 1 else np.zeros((N, N))
+    elif estimator == "sample":
+        cov = np.cov(R, rowvar=False).reshape(N, N) if n > 1 else np.zeros((N, N))
+    else:
+        raise ValueError(f"unknown estimator {estimator!r}")
+    return {"n": n, "mean": mean, "var": R.var(axis=0, ddof=1) if n > 1 else np.zeros(N), "cov": cov}
+
+
+class StatsCache:
+    """LRU of computed statistics with optional on-disk persistence.
+
+    cache = StatsCache(max_entries=128, cache_dir="results/stats_cache")
+    s = cache.stats(returns, window=90)          # {"n", "mean", "var", "cov", "assets"}
+    w = cache.get_or_compute(("risk_parity", fp, 90), lambda: expensive())
+    """
+
+    def __init__(self, max_entries=128, cache_dir=None, max_rolling=None):
+        self.max_entries = max_entries
+        # rolling states hold O(N^2) sums each, so they are bounded like the entries
+        self.max_rolling = max_entries if max_rolling is None else max_rolling
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.entries = OrderedDict()
+        self.rolling = OrderedDict()
+        self.lock = threading.RLock()
+        self.hits = self.misses = self.incremental = 0
+
+    # ---- generic LRU ----
+    def _lookup(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key]
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, _key_name(key) + ".pkl")
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        value = pickle.load(f)
+                except Exception:
+                    value = None
+                else:
+                    self._store(key, value, persist=False)
+                    self.hits += 1
+                    return True, value
+        self.misses += 1
+        return False, None
+
+    def _store(self, key, value, persist=True):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        if persist and self.cache_dir:
+            path = os.path.join(self.cache_dir, _key_name(key) + ".pkl")
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+
+    def get_or_compute(self, key, compute):
+        found, value = self._lookup(key)
+        if not found:
+            value = compute()
+            self._store(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.rolling.clear()
+
+    # ---- return statistics ----
+    def stats(self, returns, window=None, estimator="sample"):
+        """Mean, variance and covariance of the last `window` rows (all rows if None)."""
+        if returns.isna().to_numpy().any():
+            returns = returns.dropna(how="any")
+        assets = tuple(returns.columns)
+        tail = returns if window is None else returns.iloc[-window:]
+        key = (fingerprint(tail), assets, window, estimator)
+        found, value = self._lookup(key)
+        if found:
+            return value
+        value = None
+        if estimator == "sample" and window is not None:
+            value = self._advance_rolling(returns, assets, window)
+        if value is None:
+            value = _estimate(tail.to_numpy(dtype=float), estimator)
+            if estimator == "sample" and window is not None:
+                self._start_rolling(returns, assets, window)
+        value["assets"] = list(assets)
+        self._store(key, value)
+        return value
+
+    def _start_rolling(self, returns, assets, window):
+        R = returns.to_numpy(dtype=float)
+        rs = RollingWindowStats(len(assets), window, track_cov=True)
+        rs.advance_to(R, len(R))
+        with self.lock:
+            self._set_rolling((assets, window), (rs, returns.index[-1] if len(R) else None,
+                                                 _rows_hash(returns.index, R, rs.start, rs.end)))
+
+    def _set_rolling(self, key, state):
+        self.rolling[key] = state
+        self.rolling.move_to_end(key)
+        while len(self.rolling) > self.max_rolling:
+            self.rolling.popitem(last=False)
+
+    def _advance_rolling(self, returns, assets, window):
+        """Extend a rolling window already built over a prefix of `returns`; None if there is none.
+
+        The rows the stored window covers must be unchanged in `returns`
+        (same labels and values, checked by hash); a revision anywhere inside
+        the window falls back to a full recompute.
+        """
+        with self.lock:
+            state = self.rolling.get((assets, window))
+            if state is None or state[1] is None:
+                return None
+            rs, last_label, window_hash = state
+            idx = returns.index
+            pos = idx.searchsorted(last_label) if idx.is_monotonic_increasing else -1
+            if pos < 0 or pos >= len(idx) or idx[pos] != last_label:
+                return None
+            R = returns.to_numpy(dtype=float)
+            # re-anchor the window onto this frame's row positions, then add / drop rows
+            shift = pos + 1 - rs.end
+            if rs.start + shift < 0 or _rows_hash(idx, R, rs.start + shift, pos + 1) != window_hash:
+                return None
+            rs.start += shift
+            rs.end += shift
+            rs.advance_to(R, len(R))
+            self._set_rolling((assets, window), (rs, idx[-1], _rows_hash(idx, R, rs.start, rs.end)))
+            self.incremental += 1
+            return {"n": rs.n, "mean": rs.mean.copy(), "var": rs.var.copy(), "cov": rs.cov}
+
+
+def _rows_hash(index, R, start, end):
+    """Hash of rows [start, end) of a return matrix and their index labels."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(R[start:end]).tobytes())
+    h.update(np.asarray(index[start:end]).tobytes() if index.dtype.kind in "iufM" else repr(list(index[start:end])).encode())
+    return h.hexdigest()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide StatsCache; set STATS_CACHE_DIR to persist entries between runs."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StatsCache(cache_dir=os.environ.get("STATS_CACHE_DIR") or None)
+        return _cache
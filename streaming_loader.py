@@ -0,0 +1,235 @@
+# streaming_loader.py
+# Chunked loader for long-format metrics CSVs (date, asset, close) that may be
+# larger than memory.
+#
+# The header is read once and mapped with the same column synonyms as
+# final_main.load_combined; chunks are then read with explicit dtypes
+# (category for the symbol column, float64 or float32 for values) and only the
+# three needed columns. Each chunk is folded straight into a dense
+# date x asset matrix (PivotBuilder) and/or appended to the columnar
+# price store, so the full long frame never exists in memory. The dense
+# matrix is the only thing that grows: dates x assets x 4 or 8 bytes.
+
+import os
+import numpy as np
+import pandas as pd
+
+from price_store import PriceStore, _source_stat, _table_name
+
+ASSET_SYNONYMS = ("symbol", "ticker", "asset_name")
+CLOSE_SYNONYMS = ("close_price", "price", "last_price")
+DATE_SYNONYMS = ("timestamp", "time", "datetime")
+
+CHUNK_ROWS = 500_000
+_NAT = np.iinfo(np.int64).min
+
+
+def column_map(columns, verbose=True):
+    """Rename map {original: canonical} onto the asset / close / date columns.
+
+    Existing canonical names are kept; otherwise the first synonym found is
+    used, and a 'daily_return' column stands in for 'close'.
+    """
+    col_map = {}
+    lower = [c.lower() for c in columns]
+    lower_map = {c.lower(): c for c in columns}
+    for canon, alts in (("asset", ASSET_SYNONYMS), ("close", CLOSE_SYNONYMS), ("date", DATE_SYNONYMS)):
+        if canon in lower:
+            continue
+        for alt in alts:
+            if alt in lower_map:
+                col_map[lower_map[alt]] = canon
+                break
+    if "daily_return" in lower_map and "close" not in lower and "close" not in col_map.values():
+        col_map[lower_map["daily_return"]] = "close"
+        if verbose:
+            print("[INFO] Detected 'daily_return' column — mapping it to 'close' automatically.")
+    return col_map
+
+
+def _source_columns(path, verbose=True):
+    """Original names of the date / asset / close columns of a CSV, from its header only."""
+    header = list(pd.read_csv(path, nrows=0).columns)
+    col_map = column_map(header, verbose)
+    if col_map and verbose:
+        print(f"[INFO] Renamed columns: {col_map}")
+    renamed = {col_map.get(c, c).lower(): c for c in header}
+    missing = [c for c in ("date", "asset", "close") if c not in renamed]
+    if missing:
+        print("[ERROR] CSV is missing required columns. Found columns:", header)
+        raise ValueError(f"streaming load needs date, asset and close columns (or synonyms); missing {missing}")
+    return renamed["date"], renamed["asset"], renamed["close"]
+
+
+def iter_chunks(path, chunksize=CHUNK_ROWS, float32=False, verbose=True):
+    """Yield (date_ns int64 array, asset Categorical, close array) per chunk.
+
+    Rows whose date does not parse are dropped.
+    """
+    date_col, asset_col, close_col = _source_columns(path, verbose)
+    dtype = {asset_col: "category", close_col: np.float32 if float32 else np.float64}
+    reader = pd.read_csv(path, usecols=[date_col, asset_col, close_col], dtype=dtype, chunksize=chunksize)
+    for chunk in reader:
+        date_ns = np.asarray(pd.to_datetime(chunk[date_col], errors="coerce")
+                             .astype("datetime64[ns]")).view("int64")
+        keep = date_ns != _NAT
+        assets = chunk[asset_col].array
+        values = chunk[close_col].to_numpy()
+        if not keep.all():
+            date_ns, assets, values = date_ns[keep], assets[keep], values[keep]
+        yield date_ns, assets, values
+
+
+class PivotBuilder:
+    """Incremental long -> wide pivot into a growable dense date x asset matrix.
+
+    pb = PivotBuilder()
+    for date_ns, assets, values in iter_chunks(path):
+        pb.add(date_ns, assets, values)
+    pb.to_frame()       # same as df.pivot(index="date", columns="asset", values="close").sort_index()
+    pb.returns()        # same as Portfolio(df).returns
+
+    A later row for the same (date, asset) replaces the earlier one.
+    """
+
+    def __init__(self, dtype=np.float64, rows=1024, cols=16):
+        self.dtype = np.dtype(dtype)
+        self.values = np.full((rows, cols), np.nan, dtype=self.dtype)
+        self.dates = np.empty(rows, dtype=np.int64)
+        self.row_of = {}        # date ns -> row
+        self.col_of = {}        # asset -> column
+        self.n_rows = 0
+
+    def _grow(self, rows, cols):
+        R, C = self.values.shape
+        if rows <= R and cols <= C:
+            return
+        # double whichever dimension overflows
+        R2 = R if rows <= R else max(rows, 2 * R)
+        C2 = C if cols <= C else max(cols, 2 * C)
+        grown = np.full((R2, C2), np.nan, dtype=self.dtype)
+        grown[:self.n_rows, :C] = self.values[:self.n_rows]
+        self.values = grown
+        if R2 > R:
+            dates = np.empty(R2, dtype=np.int64)
+            dates[:self.n_rows] = self.dates[:self.n_rows]
+            self.dates = dates
+
+    def add(self, date_ns, assets, values):
+        """Fold one chunk in: date_ns int64, assets (Categorical or labels), values."""
+        if len(date_ns) == 0:
+            return
+        if not isinstance(assets, pd.Categorical):
+            assets = pd.Categorical(assets)
+        codes = assets.codes
+        # chunk-local category codes -> global columns
+        cat_cols = np.array([self.col_of.setdefault(a, len(self.col_of)) for a in assets.categories] + [-1],
+                            dtype=np.int64)
+        cols = cat_cols[codes]
+        # chunk-local unique dates -> global rows
+        uniq, inv = np.unique(date_ns, return_inverse=True)
+        new = [d for d in uniq.tolist() if d not in self.row_of]
+        self._grow(self.n_rows + len(new), len(self.col_of))
+        for d in new:
+            self.row_of[d] = self.n_rows
+            self.dates[self.n_rows] = d
+            self.n_rows += 1
+        rows = np.fromiter((self.row_of[d] for d in uniq.tolist()), dtype=np.int64, count=len(uniq))[inv]
+        ok = cols >= 0
+        if not ok.all():
+            rows, cols, values = rows[ok], cols[ok], np.asarray(values)[ok]
+        # duplicate (row, col) pairs: keep the last one
+        flat = rows * self.values.shape[1] + cols
+        rev_unique, rev_idx = np.unique(flat[::-1], return_index=True)
+        last = len(flat) - 1 - rev_idx
+        self.values[rows[last], cols[last]] = np.asarray(values)[last]
+
+    @property
+    def assets(self):
+        return list(self.col_of)
+
+    def to_frame(self):
+        """Date-indexed close matrix, dates ascending and assets sorted by name."""
+        order = np.argsort(self.dates[:self.n_rows], kind="stable")
+        names = self.assets
+        col_order = sorted(range(len(names)), key=lambda i: names[i])
+        data = self.values[:self.n_rows][order][:, col_order]
+        index = pd.DatetimeIndex(self.dates[:self.n_rows][order].view("datetime64[ns]"), name="date")
+        columns = pd.Index([names[i] for i in col_order], name="asset")
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def returns(self, close=None):
+        close = self.to_frame() if close is None else close
+        return close.pct_change().dropna()
+
+
+def stream_pivot(path, chunksize=CHUNK_ROWS, float32=False, verbose=True):
+    """Stream a long-format CSV into a PivotBuilder."""
+    pb = PivotBuilder(np.float32 if float32 else np.float64)
+    n = 0
+    for date_ns, assets, values in iter_chunks(path, chunksize, float32, verbose):
+        pb.add(date_ns, assets, values)
+        n += len(date_ns)
+    if verbose:
+        print(f"[INFO] Streamed {n} rows from {path} -> {pb.n_rows} dates x {len(pb.col_of)} assets")
+    return pb
+
+
+def load_returns(path, chunksize=CHUNK_ROWS, float32=False, verbose=True):
+    """(close pivot, returns) of a long-format CSV without materialising the long frame."""
+    pb = stream_pivot(path, chunksize, float32, verbose)
+    close = pb.to_frame()
+    return close, pb.returns(close)
+
+
+def stream_to_store(path, store=None, table=None, chunksize=CHUNK_ROWS, float32=False, pivot=None,
+                    verbose=True):
+    """Append a long-format CSV chunk by chunk to the columnar price store.
+
+    The table keeps the CSV's own column names and is read back with
+    PriceStore.frame / wide (read_csv_cached keeps parsing the CSV, since
+    only whole-file ingests record what it needs to reproduce read_csv).
+    Symbols are appended past their high-water mark, so the file must be in
+    time order per symbol: a row older than its symbol's last written bar
+    raises ValueError, and the table is then left without a source stamp so
+    it is never treated as a fresh copy of the CSV. Pass a PivotBuilder as
+    `pivot` to fill it in the same pass. Returns the table name.
+    """
+    store = store or PriceStore()
+    table = table or _table_name(path)
+    date_col, asset_col, close_col = _source_columns(path, verbose)
+    store.tables[table] = {"layout": "long", "date_column": date_col, "symbol_column": asset_col,
+                           "columns": {close_col: "float32" if float32 else "float64"}, "symbols": {}}
+    n = written = skipped = 0
+    for date_ns, assets, values in iter_chunks(path, chunksize, float32, verbose=False):
+        if pivot is not None:
+            pivot.add(date_ns, assets, values)
+        codes = assets.codes
+        order = np.lexsort((date_ns, codes))
+        codes, date_ns, values = codes[order], date_ns[order], values[order]
+        bounds = np.searchsorted(codes, np.arange(-1, len(assets.categories) + 1))
+        for i, sym in enumerate(assets.categories):
+            lo, hi = bounds[i + 1], bounds[i + 2]
+            if hi > lo:
+                w = store._append_symbol(table, str(sym), date_ns[lo:hi], {close_col: values[lo:hi]})
+                written += w
+                skipped += hi - lo - w
+        n += len(date_ns)
+    if skipped:
+        store._save_manifest()
+        raise ValueError(f"{path}: {skipped} row(s) are older than their symbol's last written bar; "
+                         f"the streaming ingest needs the file in time order per symbol "
+                         f"(use PriceStore.ingest_csv for unsorted files)")
+    store.tables[table].update(_source_stat(path))
+    store._save_manifest()
+    if verbose:
+        print(f"[INFO] Streamed {n} rows from {path} -> {store.root}/{table} "
+              f"({len(store.tables[table]['symbols'])} symbols, {written} rows written, {skipped} skipped)")
+    return table
+
+
+if __name__ == "__main__":
+    import sys
+    src = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "Crypto_metrics_daily.csv")
+    close, returns = load_returns(src)
+    print(returns.tail())
@@ -0,0 +1,192 @@
+# streaming_metrics.py
+# Stateful risk-metric accumulators for live feeds.
+# Every update is O(1) per bar, state is a handful of floats, and the whole
+# accumulator can be checkpointed to / restored from a JSON file.
+# Values match the batch functions in portfolio_math (per-period, not annualised).
+
+import json, math, os
+from portfolio_math import _ratio
+
+
+class RunningMoments:
+    """Welford mean / variance."""
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def update(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class DownsideDeviation:
+    """sqrt(mean(min(r - target, 0)^2)) over all bars seen."""
+    __slots__ = ("n", "sum_sq", "target")
+
+    def __init__(self, n=0, sum_sq=0.0, target=0.0):
+        self.n, self.sum_sq, self.target = n, sum_sq, target
+
+    def update(self, r):
+        self.n += 1
+        d = min(r - self.target, 0.0)
+        self.sum_sq += d * d
+
+    @property
+    def value(self):
+        return math.sqrt(self.sum_sq / self.n) if self.n else 0.0
+
+
+class DrawdownTracker:
+    """Running wealth, peak and worst peak-to-trough drawdown (<= 0)."""
+    __slots__ = ("wealth", "peak", "max_drawdown", "trough")
+
+    def __init__(self, wealth=1.0, peak=1.0, max_drawdown=0.0, trough=1.0):
+        self.wealth, self.peak, self.max_drawdown, self.trough = wealth, peak, max_drawdown, trough
+
+    def update(self, r):
+        self.update_level(self.wealth * (1.0 + r))
+
+    def update_level(self, wealth):
+        self.wealth = wealth
+        if wealth > self.peak:
+            self.peak = wealth
+        dd = wealth / self.peak - 1.0 if self.peak > 0 else 0.0
+        if dd < self.max_drawdown:
+            self.max_drawdown = dd
+            self.trough = wealth
+
+    @property
+    def drawdown(self):
+        return self.wealth / self.peak - 1.0 if self.peak > 0 else 0.0
+
+
+class EWMAVolatility:
+    """RiskMetrics-style exponentially weighted volatility (decay `lam`)."""
+    __slots__ = ("lam", "var", "n")
+
+    def __init__(self, lam=0.94, var=0.0, n=0):
+        self.lam, self.var, self.n = lam, var, n
+
+    def update(self, r):
+        self.var = r * r if self.n == 0 else self.lam * self.var + (1.0 - self.lam) * r * r
+        self.n += 1
+
+    @property
+    def value(self):
+        return math.sqrt(self.var)
+
+
+class RiskAccumulator:
+    """Volatility, Sharpe, Sortino, drawdown and EWMA vol for one return stream.
+
+    acc = RiskAccumulator.load("results/live_risk.json")   # or RiskAccumulator()
+    acc.update(bar_return)
+    acc.sharpe, acc.max_drawdown ...
+    acc.save("results/live_risk.json")
+    """
+
+    def __init__(self, risk_free=0.0, target=0.0, ewma_lambda=0.94):
+        self.risk_free = risk_free
+        self.moments = RunningMoments()
+        self.excess = RunningMoments()
+        self.downside = DownsideDeviation(target=target)
+        self.drawdown = DrawdownTracker()
+        self.ewma = EWMAVolatility(lam=ewma_lambda)
+
+    def update(self, r):
+        r = float(r)
+        self.moments.update(r)
+        self.excess.update(r - self.risk_free)
+        self.downside.update(r)
+        self.drawdown.update(r)
+        self.ewma.update(r)
+
+    def update_many(self, returns):
+        for r in returns:
+            self.update(r)
+
+    @property
+    def n(self):
+        return self.moments.n
+
+    @property
+    def volatility(self):
+        return self.moments.std
+
+    @property
+    def sharpe(self):
+        return _ratio(self.excess.mean, self.excess.std) if self.n > 1 else 0.0
+
+    @property
+    def sortino(self):
+        return _ratio(self.moments.mean - self.downside.target, self.downside.value) if self.n else 0.0
+
+    @property
+    def max_drawdown(self):
+        return self.drawdown.max_drawdown
+
+    @property
+    def ewma_volatility(self):
+        return self.ewma.value
+
+    def snapshot(self):
+        return {
+            "n": self.n,
+            "volatility": self.volatility,
+            "sharpe": self.sharpe,
+            "sortino": self.sortino,
+            "max_drawdown": self.max_drawdown,
+            "drawdown": self.drawdown.drawdown,
+            "ewma_volatility": self.ewma_volatility,
+        }
+
+    # ---- checkpointing ----
+    def to_dict(self):
+        def slots(obj):
+            return {k: getattr(obj, k) for k in obj.__slots__}
+        return {
+            "risk_free": self.risk_free,
+            "moments": slots(self.moments),
+            "excess": slots(self.excess),
+            "downside": slots(self.downside),
+            "drawdown": slots(self.drawdown),
+            "ewma": slots(self.ewma),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        acc = cls(risk_free=state["risk_free"])
+        acc.moments = RunningMoments(**state["moments"])
+        acc.excess = RunningMoments(**state["excess"])
+        acc.downside = DownsideDeviation(**state["downside"])
+        acc.drawdown = DrawdownTracker(**state["drawdown"])
+        acc.ewma = EWMAVolatility(**state["ewma"])
+        return acc
+
+    def save(self, path):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Restore from `path`, or start fresh if no checkpoint exists yet."""
+        if not os.path.exists(path):
+            return cls(**kwargs)
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,168 @@
+# stress_engine.py
+# Vectorized multi-scenario stress testing on the pivoted return matrix.
+#
+# A scenario is a dict:
+#   name        label
+#   shock_date  date of a one-off price jump (prices from that date on are
+#               multiplied by 1 + shock, like stress_test.apply_shock)
+#   shocks      {asset: pct} or one pct for every asset
+#   vol_scale   scale deviations from each asset's mean return by this factor
+#   drift       extra daily return, scalar or {asset: x}
+#   start, end  date range for vol_scale / drift (default: whole history)
+#   days        limit that range to this many rows: the first `days` from
+#               start, or the last `days` before end / the end of the history
+#
+# With fixed weights the portfolio return is linear in asset returns, so each
+# scenario reduces to a transform of the base portfolio series plus a
+# correction on its shock date. Scenarios are evaluated as an S x T matrix in
+# chunks; shocked copies of the long frame (or an S x T x N tensor) are never built.
+
+import numpy as np
+import pandas as pd
+
+# Market regimes from stress_test_full.py, as daily drift / volatility scaling:
+# its bull and bear frames average +/-3.5% a day across BTC/ETH/ADA, and the
+# volatile frame swings about 3x a normal crypto day around a +1% mean. Those
+# frames are REGIME_DAYS long, so that is the default window; a 3.5% daily
+# drift compounded over years of history is not a stress scenario.
+REGIME_DAYS = 4
+REGIMES = {
+    "bull": {"drift": 0.035},
+    "bear": {"drift": -0.035},
+    "volatile": {"drift": 0.01, "vol_scale": 3.0},
+}
+
+
+def regime_scenarios(start=None, end=None, days=REGIME_DAYS):
+    """One scenario per regime over `days` rows (the last ones unless start is given).
+
+    days=None applies the regimes to the whole start..end range.
+    """
+    return [dict(params, name=f"{name} market", start=start, end=end, days=days)
+            for name, params in REGIMES.items()]
+
+
+def shock_grid(dates, sizes, assets=None):
+    """Every (date, size) pair as a scenario; `assets` limits the shock to those assets."""
+    out = []
+    for d in dates:
+        for s in sizes:
+            shocks = s if assets is None else {a: s for a in assets}
+            out.append({"name": f"shock {s:+.0%} @ {pd.Timestamp(d).date()}", "shock_date": d, "shocks": shocks})
+    return out
+
+
+class StressEngine:
+    """Evaluate many scenarios against one return matrix and weight vector.
+
+    engine = StressEngine.from_portfolio(Portfolio(df))
+    summary = engine.run(scenarios, weights)   # one row per scenario
+    """
+
+    def __init__(self, returns, first_price_date=None):
+        self.returns = returns
+        self.assets = list(returns.columns)
+        self.index = returns.index
+        self.R = returns.to_numpy(dtype=float)
+        self.mu = self.R.mean(axis=0) if len(self.R) else np.zeros(len(self.assets))
+        # prices before the first return: a shock on or before this date moves every price
+        self.first_price_date = first_price_date
+
+    @classmethod
+    def from_portfolio(cls, portfolio):
+        return cls(portfolio.returns, portfolio.close_pivot.index[0])
+
+    def _vector(self, value):
+        if value is None:
+            return np.zeros(len(self.assets))
+        if isinstance(value, dict):
+            return np.array([float(value.get(a, 0.0)) for a in self.assets])
+        return np.full(len(self.assets), float(value))
+
+    def _date_pos(self, date, default):
+        if date is None:
+            return default
+        return int(self.index.searchsorted(pd.Timestamp(date), side="left"))
+
+    def _compile(self, scenarios, w):
+        S, N, T = len(scenarios), len(self.assets), len(self.index)
+        k = np.ones(S)
+        drift = np.zeros((S, N))
+        lo = np.zeros(S, dtype=int)
+        hi = np.full(S, T)
+        shock = np.zeros((S, N))
+        shock_pos = np.full(S, -1)
+        for i, sc in enumerate(scenarios):
+            k[i] = sc.get("vol_scale", 1.0)
+            drift[i] = self._vector(sc.get("drift"))
+            lo[i] = self._date_pos(sc.get("start"), 0)
+            hi[i] = self._date_pos(sc.get("end"), T)
+            days = sc.get("days")
+            if days is not None:
+                if sc.get("start") is None:
+                    lo[i] = max(hi[i] - days, 0)
+                else:
+                    hi[i] = min(lo[i] + days, hi[i])
+            if sc.get("shock_date") is not None and sc.get("shocks") is not None:
+                d = pd.Timestamp(sc["shock_date"])
+                if self.first_price_date is None or d > pd.Timestamp(self.first_price_date):
+                    pos = self._date_pos(d, T)
+                    if pos < T:
+                        shock_pos[i] = pos
+                        shock[i] = self._vector(sc["shocks"])
+        return k, drift, lo, hi, shock, shock_pos
+
+    def portfolio_paths(self, scenarios, weights):
+        """S x T DataFrame of stressed daily portfolio returns (rows = scenarios)."""
+        w = self._weights(weights)
+        P = self._paths(scenarios, w, 0, len(scenarios))
+        return pd.DataFrame(P, index=[sc.get("name", i) for i, sc in enumerate(scenarios)], columns=self.index)
+
+    def _weights(self, weights):
+        if isinstance(weights, dict):
+            return np.array([float(weights.get(a, 0.0)) for a in self.assets])
+        if isinstance(weights, pd.Series):
+            return weights.reindex(self.assets).fillna(0.0).to_numpy(dtype=float)
+        return np.asarray(weights, dtype=float)
+
+    def _paths(self, scenarios, w, a, b):
+        k, drift, lo, hi, shock, shock_pos = self._compile(scenarios[a:b], w)
+        T = len(self.index)
+        base = self.R @ w                       # T
+        mu_p = self.mu @ w
+        t = np.arange(T)
+        inside = (t[None, :] >= lo[:, None]) & (t[None, :] < hi[:, None])        # S x T
+        stressed = mu_p + k[:, None] * (base[None, :] - mu_p) + (drift @ w)[:, None]
+        P = np.where(inside, stressed, base[None, :])
+        # price jump: (1 + r')(1 + s) - 1 = r' + s (1 + r') on the shock date
+        has = shock_pos >= 0
+        if has.any():
+            rows = np.flatnonzero(has)
+            pos = shock_pos[rows]
+            r_row = self.R[pos]                                               # s x N
+            in_win = inside[rows, pos]
+            r_mod = np.where(in_win[:, None],
+                             self.mu + k[rows, None] * (r_row - self.mu) + drift[rows], r_row)
+            sw = shock[rows] * w
+            P[rows, pos] += (sw * (1.0 + r_mod)).sum(axis=1)
+        return P
+
+    def run(self, scenarios, weights, chunk_size=2048):
+        """Per-scenario total P&L, max drawdown, worst day, mean and volatility."""
+        w = self._weights(weights)
+        out = []
+        for a in range(0, len(scenarios), chunk_size):
+            b = min(a + chunk_size, len(scenarios))
+            P = self._paths(scenarios, w, a, b)
+            wealth = np.cumprod(1.0 + P, axis=1)
+            peak = np.maximum.accumulate(np.maximum(wealth, 1.0), axis=1)
+            out.append(np.column_stack([
+                wealth[:, -1] - 1.0 if P.shape[1] else np.zeros(b - a),
+                (wealth / peak - 1.0).min(axis=1) if P.shape[1] else np.zeros(b - a),
+                P.min(axis=1) if P.shape[1] else np.zeros(b - a),
+                P.mean(axis=1) if P.shape[1] else np.zeros(b - a),
+                P.std(axis=1, ddof=1) if P.shape[1] > 1 else np.zeros(b - a),
+            ]))
+        data = np.vstack(out) if out else np.empty((0, 5))
+        return pd.DataFrame(data, index=[sc.get("name", i) for i, sc in enumerate(scenarios)],
+                            columns=["pnl", "max_drawdown", "worst_day", "mean_return", "volatility"])
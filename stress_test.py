@@ -1,10 +1,11 @@
+
 import pandas as pd
 
 def apply_shock(combined_df, shock_date, shock_map):
+    # one copy and one vectorized multiply instead of a full-frame mask per asset
     df = combined_df.copy()
     df["date"] = pd.to_datetime(df["date"])
-    shocked = df.copy()
-    for asset, shock in shock_map.items():
-        mask = (shocked["asset"]==asset) & (shocked["date"]>=pd.to_datetime(shock_date))
-        shocked.loc[mask,"close"] *= (1+shock)
-    return shocked
+    factor = df["asset"].map(shock_map).fillna(0.0) + 1.0
+    after = df["date"] >= pd.to_datetime(shock_date)
+    df["close"] = df["close"].where(~after, df["close"] * factor)
+    return df
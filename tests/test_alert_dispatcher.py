@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from alert_dispatcher import AlertDispatcher
+from ratelimit import TokenBucket
+from smtp_stub import StubSMTPServer
+
+
+@pytest.fixture
+def smtp():
+    with StubSMTPServer() as server:
+        yield server
+
+
+def _dispatcher(smtp, **kwargs):
+    config = {"smtp_host": "127.0.0.1", "smtp_port": smtp.port, "smtp_starttls": False,
+              "alert_to": "ops@example.com"}
+    kwargs.setdefault("coalesce_window", 0.2)
+    return AlertDispatcher(config, **kwargs)
+
+
+def test_one_digest_per_recipient(smtp):
+    d = _dispatcher(smtp)
+    for i in range(3):
+        d.submit(f"alert {i}", "body")
+    d.submit("desk alert", "body", to_addr="desk@example.com")
+    d.flush()
+    d.close()
+    by_rcpt = {tuple(r): m for r, m in smtp.messages}
+    assert len(smtp.messages) == 2
+    assert by_rcpt[("ops@example.com",)]["Subject"] == "Risk Alert digest: 3 alerts"
+    assert by_rcpt[("desk@example.com",)]["Subject"] == "desk alert"
+    assert d.sent == 2 and d.failed == 0
+
+
+def test_pooled_session_is_reused(smtp):
+    d = _dispatcher(smtp, coalesce_window=0.0)
+    for i in range(3):
+        d.submit(f"alert {i}", "body")
+        d.flush()
+    d.close()
+    assert len(smtp.messages) == 3
+    assert smtp.connections == 1
+
+
+def test_retry_after_dropped_connection(smtp):
+    smtp.drop_data = 1
+    d = _dispatcher(smtp)
+    d.submit("alert", "body")
+    d.flush()
+    d.close()
+    assert [m["Subject"] for _, m in smtp.messages] == ["alert"]
+    assert smtp.connections == 2
+    assert d.sent == 1 and d.failed == 0
+
+
+def test_token_bucket_limits_send_rate(smtp):
+    d = _dispatcher(smtp, coalesce_window=0.0)
+    d.limiter = TokenBucket(rate=10.0, burst=1)
+    start = time.monotonic()
+    for i in range(4):
+        d.submit(f"alert {i}", "body", to_addr=f"r{i}@example.com")
+    d.flush()
+    elapsed = time.monotonic() - start
+    d.close()
+    assert len(smtp.messages) == 4
+    # one token up front, then one every 0.1 s
+    assert elapsed >= 0.28
+
+
+def test_bad_batch_does_not_kill_worker(smtp):
+    d = _dispatcher(smtp, coalesce_window=0.0)
+    d.submit("bad", "body", to_addr="a@example.com\nBcc: b@example.com")   # header injection: rejected
+    d.flush()
+    assert d.worker.is_alive()
+    d.submit("good", "body")
+    d.flush()
+    d.close()
+    assert [m["Subject"] for _, m in smtp.messages] == ["good"]
+    assert d.failed == 1
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from backtest import RollingWindowStats, walk_forward
+from risk_parity import inverse_vol_weights
+
+
+def _returns(T=200, N=3, seed=8):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.normal(0.001, 0.02, (T, N)), index=pd.date_range("2021-01-01", periods=T),
+                        columns=[f"A{i}" for i in range(N)])
+
+
+def test_sliding_window_matches_direct_statistics():
+    R = _returns().to_numpy()
+    stats = RollingWindowStats(R.shape[1], window=30, refresh_every=7)
+    for end in list(range(5, 120, 3)) + [150, 151, 190]:
+        stats.advance_to(R, end)
+        rows = R[max(0, end - 30):end]
+        assert np.allclose(stats.mean, rows.mean(axis=0))
+        assert np.allclose(stats.cov, np.cov(rows, rowvar=False))
+        assert np.allclose(stats.vol, rows.std(axis=0, ddof=1))
+
+
+def test_buy_and_hold_matches_hand_computed_wealth():
+    R = _returns(60, 2)
+    res = walk_forward(R, "equal", schedule="never", window=10, cost_bps=10.0)
+    held = R.iloc[10:]
+    wealth = 0.5 * (1 + held).prod()
+    assert np.isclose(res["summary"]["gross_cum_return"], wealth.sum() - 1)
+    assert res["summary"]["rebalances"] == 1
+    assert np.isclose(res["summary"]["total_cost"], 1.0 * 10 / 1e4)
+
+
+def test_rebalance_weights_only_use_past_rows():
+    R = _returns()
+    res = walk_forward(R, "inverse_vol", schedule="monthly", window=40)
+    for date, w in res["weights"].iterrows():
+        t = R.index.get_loc(date)
+        past = R.iloc[t - 40:t].to_numpy()
+        assert np.allclose(w.to_numpy(), inverse_vol_weights(past.std(axis=0, ddof=1)))
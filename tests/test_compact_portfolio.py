@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compact_portfolio import CompactPortfolio, PortfolioBook, ReturnsMatrix
+from portfolio import Portfolio
+from stress_engine import StressEngine
+
+
+def _long(T=80, seed=4):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2023-01-01", periods=T)
+    frames = [pd.DataFrame({"date": dates, "asset": a,
+                            "close": 100 * np.exp(np.cumsum(rng.normal(0, 0.02, T)))})
+              for a in ("ADA", "BTC", "ETH", "SOL")]
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_compact_run_matches_portfolio_run():
+    p = Portfolio(_long())
+    w = {"BTC": 0.5, "ETH": 0.3, "ADA": 0.2, "DOGE": 0.1}      # unknown assets are ignored, as in run()
+    c = p.compact(w, name="mix")
+    pd.testing.assert_frame_equal(c.run(), p.run(w), check_freq=False, check_names=False)
+    assert c.weights_dict() == {"ADA": 0.2, "BTC": 0.5, "ETH": 0.3}
+    assert c.nbytes == 3 * 4 + 3 * 8
+    assert np.isclose(c.total_return(), np.prod(1 + p.run(w)["portfolio_return"]) - 1)
+
+
+def test_matrix_is_shared_and_read_only():
+    p = Portfolio(_long())
+    a, b = p.compact({"BTC": 1.0}), p.compact({"ETH": 1.0})
+    assert a.matrix is b.matrix is p.matrix
+    with pytest.raises(ValueError):
+        p.matrix.values[0, 0] = 1.0
+    frame = p.matrix.to_frame()
+    frame.iloc[0, 0] = 1.0                                      # a copy
+    assert p.matrix.values[0, 0] != 1.0
+
+
+def test_book_matches_run_many_and_stress_engine():
+    p = Portfolio(_long())
+    W = pd.DataFrame([[0.25, 0.25, 0.25, 0.25], [0.0, 0.6, 0.4, 0.0], [0.1, 0.0, 0.0, 0.9]],
+                     index=["eq", "majors", "alt"], columns=["ADA", "BTC", "ETH", "SOL"])
+    book = p.book(W)
+    got = book.run(chunk_size=2)
+    ref = p.run_many(W)
+    assert np.allclose(got.to_numpy(), ref.to_numpy()) and list(got.columns) == list(W.index)
+
+    scenarios = [{"name": "shock", "shock_date": p.returns.index[30], "shocks": -0.2}]
+    stressed = book.stress(scenarios)
+    engine = StressEngine.from_portfolio(p)
+    for name, row in W.iterrows():
+        pd.testing.assert_frame_equal(stressed[name], engine.run(scenarios, row.to_dict()))
+
+
+def test_book_rejects_portfolios_from_another_matrix():
+    m1 = ReturnsMatrix.from_portfolio(Portfolio(_long()))
+    m2 = ReturnsMatrix.from_portfolio(Portfolio(_long(seed=5)))
+    book = PortfolioBook(m1)
+    with pytest.raises(ValueError):
+        book.append(CompactPortfolio(m2, {"BTC": 1.0}))
+    with pytest.raises(ValueError):
+        m1.encode(np.ones(3))
@@ -0,0 +1,37 @@
+import sqlite3
+import threading
+import time
+
+import db_portfolio
+from db_portfolio import PortfolioStore
+
+
+def test_concurrent_submits_start_one_writer(tmp_path, monkeypatch):
+    started = []
+    real_thread = threading.Thread
+
+    class SlowThread(real_thread):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if self.name == "portfolio-writer":
+                started.append(self)
+                time.sleep(0.05)          # widen the window between the None check and the assignment
+
+    monkeypatch.setattr(db_portfolio.threading, "Thread", SlowThread)
+    db = str(tmp_path / "p.db")
+    store = PortfolioStore(db, flush_interval=0.05)
+    gate = threading.Barrier(8)
+
+    def submit(i):
+        gate.wait()
+        store.submit(f"p{i}", "2024-01-01", 0.1, 0.2, {"BTC": {"weight": 1.0}})
+
+    workers = [real_thread(target=submit, args=(i,)) for i in range(8)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    store.close()
+    assert len(started) == 1
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM portfolio").fetchone()[0] == 8
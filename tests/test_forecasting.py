@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecasting import build_features, evaluate_candidate, expanding_folds
+
+
+def _panel(T=260, symbols=("BTC", "ETH", "ADA"), seed=21):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2021-01-01", periods=T)
+    close = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.02, (T, len(symbols))), axis=0)),
+                         index=dates, columns=list(symbols))
+    return {"close": close,
+            "open": close.shift(1).bfill() * (1 + rng.normal(0, 0.002, close.shape)),
+            "high": close * (1 + rng.uniform(0, 0.03, close.shape)),
+            "low": close * (1 - rng.uniform(0, 0.03, close.shape)),
+            "volume": pd.DataFrame(rng.uniform(1e3, 1e4, close.shape), index=dates, columns=list(symbols))}
+
+
+def _reference_ridge(X, y, alpha):
+    """Ridge on z-scored features with an unpenalised intercept, fitted from scratch."""
+    mean, sd = X.mean(axis=0), X.std(axis=0)
+    Z = (X - mean) / sd
+    beta = np.linalg.solve(Z.T @ Z + alpha * len(X) * np.eye(X.shape[1]), Z.T @ (y - y.mean()))
+    coef = beta / sd
+    return y.mean() - mean @ coef, coef
+
+
+@pytest.mark.parametrize("alpha", [0.0, 1.0, 100.0])
+def test_accumulated_ridge_matches_a_refit_per_fold(alpha):
+    X, y, row_dates, _, _, dates, _ = build_features(_panel())
+    folds = expanding_folds(row_dates, len(dates), n_folds=4, min_train=60)
+    rows = evaluate_candidate("ridge", ("linear", {"alpha": alpha}), X, y, folds)
+    for (train_end, test_end), row in zip(folds, rows):
+        c, coef = _reference_ridge(X[:train_end], y[:train_end], alpha)
+        pred = c + X[train_end:test_end] @ coef
+        assert np.isclose(row["mse"], np.mean((y[train_end:test_end] - pred) ** 2), rtol=1e-6)
+
+
+def test_folds_never_train_on_their_test_dates():
+    _, _, row_dates, *_, dates, _ = build_features(_panel())
+    folds = expanding_folds(row_dates, len(dates), n_folds=5, min_train=60)
+    assert len(folds) == 5
+    for train_end, test_end in folds:
+        assert row_dates[train_end - 1] < row_dates[train_end]
+        assert train_end < test_end
+
+
+def test_features_do_not_see_future_prices():
+    panel = _panel()
+    X, _, row_dates, row_syms, *_ = build_features(panel)
+    cut = 150
+    changed = {k: v.copy() for k, v in panel.items()}
+    for v in changed.values():
+        v.iloc[cut + 1:] *= 1.5
+    X2, _, row_dates2, row_syms2, *_ = build_features(changed)
+    keep = row_dates < cut
+    keep2 = row_dates2 < cut
+    assert np.array_equal(row_dates[keep], row_dates2[keep2]) and np.array_equal(row_syms[keep], row_syms2[keep2])
+    assert np.allclose(X[keep], X2[keep2])
@@ -0,0 +1,76 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from incremental_ingest import append_bars, high_water_mark, init_bars_db
+
+
+def _bars(start, n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 1, n).cumsum()
+    return pd.DataFrame({"Date": pd.date_range(start, periods=n), "Open": close, "High": close + 1,
+                         "Low": close - 1, "Close": close, "Volume": rng.random(n)})
+
+
+def _legacy_db(path):
+    # what the old milestone1_crypto.py left behind: to_sql tables, keyless metrics
+    conn = sqlite3.connect(path)
+    btc, eth = _bars("2023-01-01", 30, 1), _bars("2023-01-01", 30, 2)
+    btc.to_sql("BTC_USD", conn, index=False)
+    eth.to_sql("ETH_USD", conn, index=False)
+    pd.DataFrame([{"Crypto": s, "Mean Close": d["Close"].mean(), "Min Close": d["Close"].min(),
+                   "Max Close": d["Close"].max(), "Volatility": d["Close"].std()}
+                  for s, d in (("BTC-USD", btc), ("ETH-USD", eth))]).to_sql("metrics", conn, index=False)
+    return conn, btc, eth
+
+
+def test_legacy_db_is_migrated(tmp_path):
+    conn, btc, eth = _legacy_db(str(tmp_path / "crypto.db"))
+    init_bars_db(conn)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "BTC_USD" not in tables and "ETH_USD" not in tables
+    assert high_water_mark(conn, "BTC-USD") == btc["Date"].iloc[-1]
+
+    new = _bars("2023-01-31", 10, 3)
+    assert append_bars(conn, {"BTC-USD": new}) == {"BTC-USD": 10}
+    metrics = pd.read_sql("SELECT * FROM metrics", conn)
+    assert sorted(metrics["Crypto"]) == ["BTC-USD", "ETH-USD"]
+    row = metrics.set_index("Crypto").loc["BTC-USD"]
+    close = pd.concat([btc["Close"], new["Close"]])
+    assert np.isclose(row["Mean Close"], close.mean())
+    assert np.isclose(row["Volatility"], close.std())
+    assert np.isclose(row["Max Close"], close.max())
+
+
+def test_append_only_new_bars(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "crypto.db"))
+    bars = _bars("2023-01-01", 20)
+    assert append_bars(conn, {"BTC-USD": bars.iloc[:15]}) == {"BTC-USD": 15}
+    # overlapping refresh: only the five bars past the high-water mark are added
+    assert append_bars(conn, {"BTC-USD": bars}) == {"BTC-USD": 5}
+    assert conn.execute("SELECT COUNT(*) FROM bars").fetchone()[0] == 20
+    mean, vol = conn.execute('SELECT "Mean Close", "Volatility" FROM metrics').fetchone()
+    assert np.isclose(mean, bars["Close"].mean())
+    assert np.isclose(vol, bars["Close"].std())
+
+
+def test_append_new_rows_compares_numeric_keys_numerically():
+    from incremental_ingest import append_new_rows
+    conn = sqlite3.connect(":memory:")
+    df = pd.DataFrame({"step": range(1, 10), "value": np.arange(9.0)}).set_index("step")
+    assert append_new_rows(conn, "t", df, key="step") == 9
+    more = pd.DataFrame({"step": range(1, 13), "value": np.arange(12.0)}).set_index("step")
+    # "10" < "9" as text: a lexicographic comparison would drop 10..12
+    assert append_new_rows(conn, "t", more, key="step") == 3
+    assert conn.execute("SELECT MAX(step), COUNT(*) FROM t").fetchone() == (12, 12)
+
+
+def test_append_new_rows_dates():
+    from incremental_ingest import append_new_rows
+    conn = sqlite3.connect(":memory:")
+    idx = pd.date_range("2024-01-01", periods=10, name="date")
+    df = pd.DataFrame({"portfolio_return": np.arange(10.0)}, index=idx)
+    assert append_new_rows(conn, "r", df.iloc[:7]) == 7
+    assert append_new_rows(conn, "r", df) == 3
+    assert append_new_rows(conn, "r", df) == 0
@@ -0,0 +1,54 @@
+import re
+
+import pytest
+
+import instrumentation as inst
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    inst.reset()
+    inst.enable(metrics_dir=str(tmp_path))
+    yield tmp_path
+    inst.disable()
+    inst.reset()
+
+
+def test_prometheus_one_type_line_per_family(metrics):
+    inst.count("csv_rows", 10, source="csv")
+    inst.count("csv_rows", 5, source="store")
+    with inst.timer("csv_read", source="csv"):
+        pass
+    with inst.timer("csv_read", source="store"):
+        pass
+    inst.memory_snapshot("stage", stage="load")
+    inst.memory_snapshot("stage", stage="risk")
+    text = open(inst.export_prometheus(str(metrics / "metrics.prom"))).read()
+    types = re.findall(r"^# TYPE (\S+) ", text, re.M)
+    assert len(types) == len(set(types))
+    assert set(types) == {"portfolio_duration_seconds", "portfolio_duration_seconds_max",
+                          "portfolio_csv_rows_total", "portfolio_stage_rss_mb"}
+    assert 'portfolio_csv_rows_total{source="store"} 5' in text
+    # every sample follows its own family's TYPE line
+    family = None
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            family = line.split()[2]
+        elif not line.startswith("#"):
+            assert line.split("{")[0].startswith(family)
+
+
+def test_name_label_is_rejected(metrics):
+    # the keyword API already refuses it; label dicts passed through directly must too
+    with pytest.raises(ValueError):
+        inst._Timer("rows", {"name": "x"}, False)
+
+
+def test_event_buffer_spills(metrics, monkeypatch):
+    monkeypatch.setattr(inst, "SPILL_EVENTS", 100)
+    for _ in range(250):
+        with inst.timer("x"):
+            pass
+    assert len(inst._events) < 100
+    inst.export()
+    assert sum(1 for _ in open(metrics / "metrics.jsonl")) == 250
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from optimizer import PortfolioOptimizer, ledoit_wolf, project_capped_simplex
+
+
+def _simplex_projection(v):
+    """Sort-based projection onto the probability simplex (Duchi et al. 2008)."""
+    u = np.sort(v)[::-1]
+    css = np.cumsum(u) - 1.0
+    k = np.nonzero(u - css / np.arange(1, len(v) + 1) > 0)[0][-1]
+    return np.maximum(v - css[k] / (k + 1), 0.0)
+
+
+def test_projection_matches_sort_based_reference_and_hand_case():
+    V = np.random.default_rng(0).normal(0, 1, (50, 7))
+    P = project_capped_simplex(V)
+    assert np.allclose(P, np.array([_simplex_projection(v) for v in V]), atol=1e-12)
+    assert np.allclose(project_capped_simplex([[0.5, 0.5, 0.0]], upper=0.4), [[0.4, 0.4, 0.2]])
+    capped = project_capped_simplex(V, upper=0.3)
+    assert np.allclose(capped.sum(axis=1), 1.0) and capped.max() <= 0.3 + 1e-12 and capped.min() >= 0.0
+
+
+def test_ledoit_wolf_matches_per_observation_formula():
+    X = np.random.default_rng(1).normal(0, 0.02, (40, 10))
+    cov, delta = ledoit_wolf(X)
+    Xc = X - X.mean(axis=0)
+    T, N = Xc.shape
+    S = Xc.T @ Xc / T
+    m = np.trace(S) / N
+    d2 = np.sum((S - m * np.eye(N)) ** 2)
+    b2 = sum(np.sum((np.outer(x, x) - S) ** 2) for x in Xc) / T ** 2
+    ref = min(b2, d2) / d2
+    assert np.isclose(delta, ref)
+    assert np.allclose(cov, ref * m * np.eye(N) + (1 - ref) * S)
+    assert np.isclose(np.trace(cov), np.trace(S))
+
+
+def test_min_variance_hand_case_with_cap():
+    cov = np.diag([0.01, 0.02, 0.04])
+    mean = pd.Series([0.001, 0.001, 0.001], index=["a", "b", "c"])
+    free = PortfolioOptimizer(mean=mean, cov=cov, max_weight=None, long_only=False).min_variance()
+    assert np.allclose(free, np.array([4, 2, 1]) / 7)
+    capped = PortfolioOptimizer(mean=mean, cov=cov, max_weight=0.4).min_variance()
+    assert np.allclose(capped, [0.4, 0.4, 0.2], atol=1e-8)
+
+
+def test_fista_solutions_are_projected_gradient_fixed_points():
+    rng = np.random.default_rng(2)
+    R = pd.DataFrame(rng.normal(0.001, 0.02, (250, 6)) + rng.normal(0, 0.01, (250, 1)),
+                     columns=list("abcdef"))
+    opt = PortfolioOptimizer(R, shrinkage="ledoit_wolf", max_weight=0.3)
+    lams = np.array([0.0, 0.5, 5.0, 50.0])
+    W = opt.solve_batch(lams)
+    step = 1.0 / opt.L
+    G = W @ opt.cov - lams[:, None] * opt.mu[None, :]
+    assert np.allclose(project_capped_simplex(W - step * G, 0.3), W, atol=1e-7)
+    assert np.allclose(W.sum(axis=1), 1.0) and W.max() <= 0.3 + 1e-9
@@ -0,0 +1,33 @@
+import instrumentation as inst
+from pipeline import Pipeline, Stage, format_report
+
+
+def _stages():
+    return [Stage("a", lambda: 1, outputs=["x"], cache=False),
+            Stage("b", lambda x: x + 1, inputs=["x"], outputs=["y"], cache=False),
+            Stage("c", lambda x: x * 2, inputs=["x"], outputs=["z"], cache=False)]
+
+
+def _stage_events():
+    return [e for e in inst._events if e.get("name") == "stage"]
+
+
+def test_rss_delta_only_reported_for_serial_runs(tmp_path):
+    inst.enable(metrics_dir=str(tmp_path))
+    try:
+        inst.reset()
+        values, report = Pipeline(_stages(), max_workers=4, cache_dir=None).run()
+        assert values["y"] == 2 and values["z"] == 2
+        rows = [r for r in report if r["stage"] != "(total)"]
+        assert all("rss_mb" in r and "rss_delta_mb" not in r for r in rows)
+        assert all("rss_delta_mb" not in e for e in _stage_events())
+
+        inst.reset()
+        _, report = Pipeline(_stages(), max_workers=1, cache_dir=None).run()
+        rows = [r for r in report if r["stage"] != "(total)"]
+        assert all("rss_delta_mb" in r for r in rows)
+        assert all("rss_delta_mb" in e for e in _stage_events())
+        assert "proc_rss" in format_report(report)
+    finally:
+        inst.disable()
+        inst.reset()
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+import risk_engine
+from portfolio_math import evaluate_portfolios, sharpe_ratio, sortino_ratio
+
+
+def _returns(T=40):
+    rng = np.random.default_rng(11)
+    return pd.DataFrame({"up": np.full(T, 0.25), "flat": np.zeros(T), "down": np.full(T, -0.125),
+                         "btc": rng.normal(0.002, 0.03, T), "eth": rng.normal(0.001, 0.04, T)})
+
+
+def test_zero_deviation_ratios_agree_across_implementations():
+    R = _returns()
+    W = pd.DataFrame(np.eye(5), index=list(R.columns), columns=R.columns)
+    ev = evaluate_portfolios(W, R)
+    single_sharpe = np.array([sharpe_ratio(R[c]) for c in R.columns])
+    single_sortino = np.array([sortino_ratio(R[c]) for c in R.columns])
+    engine_sharpe = risk_engine._sharpe(R.to_numpy())
+    engine_sortino = risk_engine._sortino(R.to_numpy())
+
+    assert ev.loc["up", "sharpe"] == np.inf and ev.loc["up", "sortino"] == np.inf
+    assert ev.loc["flat", "sharpe"] == 0.0 and ev.loc["flat", "sortino"] == 0.0
+    assert ev.loc["down", "sharpe"] == -np.inf
+    for ref in (single_sharpe, engine_sharpe):
+        assert np.allclose(ev["sharpe"].to_numpy(), ref)
+    for ref in (single_sortino, engine_sortino):
+        assert np.allclose(ev["sortino"].to_numpy(), ref)
+
+
+def test_mixed_portfolios_match_per_series_functions():
+    R = _returns()[["btc", "eth"]]
+    W = np.array([[0.5, 0.5], [0.9, 0.1], [0.0, 1.0]])
+    ev = evaluate_portfolios(W, R, chunk_size=2)
+    P = R.to_numpy() @ W.T
+    assert np.allclose(ev["sharpe"], [sharpe_ratio(P[:, k]) for k in range(3)])
+    assert np.allclose(ev["sortino"], [sortino_ratio(P[:, k]) for k in range(3)])
+    assert np.allclose(ev["total_return"], np.prod(1 + P, axis=0) - 1)
@@ -0,0 +1,66 @@
+import sqlite3
+
+import pandas as pd
+
+from predictor import compact_predictions, fetch_latest_predictions, store_predictions
+
+
+def _result(seed, n=4):
+    return {"actual_last": [seed + i for i in range(n)], "pred_last": [seed + i + 0.5 for i in range(n)],
+            "mse": 0.1 * seed, "r2": 0.5}
+
+
+def _store_runs(db, runs=5):
+    for r in range(runs):
+        store_predictions({"BTC": _result(10 * r), "ETH": _result(10 * r + 1, n=2)}, db_path=db)
+
+
+def _all_rows(db):
+    with sqlite3.connect(db) as conn:
+        return pd.read_sql_query("SELECT id, run_id, asset, actual, predicted, ts FROM prediction_rows", conn)
+
+
+def _reference_latest(rows, n):
+    rows = rows.sort_values(["run_id", "id"], ascending=False)
+    return rows.groupby("asset", sort=True).head(n).sort_values(["asset", "run_id", "id"],
+                                                                ascending=[True, False, False])
+
+
+def test_latest_rows_match_a_sorted_scan(tmp_path):
+    db = str(tmp_path / "p.db")
+    _store_runs(db)
+    rows = _all_rows(db)
+    for n in (1, 3, 7):
+        ref = _reference_latest(rows, n).drop(columns="id").reset_index(drop=True)
+        pd.testing.assert_frame_equal(fetch_latest_predictions(n=n, db_path=db), ref)
+        one = ref[ref["asset"] == "BTC"].reset_index(drop=True)
+        pd.testing.assert_frame_equal(fetch_latest_predictions("BTC", n=n, db_path=db), one)
+
+
+def test_compaction_keeps_newest_runs_and_drops_legacy_rows(tmp_path):
+    db = str(tmp_path / "p.db")
+    with sqlite3.connect(db) as conn:
+        # table layout from before run ids existed
+        conn.execute("CREATE TABLE prediction_rows (id INTEGER PRIMARY KEY AUTOINCREMENT, asset TEXT, "
+                     "actual REAL, predicted REAL, ts TIMESTAMP)")
+        conn.execute("INSERT INTO prediction_rows(asset, actual, predicted, ts) VALUES ('BTC', 1, 2, '2020-01-01')")
+    _store_runs(db)
+    assert _all_rows(db)["run_id"].isna().sum() == 1
+    deleted = compact_predictions(keep_runs=2, db_path=db)
+    rows = _all_rows(db)
+    assert deleted == 1 + 3 * (4 + 2)
+    assert sorted(rows["run_id"].unique()) == [4, 5]
+    with sqlite3.connect(db) as conn:
+        assert [r[0] for r in conn.execute("SELECT run_id FROM prediction_runs ORDER BY run_id")] == [4, 5]
+        assert conn.execute("SELECT COUNT(*) FROM predictions WHERE run_id < 4").fetchone()[0] == 0
+
+
+def test_compaction_by_age(tmp_path):
+    db = str(tmp_path / "p.db")
+    _store_runs(db, runs=3)
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE prediction_runs SET ts = '2000-01-01' WHERE run_id <= 2")
+    compact_predictions(keep_runs=10, max_age_days=30, db_path=db)
+    assert list(_all_rows(db)["run_id"].unique()) == [3]
+    compact_predictions(keep_runs=10, max_age_days=0, db_path=db)
+    assert _all_rows(db).empty
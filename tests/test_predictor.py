@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from predictor import fit_trend_batch, load_models, update_models
+
+
+def _frame(n, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"a": np.cumsum(rng.normal(0, 1, n)), "b": rng.normal(0, 1, n)})
+
+
+def _assert_matches_batch(models, df):
+    for c, ref in zip(df.columns, fit_trend_batch(df.to_numpy(dtype=float))):
+        m = models[c]
+        assert m.n == ref.n
+        assert np.isclose(m.slope, ref.slope) and np.isclose(m.intercept, ref.intercept)
+        assert np.isclose(m.mse, ref.mse)
+
+
+def test_appended_rows_update_to_the_batch_fit(tmp_path):
+    path = str(tmp_path / "models.json")
+    df = _frame(120)
+    update_models(df.iloc[:100], ["a", "b"], path)
+    _assert_matches_batch(update_models(df, ["a", "b"], path), df)
+
+
+def test_rewritten_prefix_refits_from_scratch(tmp_path):
+    path = str(tmp_path / "models.json")
+    df = _frame(120)
+    update_models(df.iloc[:100], ["a", "b"], path)
+    revised = df.copy()
+    revised.loc[10, "a"] += 50.0          # inside the consumed prefix; its last row is unchanged
+    models = update_models(revised, ["a", "b"], path)
+    _assert_matches_batch(models, revised)
+    assert load_models(path)["a"][1] is not None
+
+
+def test_model_files_without_prefix_are_refitted(tmp_path):
+    import json
+    path = str(tmp_path / "models.json")
+    df = _frame(80)
+    update_models(df.iloc[:60], ["a"], path)
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    state["a"]["model"]["mean_y"] += 1.0   # corrupt the fit, as an old file with only "last" would go stale
+    state["a"] = {"model": state["a"]["model"], "last": float(df["a"].iloc[59])}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    _assert_matches_batch(update_models(df[["a"]], ["a"], path), df[["a"]])
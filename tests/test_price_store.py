@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from price_store import PriceStore, read_csv_cached
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(str(tmp_path / "store"))
+
+
+def _copy(name, tmp_path):
+    path = str(tmp_path / name)
+    pd.read_csv(os.path.join(ROOT, name)).to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("name", ["Crypto_metrics_daily.csv", "Binance_BTCUSDT_d.csv", "sample_prices.csv"])
+def test_store_read_matches_read_csv(name, store, tmp_path, monkeypatch):
+    path = _copy(name, tmp_path)
+    store.ingest_csv(path)
+    meta = store.tables[os.path.splitext(name)[0]]
+    assert meta["round_trip"]
+    expected = pd.read_csv(path)
+    expected_parsed = pd.read_csv(path, parse_dates=[meta["date_column"]])
+
+    def no_csv(*args, **kwargs):
+        raise AssertionError("served from the CSV, not the store")
+    monkeypatch.setattr(pd, "read_csv", no_csv)
+    assert_frame_equal(read_csv_cached(path, store), expected)
+    assert_frame_equal(read_csv_cached(path, store, parse_dates=[meta["date_column"]]), expected_parsed)
+
+
+def test_unsupported_files_and_kwargs_read_the_csv(store, tmp_path):
+    path = str(tmp_path / "prices.csv")
+    pd.DataFrame({"date": ["2024-01-02", "2024-01-01", "2024-01-01"], "symbol": ["A", "A", "A"],
+                  "close": [1.0, 2.0, 3.0], "note": ["x", "y", "z"]}).to_csv(path, index=False)
+    store.ingest_csv(path)
+    assert store.tables["prices"]["round_trip"] is None         # duplicate date, text column
+    assert_frame_equal(read_csv_cached(path, store), pd.read_csv(path))
+    assert_frame_equal(read_csv_cached(path, store, usecols=["date", "close"]),
+                       pd.read_csv(path, usecols=["date", "close"]))
+
+
+def test_incremental_ingest_appends_and_rewrites_revisions(store, tmp_path):
+    path = str(tmp_path / "long.csv")
+    full = pd.read_csv(os.path.join(ROOT, "Crypto_metrics_daily.csv"))
+    full.iloc[:-6].to_csv(path, index=False)
+    store.ingest_csv(path, incremental=True)
+    rows = {s: m["rows"] for s, m in store.tables["long"]["symbols"].items()}
+
+    full.to_csv(path, index=False)                              # new bars appended
+    store.ingest_csv(path, incremental=True)
+    assert sum(m["rows"] for m in store.tables["long"]["symbols"].values()) == sum(rows.values()) + 6
+    assert_frame_equal(read_csv_cached(path, store), full)
+
+    revised = full.copy()
+    revised.loc[5, "daily_return"] = 1.0                         # history corrected
+    revised.to_csv(path, index=False)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    store.ingest_csv(path, incremental=True)
+    assert_frame_equal(read_csv_cached(path, store), revised)
+    assert np.isclose(store.csv_frame("long")["daily_return"][5], 1.0)
+
+
+def test_append_recovers_from_unrecorded_rows(store, tmp_path):
+    path = str(tmp_path / "long.csv")
+    full = pd.read_csv(os.path.join(ROOT, "Crypto_metrics_daily.csv"))
+    full.iloc[:-6].to_csv(path, index=False)
+    store.ingest_csv(path, incremental=True)
+    # a crash after writing column files but before saving the manifest
+    sym = next(iter(store.tables["long"]["symbols"]))
+    for name in os.listdir(os.path.join(store.root, "long", sym)):
+        with open(os.path.join(store.root, "long", sym, name), "ab") as f:
+            f.write(b"\xff" * 8 * 3)
+    full.to_csv(path, index=False)
+    PriceStore(store.root).ingest_csv(path, incremental=True)
+    assert_frame_equal(read_csv_cached(path, PriceStore(store.root)), full)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from portfolio_math import max_drawdown, returns_to_volatility, sharpe_ratio, sortino_ratio
+from risk_engine import DEFAULT_RULES, RiskRuleEngine, dispatch
+
+
+def _data():
+    rng = np.random.default_rng(9)
+    A = pd.DataFrame(rng.normal(0.001, 0.03, (250, 3)), columns=["BTC", "ETH", "ADA"])
+    W = pd.DataFrame([[0.5, 0.3, 0.2], [0.2, 0.2, 0.6], [1 / 3, 1 / 3, 1 / 3]],
+                     index=["p1", "p2", "p3"], columns=A.columns)
+    return A, W
+
+
+def test_batched_metrics_match_per_portfolio_functions():
+    A, W = _data()
+    results, _ = RiskRuleEngine().evaluate(weights=W, asset_returns=A)
+    got = {(rule, p): v for rule, p, _, v in results if rule != "Max Asset Weight"}
+    for p in W.index:
+        r = A.to_numpy() @ W.loc[p].to_numpy()
+        assert np.isclose(got[("Volatility", p)], returns_to_volatility(r))
+        assert np.isclose(got[("Sharpe", p)], sharpe_ratio(r))
+        assert np.isclose(got[("Sortino", p)], sortino_ratio(r))
+        assert np.isclose(got[("Max Drawdown", p)], max_drawdown(np.cumprod(1 + r) - 1))
+
+
+def test_breaches_are_hand_checked_and_deduplicated():
+    A, W = _data()
+    rules = DEFAULT_RULES + [dict(DEFAULT_RULES[-1], name="Asset cap (copy)")]
+    _, breaches = RiskRuleEngine(rules).evaluate(weights=W, asset_returns=A)
+    caps = [(b.portfolio, b.asset) for b in breaches if b.alert == "max_asset_weight"]
+    assert caps == [("p1", "BTC"), ("p2", "ADA")]          # the copied rule adds nothing
+    P = pd.DataFrame(A.to_numpy() @ W.to_numpy().T, columns=W.index)
+    _, from_returns = RiskRuleEngine().evaluate(returns=P)
+    portfolio_level = [b for b in breaches if b.asset is None]
+    assert [(b.alert, b.portfolio) for b in from_returns] == [(b.alert, b.portfolio) for b in portfolio_level]
+
+
+def test_dispatch_sends_one_batch():
+    calls = {"db": [], "mail": [], "ai": []}
+    A, W = _data()
+    _, breaches = RiskRuleEngine().evaluate(weights=W, asset_returns=A)
+    n = dispatch(breaches, add_alerts=calls["db"].append,
+                 send_alert=lambda subject, body: calls["mail"].append(subject),
+                 ai_alert=lambda kind, body, meta: calls["ai"].append(meta))
+    assert n == len(breaches) > 0
+    assert len(calls["db"]) == 1 and len(calls["db"][0]) == n
+    assert calls["mail"] == [f"Risk Alert: {n} rule breach(es)"]
+    assert len(calls["ai"]) == 1
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from risk_parity import erc_weights, risk_contributions, windowed_volatility
+
+
+def _cov(n=5, seed=2):
+    rng = np.random.default_rng(seed)
+    A = rng.normal(size=(200, n)) @ rng.normal(size=(n, n)) * 0.01
+    return np.cov(A, rowvar=False)
+
+
+def test_uncorrelated_and_two_asset_erc_is_inverse_vol():
+    sig = np.array([0.1, 0.2, 0.4])
+    w, _ = erc_weights(np.diag(sig ** 2))
+    assert np.allclose(w, (1 / sig) / (1 / sig).sum())
+    # with two assets equal risk means w1 s1 = w2 s2, whatever the correlation
+    s1, s2, rho = 0.3, 0.1, 0.6
+    w, _ = erc_weights(np.array([[s1 * s1, rho * s1 * s2], [rho * s1 * s2, s2 * s2]]))
+    assert np.allclose(w, [0.25, 0.75])
+
+
+def test_newton_solution_equalises_risk_contributions():
+    C = _cov()
+    w, iters = erc_weights(C)
+    assert np.isclose(w.sum(), 1.0) and (w > 0).all()
+    assert np.allclose(risk_contributions(w, C), 1 / len(w), atol=1e-8)
+    assert iters < 100
+
+    budget = np.array([1, 2, 3, 2, 2], dtype=float)
+    wb, _ = erc_weights(C, budget=budget)
+    assert np.allclose(risk_contributions(wb, C), budget / budget.sum(), atol=1e-8)
+
+
+def test_warm_start_reaches_the_same_weights_faster():
+    C = _cov()
+    w, cold = erc_weights(C)
+    w2, warm = erc_weights(C * 1.01, x0=w)
+    assert np.allclose(w2, w, atol=1e-8)       # scaling cov does not change ERC weights
+    assert warm <= cold
+
+
+def test_windowed_volatility_matches_pandas_tail_std():
+    rng = np.random.default_rng(4)
+    R = pd.DataFrame(rng.normal(0, 0.02, (120, 3)), columns=list("abc"))
+    R.iloc[:30, 1] = np.nan                    # shorter history
+    R.iloc[:115, 2] = np.nan                   # fewer rows than the window
+    vol = windowed_volatility(R, window=60)
+    ref = [R[c].dropna().iloc[-60:].std() for c in R.columns]
+    assert np.allclose(vol.to_numpy(), ref)
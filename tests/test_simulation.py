@@ -0,0 +1,47 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation import MonteCarloSimulator, simulate
+
+
+def _returns(T=300, seed=12):
+    rng = np.random.default_rng(seed)
+    L = np.array([[0.03, 0, 0], [0.015, 0.025, 0], [0.01, 0.005, 0.04]])
+    return pd.DataFrame(0.001 + rng.standard_normal((T, 3)) @ L.T, columns=["BTC", "ETH", "ADA"])
+
+
+W = pd.DataFrame([[0.5, 0.3, 0.2], [0.0, 0.0, 1.0]], index=["mix", "ada"], columns=["BTC", "ETH", "ADA"])
+
+
+@pytest.mark.parametrize("method", ["bootstrap", "gaussian", "student_t", "fhs"])
+def test_results_depend_only_on_the_seed(method):
+    R = _returns()
+    a = simulate(R, W, n_paths=600, horizon=20, method=method, seed=7, chunk_size=100, max_workers=1)
+    b = simulate(R, W, n_paths=600, horizon=20, method=method, seed=7, chunk_size=100, max_workers=2)
+    assert np.array_equal(a.terminal, b.terminal)
+    assert np.array_equal(a.drawdown, b.drawdown)
+    c = simulate(R, W, n_paths=600, horizon=20, method=method, seed=8, chunk_size=100, max_workers=1)
+    assert not np.array_equal(a.terminal, c.terminal)
+
+
+def test_one_day_gaussian_var_matches_the_normal_quantile():
+    R = _returns()
+    res = simulate(R, W, n_paths=200_000, horizon=1, method="gaussian", seed=3)
+    P = R.to_numpy() @ W.to_numpy().T
+    mu, sd = P.mean(axis=0), np.sqrt(np.diag(W.to_numpy() @ np.cov(R, rowvar=False) @ W.to_numpy().T))
+    expected = -(mu + sd * NormalDist().inv_cdf(0.05))
+    assert np.allclose(res.var(0.95), expected, rtol=0.02)
+    assert np.allclose(res.terminal.std(axis=0), sd, rtol=0.01)
+
+
+def test_bootstrap_draws_historical_days():
+    R = _returns(50)
+    sim = MonteCarloSimulator(R, W, method="bootstrap", block_size=1)
+    res = sim.run(n_paths=500, horizon=1, seed=1)
+    hist = R.to_numpy() @ W.to_numpy().T
+    for k in range(2):
+        gap = np.abs(res.terminal[:, k, None] - hist[None, :, k]).min(axis=1)
+        assert gap.max() < 1e-15                          # (1 + r) - 1 round-trips to within an ulp
@@ -0,0 +1,15 @@
+# tests/test_startup.py
+# Import-time budget for the final_main entry point (see final_main.check_import_budget).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from final_main import check_import_budget
+
+
+def test_import_budget():
+    ok, elapsed, loaded = check_import_budget()
+    assert not loaded, f"importing final_main pulled in heavy modules: {loaded}"
+    assert ok, f"importing final_main took {elapsed * 1000:.1f} ms (budget 300 ms)"
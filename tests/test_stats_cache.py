@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from stats_cache import StatsCache
+
+
+def _returns(n=300, assets="abcd", seed=1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.normal(0, 0.02, (n, len(assets))), index=pd.date_range("2020-01-01", periods=n),
+                        columns=list(assets))
+
+
+def _sample_cov(frame):
+    return np.cov(frame.to_numpy(), rowvar=False)
+
+
+def test_appended_rows_advance_incrementally():
+    R = _returns()
+    cache = StatsCache()
+    cache.stats(R.iloc[:250], window=90)
+    s = cache.stats(R.iloc[:260], window=90)
+    assert cache.incremental == 1
+    assert np.allclose(s["cov"], _sample_cov(R.iloc[170:260]))
+    assert np.allclose(s["mean"], R.iloc[170:260].mean().to_numpy())
+
+
+def test_revised_row_inside_window_forces_full_recompute():
+    R = _returns()
+    cache = StatsCache()
+    cache.stats(R.iloc[:250], window=90)
+    revised = R.copy()
+    revised.iloc[230] = 0.5            # inside the window; the last seen row is unchanged
+    s = cache.stats(revised.iloc[:270], window=90)
+    assert cache.incremental == 0
+    assert np.allclose(s["cov"], _sample_cov(revised.iloc[180:270]), atol=1e-15)
+
+
+def test_rolling_states_are_bounded():
+    cache = StatsCache(max_entries=4)
+    for k in range(10):
+        cache.stats(_returns(120, assets=f"abc{k}", seed=k), window=30)
+    assert len(cache.rolling) <= 4
+    assert len(cache.entries) <= 4
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from price_store import PriceStore
+from streaming_loader import PivotBuilder, load_returns, stream_to_store
+
+
+def _long(n_days=40, assets=("BTC", "ETH", "SOL"), seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=n_days)
+    rows = [(d.strftime("%Y-%m-%d"), a, 100 + rng.normal()) for d in dates for a in assets]
+    return pd.DataFrame(rows, columns=["date", "symbol", "close"])
+
+
+def test_chunked_pivot_matches_pandas(tmp_path):
+    df = _long()
+    path = str(tmp_path / "long.csv")
+    df.sample(frac=1, random_state=1).to_csv(path, index=False)     # order must not matter
+    close, returns = load_returns(path, chunksize=17, verbose=False)
+    expected = (df.assign(date=pd.to_datetime(df["date"]))
+                .pivot(index="date", columns="symbol", values="close").sort_index())
+    assert_frame_equal(close, expected, check_names=False, check_index_type=False, check_freq=False)
+    assert_frame_equal(returns, expected.pct_change().dropna(), check_names=False,
+                       check_index_type=False, check_freq=False)
+
+
+def test_stream_to_store_sorted_file(tmp_path):
+    path = str(tmp_path / "long.csv")
+    _long().to_csv(path, index=False)
+    store = PriceStore(str(tmp_path / "store"))
+    table = stream_to_store(path, store, chunksize=25, verbose=False)
+    assert store.is_fresh(table, path)
+    assert sum(m["rows"] for m in store.tables[table]["symbols"].values()) == 120
+
+
+def test_stream_to_store_refuses_unsorted_file(tmp_path):
+    path = str(tmp_path / "long.csv")
+    _long().sample(frac=1, random_state=2).to_csv(path, index=False)
+    store = PriceStore(str(tmp_path / "store"))
+    with pytest.raises(ValueError, match="time order"):
+        stream_to_store(path, store, chunksize=25, verbose=False)
+    assert not store.is_fresh("long", path)
+    assert not PriceStore(store.root).is_fresh("long", path)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from portfolio_math import max_drawdown, sharpe_ratio, sortino_ratio
+from streaming_metrics import RiskAccumulator, RunningMoments
+
+
+def _returns(n=500, seed=6):
+    return np.random.default_rng(seed).normal(0.0005, 0.03, n)
+
+
+def test_accumulator_matches_batch_functions():
+    r = _returns()
+    acc = RiskAccumulator(risk_free=0.0001)
+    acc.update_many(r)
+    assert np.isclose(acc.volatility, r.std(ddof=1))
+    assert np.isclose(acc.sharpe, sharpe_ratio(r, risk_free=0.0001))
+    assert np.isclose(acc.sortino, sortino_ratio(r))
+    assert np.isclose(acc.max_drawdown, max_drawdown(np.cumprod(1 + r) - 1))
+    ewm = pd.Series(np.r_[r[0] ** 2, r[1:] ** 2]).ewm(alpha=0.06, adjust=False).mean().iloc[-1]
+    assert np.isclose(acc.ewma_volatility, np.sqrt(ewm))
+
+
+def test_welford_is_stable_with_a_large_offset():
+    x = 1e9 + np.random.default_rng(1).normal(0, 1e-3, 10_000)
+    m = RunningMoments()
+    for v in x:
+        m.update(v)
+    assert np.isclose(m.variance, np.var(x - 1e9, ddof=1), rtol=1e-6)
+
+
+def test_checkpoint_resume_equals_one_pass(tmp_path):
+    r = _returns()
+    path = str(tmp_path / "risk.json")
+    first = RiskAccumulator(target=0.001)
+    first.update_many(r[:200])
+    first.save(path)
+    resumed = RiskAccumulator.load(path)
+    resumed.update_many(r[200:])
+    whole = RiskAccumulator(target=0.001)
+    whole.update_many(r)
+    assert resumed.snapshot() == whole.snapshot()
+
+
+def test_constant_stream_uses_the_shared_zero_deviation_rule():
+    acc = RiskAccumulator()
+    acc.update_many([0.25] * 10)
+    assert acc.sharpe == np.inf and acc.sortino == np.inf
+    flat = RiskAccumulator()
+    flat.update_many([0.0] * 10)
+    assert flat.sharpe == 0.0 and flat.sortino == 0.0
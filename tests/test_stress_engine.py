@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from stress_engine import REGIME_DAYS, REGIMES, StressEngine, regime_scenarios
+
+
+def _engine(T=60, seed=5):
+    rng = np.random.default_rng(seed)
+    R = pd.DataFrame(rng.normal(0.001, 0.02, (T, 3)), index=pd.date_range("2022-01-01", periods=T),
+                     columns=["BTC", "ETH", "ADA"])
+    return StressEngine(R), R
+
+
+def _reference_path(R, w, params, lo, hi):
+    """Regime applied by hand to rows lo:hi of the asset returns."""
+    mu = R.mean().to_numpy()
+    X = R.to_numpy().copy()
+    k = params.get("vol_scale", 1.0)
+    X[lo:hi] = mu + k * (X[lo:hi] - mu) + params.get("drift", 0.0)
+    return X @ w
+
+
+def test_regimes_default_to_the_last_regime_days():
+    engine, R = _engine()
+    w = np.array([0.5, 0.3, 0.2])
+    paths = engine.portfolio_paths(regime_scenarios(), w)
+    T = len(R)
+    for (name, params), row in zip(REGIMES.items(), paths.to_numpy()):
+        assert np.allclose(row, _reference_path(R, w, params, T - REGIME_DAYS, T))
+        assert np.allclose(row[:T - REGIME_DAYS], R.to_numpy()[:T - REGIME_DAYS] @ w)
+
+
+def test_regime_window_from_start_and_whole_history():
+    engine, R = _engine()
+    w = np.array([0.2, 0.2, 0.6])
+    start = R.index[10]
+    paths = engine.portfolio_paths(regime_scenarios(start=start, days=7), w).to_numpy()
+    assert np.allclose(paths[0], _reference_path(R, w, REGIMES["bull"], 10, 17))
+    whole = engine.portfolio_paths(regime_scenarios(days=None), w).to_numpy()
+    assert np.allclose(whole[1], _reference_path(R, w, REGIMES["bear"], 0, len(R)))
+
+
+def test_default_regime_pnl_matches_compounded_window():
+    engine, R = _engine()
+    w = np.array([1 / 3] * 3)
+    pnl = engine.run(regime_scenarios(), w)["pnl"]
+    ref = np.prod(1 + _reference_path(R, w, REGIMES["bull"], len(R) - REGIME_DAYS, len(R))) - 1
+    assert np.isclose(pnl.iloc[0], ref)